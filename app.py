@@ -1,13 +1,39 @@
 import os
 import json
+import asyncio
+import functools
 import gradio as gr
-import google.generativeai as genai
-from openai import OpenAI
 import tempfile
-import time
 from pathlib import Path
 from datetime import datetime
 import base64
+from llm_cache import get_cache, make_cache_key, acached_stream
+from providers import (
+    registry,
+    resume_request_prefix,
+    resume_request_suffix,
+    cover_letter_request_prefix,
+    cover_letter_request_suffix,
+    join_request,
+    astream_gemini_prefixed,
+    astream_chat_completion,
+    merge_token_streams,
+)
+from latex_text import latex_to_text
+from relevance import focus_resume
+from latex_repair import repair_latex
+from singleflight import single_flight
+from jobs import job_registry, run_job, DISCONNECTED
+from job_queue import get_job_queue, QUEUED, DONE, CANCELLED
+from output_budget import output_budget, budgeted_stream, fallback_stream, OutputDiverged, REASONING_ALLOWANCE_TOKENS
+from health import provider_health, ProviderUnavailable, CLOSED, HALF_OPEN, PROBE_TIMEOUT_SECONDS, STATUS_TTL_SECONDS
+from jd_index import get_job_index, context_key
+from artifacts import get_artifact_store
+from metrics import metrics, CONTENT_TYPE
+from session_store import session_store, SessionLimitError
+from latex_sections import SECTION_INSTRUCTIONS, split_sections, replace_sections, section_titles
+from hedging import rank_providers, hedged_stream
+from scheduler import INTERACTIVE, get_scheduler, estimate_tokens, scheduled_stream
 
 # Theme and styling
 custom_css = """
@@ -70,6 +96,19 @@ Follow these guidelines:
 5. Return ONLY the modified LaTeX code
 """
 
+GEMINI_MODEL = "gemini-2.0-flash"
+DEEPSEEK_MODEL = "deepseek/deepseek-r1:free"
+# Races the available providers and streams the first one to answer
+FASTEST_CHOICE = "Fastest"
+# Maximum number of generations the Gradio queue runs concurrently per event
+CONCURRENCY_LIMIT = int(os.environ.get("GRADIO_CONCURRENCY_LIMIT", 64))
+# How often a followed background job is polled for progress
+QUEUE_POLL_SECONDS = float(os.environ.get("JOB_QUEUE_POLL_SECONDS", 0.5))
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://resume-customizer.app",
+    "X-Title": "Resume Customizer App",
+}
+
 # File handling functions
 def ensure_directory(directory):
     Path(directory).mkdir(parents=True, exist_ok=True)
@@ -112,7 +151,7 @@ def initialize_gemini_api():
         api_key = os.environ.get("GOOGLE_API_KEY")
         if not api_key:
             return False, "Gemini API key not found"
-        genai.configure(api_key=api_key)
+        registry.configure_gemini(api_key)
         return True, "Gemini API initialized successfully"
     except Exception as e:
         return False, f"Error initializing Gemini API: {str(e)}"
@@ -124,107 +163,278 @@ def initialize_deepseek_api(api_key=None):
         if not api_key:
             return False, None, "OpenRouter API key not found"
         
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
-        return True, client, "DeepSeek API initialized successfully"
+        clients = registry.configure_openrouter(api_key)
+        return True, clients, "DeepSeek API initialized successfully"
     except Exception as e:
         return False, None, f"Error initializing DeepSeek API: {str(e)}"
 
 # AI processing functions
-def customize_resume_gemini(resume_template, job_description, prompt):
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(
-            f"{prompt}\n\nJob Description:\n{job_description}\n\nResume Template:\n{resume_template}"
-        )
-        return True, response.text, "Resume customized successfully using Gemini"
-    except Exception as e:
-        return False, None, f"Error customizing resume with Gemini: {str(e)}"
+# Static instructions and template first, job-specific text last, so that consecutive requests
+# share a prefix the provider can cache
+def prepare_resume(provider, model_name, prompt, resume_template, job_description):
+    # A provider-cached template prefix only pays off if it is the same for every job description,
+    # so relevance filtering is limited to hints when the whole template's prefix will be cached
+    cached = registry.prefix_cached(provider, model_name, resume_request_prefix(prompt, resume_template))
+    return focus_resume(resume_template, job_description, filter_items=not cached)
 
-def generate_cover_letter_gemini(resume, job_description, prompt, template):
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(
-            f"{prompt}\n\nJob Description:\n{job_description}\n\nResume:\n{resume}\n\nCover Letter Template:\n{template}"
-        )
-        return True, response.text, "Cover letter generated successfully using Gemini"
-    except Exception as e:
-        return False, None, f"Error generating cover letter with Gemini: {str(e)}"
+# Async streaming AI processing functions
+def stream_resume_gemini(resume_template, job_description, prompt, use_cache=True, priority=INTERACTIVE):
+    resume_template, hints = prepare_resume("gemini", GEMINI_MODEL, prompt, resume_template, job_description)
+    cache_key = make_cache_key("gemini", GEMINI_MODEL, prompt, job_description, resume_template)
+    prefix = resume_request_prefix(prompt, resume_template)
+    suffix = resume_request_suffix(job_description, hints)
+    budget = output_budget(resume_template)
+    tokens = scheduled_stream(
+        get_scheduler("gemini"),
+        lambda: provider_health.guarded_stream("Gemini", astream_gemini_prefixed(GEMINI_MODEL, prefix, suffix, max_output_tokens=budget)),
+        estimate_tokens(prefix, suffix, resume_template),
+        priority,
+        on_give_up=lambda error: provider_health.record_given_up("Gemini", error)
+    )
+    tokens = budgeted_stream(tokens, budget, resume_template)
+    return coalesced_stream(cache_key, tokens, use_cache)
 
-def customize_resume_deepseek(client, resume_template, job_description, prompt):
-    try:
-        full_prompt = f"{prompt}\n\nJob Description:\n{job_description}\n\nResume Template:\n{resume_template}"
-        
-        response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://resume-customizer.app", 
-                "X-Title": "Resume Customizer App",
-            },
-            model="deepseek/deepseek-r1:free",
-            messages=[
-                {"role": "system", "content": "You are a professional resume writer."},
-                {"role": "user", "content": full_prompt}
-            ]
+def stream_cover_letter_gemini(resume, job_description, prompt, template, use_cache=True, priority=INTERACTIVE):
+    cache_key = make_cache_key("gemini", GEMINI_MODEL, prompt, job_description, resume, template)
+    prefix = cover_letter_request_prefix(prompt, template)
+    suffix = cover_letter_request_suffix(job_description, resume)
+    budget = output_budget(template)
+    tokens = scheduled_stream(
+        get_scheduler("gemini"),
+        lambda: provider_health.guarded_stream("Gemini", astream_gemini_prefixed(GEMINI_MODEL, prefix, suffix, max_output_tokens=budget)),
+        estimate_tokens(prefix, suffix, template),
+        priority,
+        on_give_up=lambda error: provider_health.record_given_up("Gemini", error)
+    )
+    tokens = budgeted_stream(tokens, budget, template)
+    return coalesced_stream(cache_key, tokens, use_cache)
+
+def stream_resume_deepseek(client, resume_template, job_description, prompt, use_cache=True, priority=INTERACTIVE):
+    resume_template, hints = prepare_resume("openrouter", DEEPSEEK_MODEL, prompt, resume_template, job_description)
+    cache_key = make_cache_key("openrouter", DEEPSEEK_MODEL, prompt, job_description, resume_template)
+    prefix = resume_request_prefix(prompt, resume_template)
+    request_text = join_request(prefix, resume_request_suffix(job_description, hints))
+    messages = [
+        {"role": "system", "content": "You are a professional resume writer."},
+        {"role": "user", "content": request_text}
+    ]
+    # DeepSeek R1 reasons before answering, and the reasoning counts against max_tokens
+    budget = output_budget(resume_template, reasoning=True)
+    tokens = scheduled_stream(
+        get_scheduler("openrouter"),
+        lambda: provider_health.guarded_stream("DeepSeek", astream_chat_completion(client, DEEPSEEK_MODEL, messages, extra_headers=OPENROUTER_HEADERS, max_tokens=budget, prefix_tokens=estimate_tokens(prefix))),
+        estimate_tokens(request_text, resume_template),
+        priority,
+        on_give_up=lambda error: provider_health.record_given_up("DeepSeek", error)
+    )
+    tokens = budgeted_stream(tokens, budget, resume_template)
+    return coalesced_stream(cache_key, tokens, use_cache)
+
+def stream_cover_letter_deepseek(client, resume, job_description, prompt, template, use_cache=True, priority=INTERACTIVE):
+    cache_key = make_cache_key("openrouter", DEEPSEEK_MODEL, prompt, job_description, resume, template)
+    prefix = cover_letter_request_prefix(prompt, template)
+    request_text = join_request(prefix, cover_letter_request_suffix(job_description, resume))
+    messages = [
+        {"role": "system", "content": "You are a professional cover letter writer."},
+        {"role": "user", "content": request_text}
+    ]
+    budget = output_budget(template, reasoning=True)
+    tokens = scheduled_stream(
+        get_scheduler("openrouter"),
+        lambda: provider_health.guarded_stream("DeepSeek", astream_chat_completion(client, DEEPSEEK_MODEL, messages, extra_headers=OPENROUTER_HEADERS, max_tokens=budget, prefix_tokens=estimate_tokens(prefix))),
+        estimate_tokens(request_text, template),
+        priority,
+        on_give_up=lambda error: provider_health.record_given_up("DeepSeek", error)
+    )
+    tokens = budgeted_stream(tokens, budget, template)
+    return coalesced_stream(cache_key, tokens, use_cache)
+
+def coalesced_stream(cache_key, tokens, use_cache):
+    # Identical concurrent requests (double clicks, the same posting from several users) share one
+    # provider call; a request that bypasses the cache only joins others that bypass it too
+    return single_flight.stream(
+        (cache_key, use_cache),
+        lambda: acached_stream(response_cache, cache_key, tokens, use_cache)
+    )
+
+def configured_model_choices():
+    choices = []
+    if registry.gemini_available():
+        choices.append("Gemini")
+    if registry.openrouter_available():
+        choices.append("DeepSeek")
+    return choices
+
+def available_model_choices():
+    # Configured providers whose circuit breaker lets calls through
+    return [choice for choice in configured_model_choices() if provider_health.available(choice)]
+
+def unavailable_message(model_choice):
+    return provider_health.unavailable_reason(model_choice) or f"{model_choice} API is not available"
+
+def reroute_notice(model_choice):
+    # Shown when the selected provider's circuit is open and another one takes the request
+    if model_choice == FASTEST_CHOICE or provider_health.available(model_choice):
+        return ""
+    others = [choice for choice in available_model_choices() if choice != model_choice]
+    if not others:
+        return ""
+    return f"⚠ {provider_health.unavailable_reason(model_choice)}; using {others[0]} instead\n"
+
+def hedged_model_stream(stream_for):
+    providers = rank_providers(available_model_choices())
+    if not providers:
+        return None
+    if len(providers) == 1:
+        return stream_for(providers[0])
+    return hedged_stream(stream_for, providers)
+
+def fallback_model_stream(stream_for, model_choice):
+    # stream_for(choice) returns that provider's stream or None. If the output diverges before
+    # any LaTeX reached the caller, or the provider's circuit opened while the request waited for
+    # the scheduler, the next available provider takes over. An open circuit reroutes up front.
+    others = [choice for choice in available_model_choices() if choice != model_choice]
+    if not provider_health.available(model_choice):
+        return stream_for(others[0]) if others else None
+    stream = stream_for(model_choice)
+    if stream is None or not others:
+        return stream
+    return fallback_stream(stream, lambda: stream_for(others[0]), reroute=(OutputDiverged, ProviderUnavailable))
+
+def provider_resume_stream(model_choice, resume_template, job_description, prompt, use_cache=True, priority=INTERACTIVE):
+    openrouter = registry.openrouter()
+    if model_choice == "Gemini" and registry.gemini_available():
+        return stream_resume_gemini(resume_template, job_description, prompt, use_cache, priority)
+    if model_choice == "DeepSeek" and openrouter is not None:
+        return stream_resume_deepseek(openrouter.async_client, resume_template, job_description, prompt, use_cache, priority)
+    return None
+
+def provider_cover_letter_stream(model_choice, resume, job_description, prompt, template, use_cache=True, priority=INTERACTIVE):
+    openrouter = registry.openrouter()
+    if model_choice == "Gemini" and registry.gemini_available():
+        return stream_cover_letter_gemini(resume, job_description, prompt, template, use_cache, priority)
+    if model_choice == "DeepSeek" and openrouter is not None:
+        return stream_cover_letter_deepseek(openrouter.async_client, resume, job_description, prompt, template, use_cache, priority)
+    return None
+
+def stream_resume(model_choice, resume_template, job_description, prompt, use_cache=True, priority=INTERACTIVE):
+    if model_choice == FASTEST_CHOICE:
+        stream = hedged_model_stream(
+            lambda choice: stream_resume(choice, resume_template, job_description, prompt, use_cache, priority)
         )
-        
-        return True, response.choices[0].message.content, "Resume customized successfully using DeepSeek"
-    except Exception as e:
-        return False, None, f"Error customizing resume with DeepSeek: {str(e)}"
+    else:
+        stream = fallback_model_stream(
+            lambda choice: provider_resume_stream(choice, resume_template, job_description, prompt, use_cache, priority),
+            model_choice
+        )
+    return None if stream is None else metrics.timed_stream("resume", stream, model_choice)
 
-def generate_cover_letter_deepseek(client, resume, job_description, prompt, template):
-    try:
-        full_prompt = f"{prompt}\n\nJob Description:\n{job_description}\n\nResume:\n{resume}\n\nCover Letter Template:\n{template}"
-        
-        response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://resume-customizer.app",
-                "X-Title": "Resume Customizer App",
-            },
-            model="deepseek/deepseek-r1:free",
-            messages=[
-                {"role": "system", "content": "You are a professional cover letter writer."},
-                {"role": "user", "content": full_prompt}
-            ]
+def stream_cover_letter(model_choice, resume, job_description, prompt, template, use_cache=True, priority=INTERACTIVE):
+    if model_choice == FASTEST_CHOICE:
+        stream = hedged_model_stream(
+            lambda choice: stream_cover_letter(choice, resume, job_description, prompt, template, use_cache, priority)
         )
-        
-        return True, response.choices[0].message.content, "Cover letter generated successfully using DeepSeek"
-    except Exception as e:
-        return False, None, f"Error generating cover letter with DeepSeek: {str(e)}"
+    else:
+        stream = fallback_model_stream(
+            lambda choice: provider_cover_letter_stream(choice, resume, job_description, prompt, template, use_cache, priority),
+            model_choice
+        )
+    return None if stream is None else metrics.timed_stream("cover_letter", stream, model_choice)
+
+def stream_packed(model_choice, prefix, suffix, budget, priority=INTERACTIVE):
+    # One request covering several job descriptions (batch.py --pack). Not cached: only the
+    # per-job documents split out of the response are used.
+    if model_choice == FASTEST_CHOICE:
+        ranked = rank_providers(available_model_choices())
+        model_choice = ranked[0] if ranked else None
+    openrouter = registry.openrouter()
+    if model_choice == "Gemini" and registry.gemini_available():
+        scheduler = get_scheduler("gemini")
+        factory = lambda: provider_health.guarded_stream("Gemini", astream_gemini_prefixed(GEMINI_MODEL, prefix, suffix, max_output_tokens=budget))
+    elif model_choice == "DeepSeek" and openrouter is not None:
+        scheduler = get_scheduler("openrouter")
+        messages = [
+            {"role": "system", "content": "You are a professional resume and cover letter writer."},
+            {"role": "user", "content": join_request(prefix, suffix)}
+        ]
+        factory = lambda: provider_health.guarded_stream("DeepSeek", astream_chat_completion(
+            openrouter.async_client, DEEPSEEK_MODEL, messages, extra_headers=OPENROUTER_HEADERS,
+            max_tokens=budget + REASONING_ALLOWANCE_TOKENS, prefix_tokens=estimate_tokens(prefix)
+        ))
+    else:
+        return None
+    tokens = scheduled_stream(
+        scheduler, factory, estimate_tokens(prefix, suffix) + budget, priority,
+        on_give_up=lambda error: provider_health.record_given_up(model_choice, error)
+    )
+    return metrics.timed_stream("packed", budgeted_stream(tokens, budget, ""), model_choice)
 
 # Global state and initialization
+response_cache = get_cache()
+artifact_store = get_artifact_store()
+job_index = get_job_index()
+metrics.register_gauge("resume_builder_cache_hits", "Response cache hits since start", lambda: response_cache.hits)
+metrics.register_gauge("resume_builder_cache_misses", "Response cache misses since start", lambda: response_cache.misses)
+metrics.register_gauge("resume_builder_cache_hit_ratio", "Response cache hit ratio since start", lambda: response_cache.stats()["hit_ratio"])
+metrics.register_gauge("resume_builder_running_jobs", "Generation jobs currently running", job_registry.running)
+metrics.register_gauge("resume_builder_open_circuits", "Providers whose circuit breaker is open or half-open", provider_health.open_circuits)
+metrics.register_gauge("resume_builder_queued_jobs", "Background jobs waiting in the job queue", lambda: get_job_queue().counts().get(QUEUED, 0))
+# Probes run in a background thread started once the first page has loaded
+provider_health.register_probe("Gemini", lambda: registry.probe_gemini(GEMINI_MODEL, PROBE_TIMEOUT_SECONDS), registry.gemini_available)
+provider_health.register_probe("DeepSeek", lambda: registry.probe_openrouter(PROBE_TIMEOUT_SECONDS), registry.openrouter_available)
 resume_prompt, cover_letter_prompt = load_prompts()
+initial_resume_template = load_template("resume")
+initial_cover_letter_template = load_template("cover_letter")
 gemini_available, gemini_status = initialize_gemini_api()
 deepseek_available, deepseek_client, deepseek_status = initialize_deepseek_api()
 
 # Callback functions
-def upload_resume_template(file):
+def upload_resume_template(file, session_id):
     if file is None:
-        return "No file uploaded", load_template("resume"), gr.update(visible=False)
+        return "No file uploaded", load_template("resume"), gr.update(visible=False), gr.update()
     
     content = file.decode("utf-8")
     save_template("resume", content)
-    return "Resume template uploaded and saved", content, gr.update(visible=True)
+    remember_text(session_id, "resume_template", content)
+    return "Resume template uploaded and saved", content, gr.update(visible=True), gr.update(choices=section_titles(content), value=[])
 
-def upload_cover_letter_template(file):
+def upload_cover_letter_template(file, session_id):
     if file is None:
         return "No file uploaded", load_template("cover_letter"), gr.update(visible=False)
     
     content = file.decode("utf-8")
     save_template("cover_letter", content)
+    remember_text(session_id, "cover_letter_template", content)
     return "Cover letter template uploaded and saved", content, gr.update(visible=True)
 
 def save_prompt_settings(resume_prompt_input, cover_letter_prompt_input):
     save_prompts(resume_prompt_input, cover_letter_prompt_input)
     return "Prompts saved successfully"
 
+def provider_status_line(name, health):
+    if health["state"] == CLOSED:
+        state = "✓ Healthy"
+    elif health["state"] == HALF_OPEN:
+        state = f"◐ Recovering, next call is a trial (last error: {health['last_error']})"
+    else:
+        state = f"✗ Failing: {health['last_error']}, retrying in {health['retry_in']:.0f}s"
+    latency = []
+    if health["median_latency"] is not None:
+        latency.append(f"first token {health['median_latency']:.1f}s median, {health['last_latency']:.1f}s last")
+    if health["probe_latency"] is not None:
+        latency.append(f"probe {health['probe_latency'] * 1000:.0f} ms" + (" (failed)" if health["probe_error"] else ""))
+    return f"{name} API: {state}" + (f" — {'; '.join(latency)}" if latency else "") + "\n"
+
 def update_api_status():
-    gemini_available, gemini_status = initialize_gemini_api()
-    deepseek_available, deepseek_client, deepseek_status = initialize_deepseek_api()
+    # Breaker state and latencies come from the health cache, so page loads never call a provider
+    configured = configured_model_choices()
+    health = provider_health.status(configured)
+    status_text = ""
+    for name in ("Gemini", "DeepSeek"):
+        status_text += provider_status_line(name, health[name]) if name in configured else f"{name} API: ✗ Not configured\n"
     
-    status_text = f"Gemini API: {'✓ Available' if gemini_available else '✗ Unavailable'}\n"
-    status_text += f"DeepSeek API: {'✓ Available' if deepseek_available else '✗ Unavailable'}"
+    cache_stats = response_cache.stats()
+    status_text += f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} entries)"
     
     return status_text
 
@@ -234,105 +444,518 @@ def save_openrouter_key(api_key):
     
     os.environ["OPENROUTER_API_KEY"] = api_key
     success, client, message = initialize_deepseek_api(api_key)
+    provider_health.reset("DeepSeek")
     
     if success:
-        global deepseek_available, deepseek_client
-        deepseek_available = True
-        deepseek_client = client
         return "OpenRouter API key saved successfully", update_api_status()
     else:
         return f"Error: {message}", update_api_status()
 
-def generate_documents(job_description, model_choice, resume_template_text, cover_letter_template_text, resume_prompt_input, cover_letter_prompt_input):
+# Local LaTeX repair: every generated document is cleaned up and balanced locally, and only the
+# sections that could not be repaired are sent back to the model
+def resume_section_regenerator(model_choice, job_description, prompt, use_cache=True, priority=INTERACTIVE):
+    return lambda section_template: stream_resume(model_choice, section_template, job_description, prompt + SECTION_INSTRUCTIONS, use_cache, priority)
+
+async def repair_document(text, template, regenerate=None):
+    # regenerate(section_template) returns a token stream for the given template sections, or None
+    result = repair_latex(text, template)
+    latex = result.latex
+    notes = list(result.fixes)
+    if result.broken_sections and regenerate is not None:
+        titles = result.broken_sections
+        section_template = split_sections(template).body(titles)
+        stream = regenerate(section_template)
+        if stream is not None:
+            generated = ""
+            try:
+                async for token in stream:
+                    generated += token
+                sections = repair_latex(generated, section_template).latex
+                latex = replace_sections(split_sections(latex), titles, sections).to_latex()
+                notes.append("regenerated " + ", ".join(titles))
+            except Exception as e:
+                notes.append(f"could not regenerate {', '.join(titles)}: {str(e)}")
+    return latex, notes
+
+def repair_status(document_name, notes):
+    return f"✓ Repaired {document_name} LaTeX: {'; '.join(notes)}\n" if notes else ""
+
+async def generate_documents(job_description, model_choice, resume_template_text, cover_letter_template_text, resume_prompt_input, cover_letter_prompt_input, parallel_cover_letter=False, refresh_cover_letter=False, reuse_similar=False):
     if not job_description:
-        return "Please enter a job description", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        yield "Please enter a job description", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
     
     if not resume_template_text:
-        return "Resume template is missing", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        yield "Resume template is missing", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
     
     if not cover_letter_template_text:
-        return "Cover letter template is missing", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        yield "Cover letter template is missing", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
     
     # Initialize status
-    status_text = f"Generating documents using {model_choice}...\n"
+    status_text = f"Generating documents using {model_choice}...\n" + reroute_notice(model_choice)
     generation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    # Customize resume
-    if model_choice == "Gemini" and gemini_available:
-        success, customized_resume, message = customize_resume_gemini(resume_template_text, job_description, resume_prompt_input)
-    elif model_choice == "DeepSeek" and deepseek_available:
-        success, customized_resume, message = customize_resume_deepseek(deepseek_client, resume_template_text, job_description, resume_prompt_input)
-    else:
-        return f"{model_choice} API is not available", "", "", "", gr.update(visible=False), gr.update(visible=False)
+    # Reposts of a job description only differ in links, dates or whitespace; offer the documents
+    # generated for the earlier posting instead of a cold generation
+    context = context_key(model_choice, resume_template_text, cover_letter_template_text, resume_prompt_input, cover_letter_prompt_input)
+    match = job_index.lookup(job_description, context) if reuse_similar else None
+    if match is not None:
+        artifact_store.put(match.resume, "customized_resume")
+        artifact_store.put(match.cover_letter, "cover_letter")
+        generated_at = datetime.fromtimestamp(match.created).strftime("%Y-%m-%d %H:%M:%S")
+        yield f"Reused documents generated on {generated_at} for a near-identical job description ({match.similarity:.0%} similar).\nUntick 'Reuse documents for near-duplicate job descriptions' to generate new ones.", match.resume, match.cover_letter, generated_at, gr.update(visible=True), gr.update(visible=True)
+        return
     
-    if not success:
-        return f"Error: {message}", "", "", "", gr.update(visible=False), gr.update(visible=False)
+    if parallel_cover_letter:
+        async for update in generate_documents_pipelined(status_text, generation_time, job_description, model_choice, resume_template_text, cover_letter_template_text, resume_prompt_input, cover_letter_prompt_input, refresh_cover_letter, context):
+            yield update
+        return
     
+    # Customize resume, streaming partial LaTeX into the resume tab
+    resume_stream = stream_resume(model_choice, resume_template_text, job_description, resume_prompt_input)
+    if resume_stream is None:
+        yield unavailable_message(model_choice), "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
+    
+    customized_resume = ""
+    try:
+        async for token in resume_stream:
+            customized_resume += token
+            yield status_text + "Customizing resume...", customized_resume, "", "", gr.update(visible=False), gr.update(visible=False)
+    except Exception as e:
+        yield f"Error: Error customizing resume with {model_choice}: {str(e)}", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
+    
+    if not customized_resume:
+        yield f"Error: {model_choice} returned an empty resume", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
+    
+    customized_resume, notes = await repair_document(customized_resume, resume_template_text, resume_section_regenerator(model_choice, job_description, resume_prompt_input))
     status_text += f"✓ Resume customized successfully\n"
+    status_text += repair_status("resume", notes)
     
     # Generate cover letter
-    if model_choice == "Gemini" and gemini_available:
-        success, cover_letter, message = generate_cover_letter_gemini(customized_resume, job_description, cover_letter_prompt_input, cover_letter_template_text)
-    elif model_choice == "DeepSeek" and deepseek_available:
-        success, cover_letter, message = generate_cover_letter_deepseek(deepseek_client, customized_resume, job_description, cover_letter_prompt_input, cover_letter_template_text)
-    else:
-        return f"{model_choice} API is not available", customized_resume, "", generation_time, gr.update(visible=True), gr.update(visible=False)
+    cover_letter_stream = stream_cover_letter(model_choice, customized_resume, job_description, cover_letter_prompt_input, cover_letter_template_text)
+    if cover_letter_stream is None:
+        yield unavailable_message(model_choice), customized_resume, "", generation_time, gr.update(visible=True), gr.update(visible=False)
+        return
     
-    if not success:
-        return f"Resume customized, but error generating cover letter: {message}", customized_resume, "", generation_time, gr.update(visible=True), gr.update(visible=False)
+    cover_letter = ""
+    try:
+        async for token in cover_letter_stream:
+            cover_letter += token
+            yield status_text + "Generating cover letter...", gr.update(), cover_letter, "", gr.update(), gr.update()
+    except Exception as e:
+        yield f"Resume customized, but error generating cover letter: Error generating cover letter with {model_choice}: {str(e)}", customized_resume, "", generation_time, gr.update(visible=True), gr.update(visible=False)
+        return
     
+    cover_letter, notes = await repair_document(cover_letter, cover_letter_template_text)
     status_text += f"✓ Cover letter generated successfully\n"
+    status_text += repair_status("cover letter", notes)
     status_text += f"Documents ready for download"
     
-    # Save files temporarily for download
-    resume_file = f"customized_resume_{int(time.time())}.tex"
-    with open(resume_file, "w") as f:
-        f.write(customized_resume)
-    
-    cover_letter_file = f"cover_letter_{int(time.time())}.tex"
-    with open(cover_letter_file, "w") as f:
-        f.write(cover_letter)
+    # Store files for download
+    artifact_store.put(customized_resume, "customized_resume")
+    artifact_store.put(cover_letter, "cover_letter")
+    job_index.add(job_description, context, customized_resume, cover_letter)
     
-    return status_text, customized_resume, cover_letter, generation_time, gr.update(visible=True), gr.update(visible=True)
+    yield status_text, customized_resume, cover_letter, generation_time, gr.update(visible=True), gr.update(visible=True)
 
-def regenerate_resume(job_description, model_choice, resume_template_text, resume_prompt_input, current_cover_letter, generation_time, dl_resume_visible, dl_cl_visible):
-    if model_choice == "Gemini" and gemini_available:
-        success, customized_resume, message = customize_resume_gemini(resume_template_text, job_description, resume_prompt_input)
-    elif model_choice == "DeepSeek" and deepseek_available:
-        success, customized_resume, message = customize_resume_deepseek(deepseek_client, resume_template_text, job_description, resume_prompt_input)
-    else:
-        return f"{model_choice} API is not available", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+async def generate_documents_pipelined(status_text, generation_time, job_description, model_choice, resume_template_text, cover_letter_template_text, resume_prompt_input, cover_letter_prompt_input, refresh_cover_letter, context):
+    # The cover letter is written from a plain-text summary of the original template while the
+    # resume is being customized, so wall-clock time is the longer of the two calls, not their sum
+    resume_stream = stream_resume(model_choice, resume_template_text, job_description, resume_prompt_input)
+    cover_letter_stream = stream_cover_letter(model_choice, latex_to_text(resume_template_text), job_description, cover_letter_prompt_input, cover_letter_template_text)
+    if resume_stream is None or cover_letter_stream is None:
+        yield unavailable_message(model_choice), "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
+    
+    customized_resume = ""
+    cover_letter = ""
+    errors = {}
+    async for name, token, error in merge_token_streams({"resume": resume_stream, "cover_letter": cover_letter_stream}):
+        if error is not None:
+            errors[name] = error
+        elif token is None:
+            continue
+        elif name == "resume":
+            customized_resume += token
+            yield status_text + "Generating resume and cover letter in parallel...", customized_resume, gr.update(), "", gr.update(visible=False), gr.update(visible=False)
+        else:
+            cover_letter += token
+            yield status_text + "Generating resume and cover letter in parallel...", gr.update(), cover_letter, "", gr.update(visible=False), gr.update(visible=False)
+    
+    if "resume" in errors or not customized_resume:
+        reason = str(errors["resume"]) if "resume" in errors else "empty response"
+        yield f"Error: Error customizing resume with {model_choice}: {reason}", "", "", "", gr.update(visible=False), gr.update(visible=False)
+        return
+    
+    customized_resume, notes = await repair_document(customized_resume, resume_template_text, resume_section_regenerator(model_choice, job_description, resume_prompt_input))
+    status_text += f"✓ Resume customized successfully\n"
+    status_text += repair_status("resume", notes)
+    
+    if "cover_letter" in errors:
+        yield f"Resume customized, but error generating cover letter: Error generating cover letter with {model_choice}: {str(errors['cover_letter'])}", customized_resume, "", generation_time, gr.update(visible=True), gr.update(visible=False)
+        return
     
-    if not success:
-        return f"Error: {message}", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+    if refresh_cover_letter:
+        cover_letter_stream = stream_cover_letter(model_choice, customized_resume, job_description, cover_letter_prompt_input, cover_letter_template_text)
+        refreshed = ""
+        try:
+            async for token in cover_letter_stream:
+                refreshed += token
+                yield status_text + "Refreshing cover letter against the final resume...", gr.update(), refreshed, "", gr.update(), gr.update()
+        except Exception as e:
+            yield f"Resume customized, but error refreshing cover letter: {str(e)}", customized_resume, cover_letter, generation_time, gr.update(visible=True), gr.update(visible=True)
+            return
+        cover_letter = refreshed
     
-    # Save file temporarily for download
-    resume_file = f"customized_resume_{int(time.time())}.tex"
-    with open(resume_file, "w") as f:
-        f.write(customized_resume)
+    cover_letter, notes = await repair_document(cover_letter, cover_letter_template_text)
+    status_text += f"✓ Cover letter generated successfully\n"
+    status_text += repair_status("cover letter", notes)
+    status_text += f"Documents ready for download"
+    
+    # Store files for download
+    artifact_store.put(customized_resume, "customized_resume")
+    artifact_store.put(cover_letter, "cover_letter")
+    job_index.add(job_description, context, customized_resume, cover_letter)
     
-    return f"Resume regenerated successfully using {model_choice}", customized_resume, current_cover_letter, generation_time, dl_resume_visible, dl_cl_visible
+    yield status_text, customized_resume, cover_letter, generation_time, gr.update(visible=True), gr.update(visible=True)
 
-def regenerate_cover_letter(job_description, model_choice, current_resume, resume_template_text, cover_letter_template_text, cover_letter_prompt_input, generation_time, dl_resume_visible, dl_cl_visible):
-    if model_choice == "Gemini" and gemini_available:
-        success, cover_letter, message = generate_cover_letter_gemini(current_resume, job_description, cover_letter_prompt_input, cover_letter_template_text)
-    elif model_choice == "DeepSeek" and deepseek_available:
-        success, cover_letter, message = generate_cover_letter_deepseek(deepseek_client, current_resume, job_description, cover_letter_prompt_input, cover_letter_template_text)
+async def regenerate_resume(job_description, model_choice, resume_template_text, resume_prompt_input, current_resume, current_cover_letter, generation_time, dl_resume_visible, dl_cl_visible, bypass_cache, selected_sections):
+    # Only the content sections being rewritten are sent to the model; the preamble and header
+    # stay local and the output is spliced back in. Selected sections replace the ones in the
+    # current resume so earlier customizations of the other sections are kept; selected sections
+    # the current resume no longer has (renamed or removed) are skipped and reported.
+    template_document = split_sections(resume_template_text)
+    titles = [title for title in template_document.titles() if not selected_sections or title in selected_sections]
+    base_document = None
+    missing = []
+    request_template = resume_template_text
+    request_prompt = resume_prompt_input
+    if titles:
+        base_document = template_document
+        if selected_sections and current_resume:
+            base_document = split_sections(current_resume)
+            missing = [title for title in titles if title not in base_document.titles()]
+            titles = [title for title in titles if title not in missing]
+            if not titles:
+                yield "Error: None of the selected sections are in the current resume (" + ", ".join(missing) + "); regenerate the whole resume instead", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+                return
+        request_template = template_document.body(titles)
+        request_prompt = resume_prompt_input + SECTION_INSTRUCTIONS
+    
+    resume_stream = stream_resume(model_choice, request_template, job_description, request_prompt, use_cache=not bypass_cache)
+    if resume_stream is None:
+        yield unavailable_message(model_choice), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    
+    progress = f"Regenerating {len(titles)} resume section(s) using {model_choice}..." if selected_sections and titles else f"Regenerating resume using {model_choice}..."
+    generated = ""
+    customized_resume = ""
+    try:
+        async for token in resume_stream:
+            generated += token
+            customized_resume = generated if base_document is None else replace_sections(base_document, titles, generated).to_latex()
+            yield progress, customized_resume, gr.update(), gr.update(), gr.update(), gr.update()
+    except Exception as e:
+        yield f"Error: Error customizing resume with {model_choice}: {str(e)}", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    
+    # Section output is repaired on its own, before it is spliced into the document
+    regenerate = resume_section_regenerator(model_choice, job_description, resume_prompt_input, use_cache=not bypass_cache)
+    if base_document is None:
+        customized_resume, notes = await repair_document(generated, resume_template_text, regenerate)
     else:
-        return f"{model_choice} API is not available", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        sections, notes = await repair_document(generated, request_template, regenerate)
+        customized_resume = replace_sections(base_document, titles, sections).to_latex()
     
-    if not success:
-        return f"Error: {message}", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+    # Store file for download
+    artifact_store.put(customized_resume, "customized_resume")
     
-    # Save file temporarily for download
-    cover_letter_file = f"cover_letter_{int(time.time())}.tex"
-    with open(cover_letter_file, "w") as f:
-        f.write(cover_letter)
+    skipped = f"⚠ Skipped section(s) not in the current resume: {', '.join(missing)}\n" if missing else ""
+    yield f"Resume regenerated successfully using {model_choice}\n" + skipped + repair_status("resume", notes), customized_resume, current_cover_letter, generation_time, dl_resume_visible, dl_cl_visible
+
+async def regenerate_cover_letter(job_description, model_choice, current_resume, resume_template_text, cover_letter_template_text, cover_letter_prompt_input, generation_time, dl_resume_visible, dl_cl_visible, bypass_cache):
+    cover_letter_stream = stream_cover_letter(model_choice, current_resume, job_description, cover_letter_prompt_input, cover_letter_template_text, use_cache=not bypass_cache)
+    if cover_letter_stream is None:
+        yield unavailable_message(model_choice), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
     
-    return f"Cover letter regenerated successfully using {model_choice}", current_resume, cover_letter, generation_time, dl_resume_visible, dl_cl_visible
+    cover_letter = ""
+    try:
+        async for token in cover_letter_stream:
+            cover_letter += token
+            yield f"Regenerating cover letter using {model_choice}...", gr.update(), cover_letter, gr.update(), gr.update(), gr.update()
+    except Exception as e:
+        yield f"Error: Error generating cover letter with {model_choice}: {str(e)}", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    
+    cover_letter, notes = await repair_document(cover_letter, cover_letter_template_text)
+    
+    # Store file for download
+    artifact_store.put(cover_letter, "cover_letter")
+    
+    yield f"Cover letter regenerated successfully using {model_choice}\n" + repair_status("cover letter", notes), current_resume, cover_letter, generation_time, dl_resume_visible, dl_cl_visible
+
+# Session-backed handlers: the browser sends a session id and the job description, while
+# templates, prompts and the current documents stay in the server-side session store
+SESSION_EXPIRED = "Your session has expired, please reload the page"
+
+def start_session():
+    return session_store.create({
+        "resume_template": initial_resume_template,
+        "cover_letter_template": initial_cover_letter_template,
+        "resume_prompt": resume_prompt,
+        "cover_letter_prompt": cover_letter_prompt,
+    })
+
+def remember_text(session_id, slot, text):
+    try:
+        session_store.set_text(session_id, slot, text)
+    except KeyError:
+        # Expired session; the next generation reports it
+        pass
+    except SessionLimitError as e:
+        gr.Warning(str(e))
+
+def remember_resume_template(session_id, text):
+    remember_text(session_id, "resume_template", text)
+    return gr.update(choices=section_titles(text), value=[])
+
+# Edited text reaches the session store through a .blur event, which is a separate queue event
+# from the button click that uses it and can finish after it. Clicks therefore send a fingerprint
+# (32-bit FNV-1a over UTF-16 code units, cheap to compute in the browser) of each text they use,
+# and the handler waits for the session to hold that text.
+FINGERPRINT_JS = """
+(...args) => {
+    const fingerprint = (text) => {
+        let hash = 0x811c9dc5;
+        text = text || "";
+        for (let i = 0; i < text.length; i++) {
+            hash ^= text.charCodeAt(i);
+            hash = Math.imul(hash, 0x01000193) >>> 0;
+        }
+        return hash.toString(16);
+    };
+    // Gradio passes the output values after the inputs
+    const inputs = args.slice(0, INPUTS);
+    return [...inputs.slice(0, -TEXTS), ...inputs.slice(-TEXTS).map(fingerprint)];
+}
+"""
+SYNC_POLL_SECONDS = 0.05
+SYNC_WAIT_SECONDS = 3.0
+SLOT_LABELS = {
+    "resume_template": "resume template",
+    "cover_letter_template": "cover letter template",
+    "resume_prompt": "resume prompt",
+    "cover_letter_prompt": "cover letter prompt",
+    "resume": "resume",
+}
+
+def fingerprint_js(inputs, texts):
+    # Event js that replaces the last texts of the inputs (text boxes) with their fingerprints
+    return FINGERPRINT_JS.replace("INPUTS", str(inputs)).replace("TEXTS", str(texts))
+
+@functools.lru_cache(maxsize=256)
+def text_fingerprint(text):
+    fingerprint = 0x811c9dc5
+    data = (text or "").encode("utf-16-le")
+    for index in range(0, len(data), 2):
+        fingerprint ^= data[index] | data[index + 1] << 8
+        fingerprint = (fingerprint * 0x01000193) & 0xffffffff
+    return format(fingerprint, "x")
+
+async def wait_for_session_sync(session_id, fingerprints):
+    # fingerprints: {slot: fingerprint of the text shown in the browser}. Returns the slots whose
+    # edit has still not arrived after SYNC_WAIT_SECONDS.
+    for _ in range(int(SYNC_WAIT_SECONDS / SYNC_POLL_SECONDS)):
+        stale = [slot for slot, fingerprint in fingerprints.items() if text_fingerprint(session_store.get_text(session_id, slot)) != fingerprint]
+        if not stale:
+            return []
+        await asyncio.sleep(SYNC_POLL_SECONDS)
+    return stale
+
+def sync_error(stale):
+    return "Your latest edits to the " + ", ".join(SLOT_LABELS[slot] for slot in stale) + " have not been saved yet, please try again"
+
+def session_texts(session_id):
+    slots = ("resume_template", "cover_letter_template", "resume_prompt", "cover_letter_prompt", "resume", "cover_letter")
+    return {slot: session_store.get_text(session_id, slot) for slot in slots}
+
+async def relay_to_session(session_id, texts, updates):
+    # Only send output text that differs from what the browser already shows, and keep the
+    # documents the browser ended up with in the session for the regenerate handlers, also when
+    # the request is stopped, replaced or fails part way
+    shown = {1: texts["resume"], 2: texts["cover_letter"]}
+    try:
+        async for update in updates:
+            update = list(update)
+            for index in (1, 2):
+                if isinstance(update[index], str):
+                    if shown[index] == update[index]:
+                        update[index] = gr.update()
+                    else:
+                        shown[index] = update[index]
+            yield tuple(update)
+    finally:
+        remember_text(session_id, "resume", shown[1])
+        remember_text(session_id, "cover_letter", shown[2])
+
+async def follow_queued_job(queue_job_id):
+    # Streams a background job's progress from the durable queue until it finishes
+    job_queue = get_job_queue()
+    try:
+        while True:
+            job = await asyncio.to_thread(job_queue.get, queue_job_id)
+            if job is None:
+                yield f"Unknown background job `{queue_job_id}`", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+                return
+            progress = job.result if job.status == DONE else job.progress or {}
+            resume = progress.get("resume", "")
+            cover_letter = progress.get("cover_letter", "")
+            if job.status == DONE:
+                yield progress["status"], resume, cover_letter, progress["generation_time"], gr.update(visible=True), gr.update(visible=True)
+                return
+            if job.finished:
+                outcome = "was cancelled" if job.status == CANCELLED else f"failed after {job.attempts} attempt(s): {job.error}"
+                yield f"Background job `{job.id}` {outcome}", resume or gr.update(), cover_letter or gr.update(), "", gr.update(visible=bool(resume)), gr.update(visible=bool(cover_letter))
+                return
+            if job.status == QUEUED:
+                waiting = f"{await asyncio.to_thread(job_queue.position, job.id)} job(s) ahead"
+                if job.error:
+                    waiting = f"retrying after attempt {job.attempts} failed: {job.error}"
+                yield f"Background job `{job.id}` queued ({waiting})", gr.update(), gr.update(), "", gr.update(), gr.update()
+            else:
+                status = progress.get("status") or f"Generating documents using {job.payload['model_choice']}..."
+                yield f"Background job `{job.id}`, attempt {job.attempts}/{job.max_attempts}\n{status}", resume, cover_letter or gr.update(), "", gr.update(visible=False), gr.update(visible=False)
+            await asyncio.sleep(QUEUE_POLL_SECONDS)
+    except (asyncio.CancelledError, GeneratorExit):
+        # Stop, a newer generation or a model switch cancel the job; a closed tab leaves it running
+        if job_registry.current_status() != DISCONNECTED:
+            await asyncio.to_thread(job_queue.cancel, queue_job_id)
+        raise
+
+async def queued_generation(job_description, model_choice, texts, parallel_cover_letter, refresh_cover_letter, reuse_similar):
+    queue_job_id = await asyncio.to_thread(get_job_queue().submit, "generate_documents", {
+        "job_description": job_description,
+        "model_choice": model_choice,
+        "resume_template": texts["resume_template"],
+        "cover_letter_template": texts["cover_letter_template"],
+        "resume_prompt": texts["resume_prompt"],
+        "cover_letter_prompt": texts["cover_letter_prompt"],
+        "parallel_cover_letter": parallel_cover_letter,
+        "refresh_cover_letter": refresh_cover_letter,
+        "reuse_similar": reuse_similar,
+    })
+    async for update in follow_queued_job(queue_job_id):
+        yield update
+
+async def generate_documents_session(job_description, model_choice, session_id, parallel_cover_letter, refresh_cover_letter, reuse_similar, background_job, resume_template_fingerprint, cover_letter_template_fingerprint, resume_prompt_fingerprint, cover_letter_prompt_fingerprint, request: gr.Request):
+    if not session_id or not session_store.exists(session_id):
+        yield SESSION_EXPIRED, gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    stale = await wait_for_session_sync(session_id, {
+        "resume_template": resume_template_fingerprint,
+        "cover_letter_template": cover_letter_template_fingerprint,
+        "resume_prompt": resume_prompt_fingerprint,
+        "cover_letter_prompt": cover_letter_prompt_fingerprint,
+    })
+    if stale:
+        yield sync_error(stale), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    texts = session_texts(session_id)
+    if background_job:
+        # Runs in a job_worker.py process and survives server restarts; follow it by id after one
+        updates = queued_generation(job_description, model_choice, texts, parallel_cover_letter, refresh_cover_letter, reuse_similar)
+    else:
+        updates = generate_documents(job_description, model_choice, texts["resume_template"], texts["cover_letter_template"], texts["resume_prompt"], texts["cover_letter_prompt"], parallel_cover_letter, refresh_cover_letter, reuse_similar)
+    # A new generation supersedes the session's running one, which is cancelled
+    async for update in run_job(request.session_hash, "generate_documents", relay_to_session(session_id, texts, updates)):
+        yield update
+
+async def regenerate_resume_session(job_description, model_choice, session_id, bypass_cache, selected_sections, resume_template_fingerprint, resume_prompt_fingerprint, resume_fingerprint, request: gr.Request):
+    if not session_id or not session_store.exists(session_id):
+        yield SESSION_EXPIRED, gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    stale = await wait_for_session_sync(session_id, {
+        "resume_template": resume_template_fingerprint,
+        "resume_prompt": resume_prompt_fingerprint,
+        "resume": resume_fingerprint,
+    })
+    if stale:
+        yield sync_error(stale), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    texts = session_texts(session_id)
+    updates = regenerate_resume(job_description, model_choice, texts["resume_template"], texts["resume_prompt"], texts["resume"], gr.update(), gr.update(), gr.update(), gr.update(), bypass_cache, selected_sections)
+    # A new generation supersedes the session's running one, which is cancelled
+    async for update in run_job(request.session_hash, "regenerate_resume", relay_to_session(session_id, texts, updates)):
+        yield update
+
+async def regenerate_cover_letter_session(job_description, model_choice, session_id, bypass_cache, resume_fingerprint, resume_template_fingerprint, cover_letter_template_fingerprint, cover_letter_prompt_fingerprint, request: gr.Request):
+    if not session_id or not session_store.exists(session_id):
+        yield SESSION_EXPIRED, gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    stale = await wait_for_session_sync(session_id, {
+        "resume": resume_fingerprint,
+        "resume_template": resume_template_fingerprint,
+        "cover_letter_template": cover_letter_template_fingerprint,
+        "cover_letter_prompt": cover_letter_prompt_fingerprint,
+    })
+    if stale:
+        yield sync_error(stale), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    texts = session_texts(session_id)
+    updates = regenerate_cover_letter(job_description, model_choice, texts["resume"], texts["resume_template"], texts["cover_letter_template"], texts["cover_letter_prompt"], gr.update(), gr.update(), gr.update(), bypass_cache)
+    # A new generation supersedes the session's running one, which is cancelled
+    async for update in run_job(request.session_hash, "regenerate_cover_letter", relay_to_session(session_id, texts, updates)):
+        yield update
+
+async def follow_job_session(queue_job_id, session_id, request: gr.Request):
+    queue_job_id = (queue_job_id or "").strip().strip("`")
+    if not queue_job_id:
+        yield "Enter a background job id", gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    if not session_id or not session_store.exists(session_id):
+        yield SESSION_EXPIRED, gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        return
+    texts = session_texts(session_id)
+    async for update in run_job(request.session_hash, "follow_job", relay_to_session(session_id, texts, follow_queued_job(queue_job_id))):
+        yield update
+
+def stop_jobs(request: gr.Request):
+    stopped = job_registry.cancel_owner(request.session_hash)
+    if not stopped:
+        return gr.update()
+    return f"⏹ Stopped generation job {', '.join(stopped)}"
+
+def cancel_session_jobs(request: gr.Request):
+    # The tab was closed or reloaded; nobody is waiting for its generations any more, but
+    # background queue jobs keep running so they can be followed again later
+    job_registry.cancel_owner(request.session_hash, DISCONNECTED)
+
+def warm_up_providers():
+    # Runs once the page has loaded, so the SDK imports never delay the first paint
+    registry.warm_up([GEMINI_MODEL])
+    provider_health.start_probes()
+
+def download_artifact(session_id, slot, kind):
+    # The session slot id is the content hash, so unchanged documents are served without re-writing
+    if not session_id or not session_store.exists(session_id):
+        raise gr.Error(SESSION_EXPIRED)
+    path = artifact_store.path(kind, session_store.get_id(session_id, slot))
+    if path is None:
+        # Edited in the browser since generation, or evicted from the artifact store
+        text = session_store.get_text(session_id, slot)
+        path = artifact_store.path(kind, artifact_store.put(text, kind))
+    return path
 
 # Create Gradio interface
 with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
+    session_id = gr.State()
+    
     # Page header
     with gr.Row(elem_classes=["header"]):
         gr.Markdown("# AI Resume & Cover Letter Customizer")
@@ -343,10 +966,11 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
         # Left sidebar for templates and settings
         with gr.Column(scale=1):
             with gr.Accordion("AI Model Selection", open=True):
-                api_status = gr.Markdown(update_api_status())
+                # Refreshed from the cached health status on every page load and while the page is open
+                api_status = gr.Markdown(update_api_status, every=STATUS_TTL_SECONDS)
                 model_choice = gr.Radio(
                     label="Select AI Model",
-                    choices=["Gemini", "DeepSeek"],
+                    choices=["Gemini", "DeepSeek", FASTEST_CHOICE],
                     value="Gemini" if gemini_available else "DeepSeek" if deepseek_available else None,
                     interactive=True
                 )
@@ -374,7 +998,7 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
                 resume_upload_status = gr.Markdown("No template uploaded yet")
                 resume_template_text = gr.Textbox(
                     label="Resume Template",
-                    value=load_template("resume"),
+                    value=initial_resume_template,
                     lines=10
                 )
                 resume_template_save = gr.Button("Save Edited Template")
@@ -393,7 +1017,7 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
                 cover_letter_upload_status = gr.Markdown("No template uploaded yet")
                 cover_letter_template_text = gr.Textbox(
                     label="Cover Letter Template",
-                    value=load_template("cover_letter"),
+                    value=initial_cover_letter_template,
                     lines=10
                 )
                 cover_letter_template_save = gr.Button("Save Edited Template")
@@ -431,7 +1055,37 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
                     placeholder="Enter the full job description...",
                     lines=10
                 )
-                generate_btn = gr.Button("Generate Customized Documents", variant="primary")
+                with gr.Row():
+                    generate_btn = gr.Button("Generate Customized Documents", variant="primary")
+                    stop_btn = gr.Button("Stop", variant="stop")
+                with gr.Row():
+                    parallel_cover_letter = gr.Checkbox(
+                        label="Generate cover letter in parallel with the resume (faster)",
+                        value=False
+                    )
+                    refresh_cover_letter = gr.Checkbox(
+                        label="Re-run cover letter against the final resume",
+                        value=False
+                    )
+                reuse_similar = gr.Checkbox(
+                    label="Reuse documents for near-duplicate job descriptions",
+                    value=True
+                )
+                bypass_cache = gr.Checkbox(
+                    label="Bypass response cache when regenerating",
+                    value=True
+                )
+                background_job = gr.Checkbox(
+                    label="Run in the background job queue (survives restarts, needs job_worker.py running)",
+                    value=False
+                )
+                with gr.Row():
+                    queue_job_id = gr.Textbox(
+                        label="Background job id",
+                        placeholder="Paste a background job id to follow it again",
+                        scale=3
+                    )
+                    follow_job_btn = gr.Button("Follow Job", scale=1)
             
             # Results section
             with gr.Column():
@@ -444,6 +1098,11 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
                             label="Customized Resume (LaTeX)",
                             lines=20
                         )
+                        resume_sections = gr.Dropdown(
+                            label="Sections to regenerate (leave empty for the whole resume)",
+                            choices=section_titles(initial_resume_template),
+                            multiselect=True
+                        )
                         with gr.Row():
                             regenerate_resume_btn = gr.Button("Regenerate Resume")
                             download_resume_btn = gr.Button("Download Resume LaTeX", visible=False)
@@ -462,28 +1121,70 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
         gr.Markdown("AI Resume & Cover Letter Customizer • Created with Gradio • Version 2.0")
     
     # Setup event handlers
+    app.load(start_session, inputs=None, outputs=[session_id])
+    app.load(warm_up_providers, inputs=None, outputs=None)
+    app.unload(cancel_session_jobs)
+    
+    # Edited text is sent once when the user leaves the box, not with every click
+    resume_template_text.blur(
+        remember_resume_template,
+        inputs=[session_id, resume_template_text],
+        outputs=[resume_sections]
+    )
+    cover_letter_template_text.blur(
+        lambda sid, text: remember_text(sid, "cover_letter_template", text),
+        inputs=[session_id, cover_letter_template_text],
+        outputs=None
+    )
+    resume_prompt_input.blur(
+        lambda sid, text: remember_text(sid, "resume_prompt", text),
+        inputs=[session_id, resume_prompt_input],
+        outputs=None
+    )
+    cover_letter_prompt_input.blur(
+        lambda sid, text: remember_text(sid, "cover_letter_prompt", text),
+        inputs=[session_id, cover_letter_prompt_input],
+        outputs=None
+    )
+    customized_resume_output.blur(
+        lambda sid, text: remember_text(sid, "resume", text),
+        inputs=[session_id, customized_resume_output],
+        outputs=None
+    )
+    cover_letter_output.blur(
+        lambda sid, text: remember_text(sid, "cover_letter", text),
+        inputs=[session_id, cover_letter_output],
+        outputs=None
+    )
+    
     resume_template_file.upload(
         upload_resume_template,
-        inputs=[resume_template_file],
-        outputs=[resume_upload_status, resume_template_text, resume_template_save]
+        inputs=[resume_template_file, session_id],
+        outputs=[resume_upload_status, resume_template_text, resume_template_save, resume_sections]
     )
     
     cover_letter_template_file.upload(
         upload_cover_letter_template,
-        inputs=[cover_letter_template_file],
+        inputs=[cover_letter_template_file, session_id],
         outputs=[cover_letter_upload_status, cover_letter_template_text, cover_letter_template_save]
     )
     
-    generate_btn.click(
-        generate_documents,
+    generate_event = generate_btn.click(
+        generate_documents_session,
         inputs=[
             job_description,
             model_choice,
+            session_id,
+            parallel_cover_letter,
+            refresh_cover_letter,
+            reuse_similar,
+            background_job,
             resume_template_text,
             cover_letter_template_text,
             resume_prompt_input,
             cover_letter_prompt_input
         ],
+        js=fingerprint_js(11, 4),
         outputs=[
             generation_status,
             customized_resume_output,
@@ -494,18 +1195,19 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
         ]
     )
     
-    regenerate_resume_btn.click(
-        regenerate_resume,
+    regenerate_resume_event = regenerate_resume_btn.click(
+        regenerate_resume_session,
         inputs=[
             job_description,
             model_choice,
+            session_id,
+            bypass_cache,
+            resume_sections,
             resume_template_text,
             resume_prompt_input,
-            cover_letter_output,
-            generation_time,
-            download_resume_btn,
-            download_cl_btn
+            customized_resume_output
         ],
+        js=fingerprint_js(8, 3),
         outputs=[
             generation_status,
             customized_resume_output,
@@ -516,19 +1218,32 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
         ]
     )
     
-    regenerate_cl_btn.click(
-        regenerate_cover_letter,
+    regenerate_cl_event = regenerate_cl_btn.click(
+        regenerate_cover_letter_session,
         inputs=[
             job_description,
             model_choice,
+            session_id,
+            bypass_cache,
             customized_resume_output,
             resume_template_text,
             cover_letter_template_text,
-            cover_letter_prompt_input,
+            cover_letter_prompt_input
+        ],
+        js=fingerprint_js(8, 4),
+        outputs=[
+            generation_status,
+            customized_resume_output,
+            cover_letter_output,
             generation_time,
             download_resume_btn,
             download_cl_btn
-        ],
+        ]
+    )
+    
+    follow_job_event = follow_job_btn.click(
+        follow_job_session,
+        inputs=[queue_job_id, session_id],
         outputs=[
             generation_status,
             customized_resume_output,
@@ -539,18 +1254,75 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as app:
         ]
     )
     
+    # Only one generation per session runs at a time: starting one cancels the others, and the
+    # Stop button or a model switch cancels whatever is running
+    generation_events = [generate_event, regenerate_resume_event, regenerate_cl_event, follow_job_event]
+    generate_btn.click(None, None, None, cancels=[regenerate_resume_event, regenerate_cl_event, follow_job_event])
+    regenerate_resume_btn.click(None, None, None, cancels=[generate_event, regenerate_cl_event, follow_job_event])
+    regenerate_cl_btn.click(None, None, None, cancels=[generate_event, regenerate_resume_event, follow_job_event])
+    follow_job_btn.click(None, None, None, cancels=[generate_event, regenerate_resume_event, regenerate_cl_event])
+    stop_btn.click(stop_jobs, inputs=None, outputs=[generation_status], cancels=generation_events)
+    model_choice.change(stop_jobs, inputs=None, outputs=[generation_status], cancels=generation_events)
+    
     download_resume_btn.click(
-        lambda: f"customized_resume_{int(time.time())}.tex",
-        inputs=None,
+        lambda sid: download_artifact(sid, "resume", "customized_resume"),
+        inputs=[session_id],
         outputs=gr.File(label="Download")
     )
     
     download_cl_btn.click(
-        lambda: f"cover_letter_{int(time.time())}.tex",
-        inputs=None,
+        lambda sid: download_artifact(sid, "cover_letter", "cover_letter"),
+        inputs=[session_id],
         outputs=gr.File(label="Download")
     )
 
+app.queue(default_concurrency_limit=CONCURRENCY_LIMIT)
+
+def create_server():
+    # FastAPI server with the Prometheus /metrics route next to the Gradio app
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import PlainTextResponse
+    
+    server = FastAPI()
+    
+    @server.get("/metrics")
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+    
+    @server.get("/jobs/{job_id}")
+    def job_status(job_id: str):
+        job = job_registry.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job
+    
+    @server.get("/queue/jobs/{job_id}")
+    def queued_job_status(job_id: str):
+        job = get_job_queue().get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "error": job.error,
+            "progress": job.progress,
+            "result": job.result,
+            "created": job.created,
+            "updated": job.updated,
+        }
+    
+    return gr.mount_gradio_app(server, app, path="/")
+
 # Launch the app when running directly
 if __name__ == "__main__":
-    app.launch()
+    import uvicorn
+    # Same host and port settings as app.launch(); downloads are served from the artifact store,
+    # which lives in the system temp directory that Gradio allows by default
+    uvicorn.run(
+        create_server(),
+        host=os.environ.get("GRADIO_SERVER_NAME", "127.0.0.1"),
+        port=int(os.environ.get("GRADIO_SERVER_PORT", 7860))
+    )
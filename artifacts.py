@@ -0,0 +1,128 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from metrics import metrics
+
+# Managed storage for generated .tex files offered for download.
+# Files are named by content hash, so identical outputs share one file and concurrent users never
+# overwrite each other; writes are atomic and a background thread evicts files by age and by
+# total size.
+
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "resume_builder_artifacts"))
+ARTIFACT_MAX_AGE_SECONDS = int(os.environ.get("ARTIFACT_MAX_AGE_SECONDS", 24 * 3600))
+ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", 100 * 1024 * 1024))
+ARTIFACT_CLEANUP_SECONDS = int(os.environ.get("ARTIFACT_CLEANUP_SECONDS", 300))
+
+
+def artifact_id(text):
+    # Same digest as session_store.content_id, so a session slot id doubles as an artifact id
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_DIR, max_age_seconds=ARTIFACT_MAX_AGE_SECONDS,
+                 max_bytes=ARTIFACT_MAX_BYTES, cleanup_interval=ARTIFACT_CLEANUP_SECONDS):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval
+        self._cleaner = None
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, f"{kind}_{key[:16]}.tex")
+
+    def put(self, text, kind):
+        # Returns the artifact id; an existing file with the same content is reused
+        self._start_cleaner()
+        key = artifact_id(text)
+        path = self._path(kind, key)
+        with metrics.stage("file_write"):
+            if os.path.exists(path):
+                os.utime(path)
+                return key
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".artifact.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return key
+
+    def path(self, kind, key):
+        # Path of a stored artifact, or None if it was never written or has been evicted
+        if not key:
+            return None
+        path = self._path(kind, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def cleanup(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.root):
+                if not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                # Leftover temporary files from interrupted writes age out like artifacts
+                if now - stat.st_mtime > self.max_age_seconds:
+                    self._remove(entry.path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def stats(self):
+        files = [entry.stat().st_size for entry in os.scandir(self.root) if entry.is_file()]
+        return {"files": len(files), "bytes": sum(files)}
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _start_cleaner(self):
+        if self._cleaner is not None:
+            return
+        with self._lock:
+            if self._cleaner is None:
+                self._cleaner = threading.Thread(target=self._cleanup_loop, name="artifact-cleanup", daemon=True)
+                self._cleaner.start()
+
+    def _cleanup_loop(self):
+        while True:
+            try:
+                self.cleanup()
+            except OSError:
+                pass
+            time.sleep(self.cleanup_interval)
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore()
+        return _artifact_store
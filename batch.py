@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import re
+import hashlib
+import tempfile
+from pathlib import Path
+
+import app
+from scheduler import BATCH
+from packing import packed_request_prefix, packed_request_suffix, packed_output_budget, pack_size, split_packed_response
+
+# Headless bulk generation: python batch.py jobs/ --output out/ --model Gemini --workers 8
+# Input is a directory of .txt/.md job descriptions or a JSONL file with
+# {"id": ..., "job_description": ...} records. Finished items are recorded in a checkpoint
+# file so an interrupted run picks up where it stopped.
+# With --pack K, each request carries K job descriptions and returns both documents for all of
+# them as JSON; items missing from or invalid in the packed response are generated one by one.
+
+DEFAULT_PROVIDER_LIMITS = {"Gemini": 4, "DeepSeek": 2, "Fastest": 2}
+UNSAFE_ID_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def load_job_descriptions(source):
+    source = Path(source)
+    jobs = []
+    if source.is_dir():
+        for path in sorted(source.iterdir()):
+            if path.suffix.lower() in (".txt", ".md"):
+                jobs.append((path.stem, path.read_text(encoding="utf-8")))
+        return jobs
+    with open(source, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            job_description = record["job_description"]
+            job_id = str(record.get("id") or hashlib.sha256(job_description.encode("utf-8")).hexdigest()[:12])
+            # Ids become directory names
+            job_id = UNSAFE_ID_RE.sub("_", job_id).strip(".") or f"line{line_number}"
+            jobs.append((job_id, job_description))
+    return jobs
+
+
+def write_atomic(path, content):
+    # Write to a temporary file in the same directory, then rename over the target
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_checkpoint(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    continue
+                if record.get("status") == "done":
+                    done.add(record["id"])
+    return done
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = asyncio.Lock()
+
+    async def record(self, entry):
+        async with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+async def collect(stream):
+    text = ""
+    async for token in stream:
+        text += token
+    return text
+
+
+async def generate_one(job_id, job_description, args, templates, prompts, limiter):
+    resume_template, cover_letter_template = templates
+    resume_prompt, cover_letter_prompt = prompts
+    async with limiter:
+        resume_stream = app.stream_resume(args.model, resume_template, job_description, resume_prompt, use_cache=not args.no_cache, priority=BATCH)
+        if resume_stream is None:
+            raise RuntimeError(f"{args.model} API is not available")
+        customized_resume = await collect(resume_stream)
+        if not customized_resume:
+            raise RuntimeError(f"{args.model} returned an empty resume")
+        customized_resume, _ = await app.repair_document(
+            customized_resume,
+            resume_template,
+            app.resume_section_regenerator(args.model, job_description, resume_prompt, use_cache=not args.no_cache, priority=BATCH)
+        )
+        cover_letter_stream = app.stream_cover_letter(args.model, customized_resume, job_description, cover_letter_prompt, cover_letter_template, use_cache=not args.no_cache, priority=BATCH)
+        if cover_letter_stream is None:
+            raise RuntimeError(f"{args.model} API is not available")
+        cover_letter = await collect(cover_letter_stream)
+        cover_letter, _ = await app.repair_document(cover_letter, cover_letter_template)
+    write_documents(args, job_id, customized_resume, cover_letter)
+
+
+def write_documents(args, job_id, customized_resume, cover_letter):
+    item_dir = Path(args.output) / job_id
+    item_dir.mkdir(parents=True, exist_ok=True)
+    write_atomic(item_dir / "customized_resume.tex", customized_resume)
+    write_atomic(item_dir / "cover_letter.tex", cover_letter)
+
+
+async def generate_packed(jobs, args, templates, prompts, limiter):
+    # Returns ({job id: (resume, cover letter)}, {job id: error}) for one packed request
+    prefix = packed_request_prefix(prompts[0], prompts[1], templates[0], templates[1])
+    budget = packed_output_budget(len(jobs), templates)
+    async with limiter:
+        stream = app.stream_packed(args.model, prefix, packed_request_suffix(jobs), budget, priority=BATCH)
+        if stream is None:
+            raise RuntimeError(f"{args.model} API is not available")
+        text = await collect(stream)
+    return split_packed_response(text, [job_id for job_id, _ in jobs], templates)
+
+
+async def record_done(checkpoint, stats, job_id, started, packed=False):
+    latency = time.perf_counter() - started
+    entry = {"id": job_id, "status": "done", "latency": round(latency, 3)}
+    if packed:
+        entry["packed"] = True
+    await checkpoint.record(entry)
+    stats["done"] += 1
+    print(f"✓ {job_id} in {latency:.1f}s{' (packed)' if packed else ''}")
+
+
+async def process_one(job_id, job_description, args, templates, prompts, limiter, checkpoint, stats, started=None):
+    started = time.perf_counter() if started is None else started
+    try:
+        await generate_one(job_id, job_description, args, templates, prompts, limiter)
+        await record_done(checkpoint, stats, job_id, started)
+    except Exception as e:
+        latency = time.perf_counter() - started
+        await checkpoint.record({"id": job_id, "status": "error", "latency": round(latency, 3), "error": str(e)})
+        stats["failed"] += 1
+        print(f"✗ {job_id} after {latency:.1f}s: {e}", file=sys.stderr)
+
+
+async def worker(queue, args, templates, prompts, limiter, checkpoint, stats):
+    while True:
+        try:
+            job_id, job_description = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        await process_one(job_id, job_description, args, templates, prompts, limiter, checkpoint, stats)
+
+
+async def packed_worker(queue, args, templates, prompts, limiter, checkpoint, stats, size):
+    while True:
+        jobs = []
+        while len(jobs) < size:
+            try:
+                jobs.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        if not jobs:
+            return
+        started = time.perf_counter()
+        try:
+            documents, errors = await generate_packed(jobs, args, templates, prompts, limiter)
+        except Exception as e:
+            documents, errors = {}, {job_id: str(e) for job_id, _ in jobs}
+        for job_id, job_description in jobs:
+            if job_id in documents:
+                write_documents(args, job_id, *documents[job_id])
+                await record_done(checkpoint, stats, job_id, started, packed=True)
+            else:
+                # Retried on its own, with the usual repair and section regeneration
+                print(f"↻ {job_id} failed in the packed request ({errors[job_id]}), generating it individually", file=sys.stderr)
+                stats["unpacked"] += 1
+                await process_one(job_id, job_description, args, templates, prompts, limiter, checkpoint, stats, started)
+
+
+async def run_batch(args):
+    jobs = load_job_descriptions(args.source)
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    checkpoint_path = args.checkpoint or os.path.join(args.output, "checkpoint.jsonl")
+    done = load_checkpoint(checkpoint_path)
+    pending = [(job_id, job_description) for job_id, job_description in jobs if job_id not in done]
+    print(f"{len(jobs)} job descriptions, {len(done)} already done, {len(pending)} to process")
+
+    templates = (
+        Path(args.resume_template).read_text(encoding="utf-8") if args.resume_template else app.load_template("resume"),
+        Path(args.cover_letter_template).read_text(encoding="utf-8") if args.cover_letter_template else app.load_template("cover_letter"),
+    )
+    if not templates[0] or not templates[1]:
+        raise SystemExit("Resume and cover letter templates are required")
+    prompts = app.load_prompts()
+
+    queue = asyncio.Queue()
+    for job in pending:
+        queue.put_nowait(job)
+    provider_limit = args.provider_limit or DEFAULT_PROVIDER_LIMITS[args.model]
+    limiter = asyncio.Semaphore(provider_limit)
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = {"done": 0, "failed": 0, "unpacked": 0}
+
+    size = pack_size(args.pack, templates) if args.pack > 1 else 1
+    if args.pack > 1 and size == 1:
+        print("The templates are too long to pack several job descriptions in one response, generating them one by one")
+    elif size < args.pack:
+        print(f"Packing {size} job descriptions per request, more do not fit in one response")
+    if size > 1:
+        workers = [
+            packed_worker(queue, args, templates, prompts, limiter, checkpoint, stats, size)
+            for _ in range(min(args.workers, -(-len(pending) // size)) or 1)
+        ]
+    else:
+        workers = [
+            worker(queue, args, templates, prompts, limiter, checkpoint, stats)
+            for _ in range(min(args.workers, len(pending)) or 1)
+        ]
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        checkpoint.close()
+    elapsed = time.perf_counter() - started
+    rate = stats["done"] / elapsed * 60 if elapsed else 0.0
+    print(f"Finished {stats['done']} items ({stats['failed']} failed) in {elapsed:.1f}s — {rate:.1f} items/minute")
+    if stats["unpacked"]:
+        print(f"{stats['unpacked']} items were generated individually after failing in a packed request")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate customized resumes and cover letters for many job descriptions")
+    parser.add_argument("source", help="Directory of .txt/.md job descriptions or a JSONL file")
+    parser.add_argument("--output", default="batch_output", help="Output directory (one subdirectory per job)")
+    parser.add_argument("--model", choices=["Gemini", "DeepSeek", app.FASTEST_CHOICE], default="Gemini")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent items in flight")
+    parser.add_argument("--provider-limit", type=int, default=None, help="Maximum concurrent calls to the selected provider")
+    parser.add_argument("--resume-template", default=None, help="Resume template path (defaults to the saved template)")
+    parser.add_argument("--cover-letter-template", default=None, help="Cover letter template path (defaults to the saved template)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (defaults to <output>/checkpoint.jsonl)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--pack", type=int, default=1, help="Job descriptions per request (packed JSON mode when above 1)")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run_batch(args))
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
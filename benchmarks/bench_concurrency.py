@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Throughput of the async Gradio handlers with N simulated users against a local mock provider.
+# Usage: python benchmarks/bench_concurrency.py --users 1 8 32 64 --latency 1.0
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.mock_provider import MockProvider, MockConfig
+
+RESUME_TEMPLATE = r"""\documentclass{article}
+\begin{document}
+\section{Experience}
+\begin{itemize}
+\item Software engineer
+\end{itemize}
+\end{document}
+"""
+
+COVER_LETTER_TEMPLATE = r"""\documentclass{letter}
+\begin{document}
+Dear Hiring Manager,
+\end{document}
+"""
+
+
+async def simulate_user(app, user_id):
+    # Unique job descriptions so every request misses the response cache
+    job_description = f"Backend engineer position #{user_id} ({time.time_ns()})"
+    started = time.perf_counter()
+    first_token = None
+    final = None
+    async for update in app.generate_documents(
+        job_description, "DeepSeek", RESUME_TEMPLATE, COVER_LETTER_TEMPLATE,
+        app.DEFAULT_RESUME_PROMPT, app.DEFAULT_COVER_LETTER_PROMPT
+    ):
+        if first_token is None and update[1]:
+            first_token = time.perf_counter() - started
+        final = update
+    return time.perf_counter() - started, first_token, final[0]
+
+
+async def run(app, user_counts):
+    results = []
+    for users in user_counts:
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(simulate_user(app, i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+        failures = [status for _, _, status in outcomes if "ready for download" not in status]
+        latencies = sorted(latency for latency, _, _ in outcomes)
+        ttfts = sorted(ttft for _, ttft, _ in outcomes if ttft is not None)
+        results.append((users, elapsed, users / elapsed * 60, latencies[len(latencies) // 2], ttfts[len(ttfts) // 2] if ttfts else 0.0, len(failures)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent generations against a mock provider")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--latency", type=float, default=1.0, help="Mock time to first token in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--rpm", type=float, default=100000.0, help="Scheduler requests/minute limit per provider")
+    args = parser.parse_args()
+
+    provider = MockProvider(MockConfig(args.latency, args.tokens_per_second)).start()
+    workdir = tempfile.mkdtemp(prefix="resume_bench_")
+    os.environ["OPENROUTER_BASE_URL"] = provider.base_url
+    os.environ["OPENROUTER_API_KEY"] = "mock-key"
+    os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite")
+    # Read at import time; the run measures async concurrency, not the scheduler's rate limits
+    for name in ("GEMINI_RPM", "OPENROUTER_RPM"):
+        os.environ[name] = str(args.rpm)
+    os.chdir(workdir)
+
+    import app
+
+    try:
+        results = asyncio.run(run(app, args.users))
+    finally:
+        provider.stop()
+
+    print(f"{'users':>6} {'wall s':>8} {'gen/min':>9} {'p50 s':>7} {'ttft s':>7} {'errors':>7}")
+    for users, elapsed, per_minute, p50, ttft, failures in results:
+        print(f"{users:>6} {elapsed:>8.2f} {per_minute:>9.1f} {p50:>7.2f} {ttft:>7.2f} {failures:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# Drive the provider scheduler against a mock provider that injects 429s.
+# Usage: python benchmarks/bench_rate_limits.py --requests 40 --rpm 60 --rate-limit-probability 0.3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.mock_provider import MockProvider, MockConfig
+
+
+async def one_request(scheduler, client, priority, astream_chat_completion, scheduled_stream):
+    started = time.perf_counter()
+    first_token = None
+    try:
+        async for _ in scheduled_stream(
+            scheduler,
+            lambda: astream_chat_completion(client, "mock", [{"role": "user", "content": "hello"}]),
+            100,
+            priority
+        ):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+        return priority, True, first_token
+    except Exception:
+        return priority, False, first_token
+
+
+async def run(args, base_url):
+    from providers import OpenRouterClients, astream_chat_completion
+    from scheduler import ProviderScheduler, INTERACTIVE, BATCH, scheduled_stream
+
+    scheduler = ProviderScheduler(
+        "mock",
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=args.max_retries,
+        backoff_base=args.backoff_base,
+        backoff_max=args.backoff_max
+    )
+    # Start with an empty request bucket so the run exercises queueing, not the initial burst
+    scheduler.requests.level = 0
+    client = OpenRouterClients("mock-key", base_url=base_url).async_client
+    priorities = [INTERACTIVE if i % 2 == 0 else BATCH for i in range(args.requests)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        one_request(scheduler, client, priority, astream_chat_completion, scheduled_stream)
+        for priority in priorities
+    ))
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(1 for _, ok, _ in results if ok)
+    print(f"{succeeded}/{len(results)} succeeded in {elapsed:.1f}s "
+          f"({scheduler.rate_limited} rate-limited responses, {scheduler.retries} retries)")
+    for name, priority in (("interactive", INTERACTIVE), ("batch", BATCH)):
+        waits = sorted(ttft for p, ok, ttft in results if p == priority and ok and ttft is not None)
+        if waits:
+            print(f"{name:>12}: p50 time to first token {waits[len(waits) // 2]:.2f}s, max {waits[-1]:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise the rate-limit scheduler against injected 429s")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--rpm", type=float, default=60.0)
+    parser.add_argument("--tpm", type=float, default=1000000.0)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.3)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--backoff-base", type=float, default=0.2)
+    parser.add_argument("--backoff-max", type=float, default=5.0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=0.05,
+        tokens_per_second=2000.0,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after
+    )
+    provider = MockProvider(config).start()
+    try:
+        asyncio.run(run(args, provider.base_url))
+    finally:
+        provider.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Cold-start cost of the Gradio app: a `python -X importtime` breakdown of `import app`, and the
+# time from process start to the first resume token against a local mock provider.
+# Usage: python benchmarks/bench_startup.py --runs 3 --top 15
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks.mock_provider import MockProvider, MockConfig
+from benchmarks.bench_concurrency import RESUME_TEMPLATE, COVER_LETTER_TEMPLATE
+
+FIRST_RESPONSE_SCRIPT = r"""
+import sys, time, json, asyncio
+spawned = float(sys.argv[1])
+import app
+imported = time.time()
+
+async def first_token():
+    status = None
+    async for update in app.generate_documents(
+        "Backend engineer position", "DeepSeek", app.load_template("resume"), app.load_template("cover_letter"),
+        app.DEFAULT_RESUME_PROMPT, app.DEFAULT_COVER_LETTER_PROMPT
+    ):
+        if update[1]:
+            return time.time()
+        status = update[0]
+    sys.exit(f"No resume token arrived: {status}")
+
+first = asyncio.run(first_token())
+print(json.dumps({"import": imported - spawned, "first_token": first - spawned}))
+"""
+
+
+def child_env(workdir, base_url):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env["LLM_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite")
+    env["ARTIFACT_DIR"] = os.path.join(workdir, "artifacts")
+    env["OPENROUTER_BASE_URL"] = base_url
+    env["OPENROUTER_API_KEY"] = "mock-key"
+    env.pop("GOOGLE_API_KEY", None)
+    # Startup is measured, not the scheduler's rate limits
+    env["OPENROUTER_RPM"] = "100000"
+    return env
+
+
+def write_templates(workdir):
+    # The app loads its templates from templates/ in the working directory
+    os.makedirs(os.path.join(workdir, "templates"), exist_ok=True)
+    with open(os.path.join(workdir, "templates", "resume_template.tex"), "w") as f:
+        f.write(RESUME_TEMPLATE)
+    with open(os.path.join(workdir, "templates", "cover_letter_template.tex"), "w") as f:
+        f.write(COVER_LETTER_TEMPLATE)
+
+
+def import_breakdown(workdir, env):
+    # Lines look like "import time: self [us] | cumulative | imported package"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def first_response(workdir, env):
+    spawned = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE_SCRIPT, repr(spawned)],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"First response run failed:\n{result.stderr.strip()}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total"] = time.time() - spawned
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import time and time to first response")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock time to first token in seconds")
+    args = parser.parse_args()
+
+    provider = MockProvider(MockConfig(latency=args.latency)).start()
+    workdir = tempfile.mkdtemp(prefix="resume_startup_")
+    write_templates(workdir)
+    env = child_env(workdir, provider.base_url)
+    try:
+        modules = import_breakdown(workdir, env)
+        runs = [first_response(workdir, env) for _ in range(args.runs)]
+    finally:
+        provider.stop()
+
+    # Top-level imports are the ones without indentation in the importtime tree
+    top_level = [module for module in modules if not module[0].startswith("  ")]
+    total_us = sum(cumulative for _, _, cumulative in top_level)
+    print(f"import app: {total_us / 1e6:.2f} s cumulative")
+    print(f"{'module':<40} {'self ms':>9} {'cumul ms':>9}")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[2])[:args.top]:
+        print(f"{name.strip():<40} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}")
+
+    print()
+    print(f"{'run':>4} {'import s':>9} {'first token s':>14} {'process s':>10}")
+    for index, timings in enumerate(runs, 1):
+        print(f"{index:>4} {timings['import']:>9.2f} {timings['first_token']:>14.2f} {timings['total']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime, timezone
+
+# Offline benchmark suite: runs the Gradio handlers (generate_documents, regenerate_resume,
+# regenerate_cover_letter) and the Streamlit app against the local mock provider for both the
+# OpenAI-compatible and the Gemini protocol, and writes throughput, latency percentiles and memory
+# use to a JSON file so runs can be compared across commits.
+# Usage: python benchmarks/bench_suite.py --requests 20 --concurrency 4 --output results.json
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks.mock_provider import MockProvider, MockConfig
+from benchmarks.bench_concurrency import RESUME_TEMPLATE, COVER_LETTER_TEMPLATE
+
+STREAMLIT_MODELS = {"Gemini": "Google Gemini", "DeepSeek": "DeepSeek (via OpenRouter)"}
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an unsorted list
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "mean": sum(values) / len(values),
+        "max": max(values),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(workdir, provider, args):
+    # Must run before the app modules are imported, they read these at import time
+    os.environ["OPENROUTER_BASE_URL"] = provider.base_url
+    os.environ["OPENROUTER_API_KEY"] = "mock-key"
+    os.environ["GEMINI_API_ENDPOINT"] = provider.endpoint
+    os.environ["GOOGLE_API_KEY"] = "mock-key"
+    os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite")
+    os.environ["ARTIFACT_DIR"] = os.path.join(workdir, "artifacts")
+    for name in ("GEMINI_RPM", "OPENROUTER_RPM"):
+        os.environ[name] = str(args.rpm)
+    os.makedirs(os.path.join(workdir, "templates"), exist_ok=True)
+    with open(os.path.join(workdir, "templates", "resume_template.tex"), "w") as f:
+        f.write(RESUME_TEMPLATE)
+    with open(os.path.join(workdir, "templates", "cover_letter_template.tex"), "w") as f:
+        f.write(COVER_LETTER_TEMPLATE)
+    os.chdir(workdir)
+
+
+def unique_job_description(index):
+    # Unique per request so that every call misses the response cache
+    return f"Backend engineer position #{index} ({time.time_ns()})"
+
+
+def handler_calls(app, name, model):
+    # Returns a factory building the async update stream for request i, plus the final status check
+    if name == "generate_documents":
+        def call(i):
+            return app.generate_documents(
+                unique_job_description(i), model, RESUME_TEMPLATE, COVER_LETTER_TEMPLATE,
+                app.DEFAULT_RESUME_PROMPT, app.DEFAULT_COVER_LETTER_PROMPT
+            )
+        return call, lambda status: "ready for download" in status
+    if name == "regenerate_resume":
+        def call(i):
+            return app.regenerate_resume(
+                unique_job_description(i), model, RESUME_TEMPLATE, app.DEFAULT_RESUME_PROMPT,
+                RESUME_TEMPLATE, COVER_LETTER_TEMPLATE, "", True, True, True, None
+            )
+        return call, lambda status: "successfully" in status
+    def call(i):
+        return app.regenerate_cover_letter(
+            unique_job_description(i), model, RESUME_TEMPLATE, RESUME_TEMPLATE, COVER_LETTER_TEMPLATE,
+            app.DEFAULT_COVER_LETTER_PROMPT, "", True, True, True
+        )
+    return call, lambda status: "successfully" in status
+
+
+async def timed_handler(call, succeeded, i, semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        first_token = None
+        status = ""
+        try:
+            async for update in call(i):
+                if first_token is None and any(isinstance(value, str) and value for value in update[1:3]):
+                    first_token = time.perf_counter() - started
+                status = update[0]
+        except Exception as e:
+            status = f"Error: {e}"
+        return time.perf_counter() - started, first_token, succeeded(status), status
+
+
+async def run_handler_scenario(app, name, model, args):
+    call, succeeded = handler_calls(app, name, model)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(timed_handler(call, succeeded, i, semaphore) for i in range(args.requests)))
+    return time.perf_counter() - started, outcomes
+
+
+def run_streamlit_scenario(model, args):
+    # Drives the real Streamlit script through streamlit.testing, one simulated session per request
+    from streamlit.testing.v1 import AppTest
+
+    outcomes = []
+    started = time.perf_counter()
+    for i in range(args.requests):
+        request_started = time.perf_counter()
+        try:
+            session = AppTest.from_file(os.path.join(REPO_DIR, "uidesign.py"), default_timeout=args.timeout).run()
+            session.sidebar.radio[0].set_value(STREAMLIT_MODELS[model])
+            next(area for area in session.text_area if area.label.startswith("Paste the job description")).input(unique_job_description(i))
+            next(button for button in session.button if button.label == "Generate Customized Documents").click()
+            session.run()
+            ok = any(message.value == "Documents generated successfully!" for message in session.success)
+            status = "ok" if ok else "; ".join(error.value for error in session.error) or "no documents"
+        except Exception as e:
+            ok, status = False, f"Error: {e}"
+        outcomes.append((time.perf_counter() - request_started, None, ok, status))
+    return time.perf_counter() - started, outcomes
+
+
+def scenario_result(name, model, elapsed, outcomes, peak_bytes):
+    latencies = [latency for latency, _, ok, _ in outcomes if ok]
+    first_tokens = [first for _, first, ok, _ in outcomes if ok and first is not None]
+    errors = [status for _, _, ok, status in outcomes if not ok]
+    return {
+        "scenario": name,
+        "model": model,
+        "requests": len(outcomes),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "wall_seconds": elapsed,
+        "throughput_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_seconds": summarize(latencies),
+        "first_token_seconds": summarize(first_tokens),
+        "peak_python_bytes": peak_bytes,
+    }
+
+
+def run_suite(args):
+    import app
+
+    # One event loop for every scenario: the pooled async clients stay bound to the loop that first used them
+    loop = asyncio.new_event_loop()
+    results = []
+    try:
+        for model in args.models:
+            for name in args.scenarios:
+                tracemalloc.reset_peak()
+                if name == "streamlit":
+                    elapsed, outcomes = run_streamlit_scenario(model, args)
+                else:
+                    elapsed, outcomes = loop.run_until_complete(run_handler_scenario(app, name, model, args))
+                results.append(scenario_result(name, model, elapsed, outcomes, tracemalloc.get_traced_memory()[1]))
+                print_result(results[-1])
+    finally:
+        loop.close()
+    return results
+
+
+def print_result(result):
+    latency = result["latency_seconds"] or {}
+    print(
+        f"{result['scenario']:<24} {result['model']:<9} {result['throughput_per_second']:>7.2f}/s "
+        f"p50 {latency.get('p50') or 0:>6.2f}s p95 {latency.get('p95') or 0:>6.2f}s p99 {latency.get('p99') or 0:>6.2f}s "
+        f"errors {result['errors']:>3} peak {result['peak_python_bytes'] / 1e6:>6.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite against a local mock provider")
+    parser.add_argument("--models", nargs="+", default=["DeepSeek", "Gemini"], choices=["DeepSeek", "Gemini"])
+    parser.add_argument("--scenarios", nargs="+", default=["generate_documents", "regenerate_resume", "regenerate_cover_letter", "streamlit"],
+                        choices=["generate_documents", "regenerate_resume", "regenerate_cover_letter", "streamlit"])
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent Gradio handler calls")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock time to first token in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--response-tokens", type=int, default=600, help="Approximate size of each mock response")
+    parser.add_argument("--error-probability", type=float, default=0.0)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--rpm", type=float, default=100000.0, help="Scheduler requests/minute limit per provider")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Streamlit script run timeout in seconds")
+    parser.add_argument("--output", default=os.path.join(REPO_DIR, "benchmarks", "results", "bench_suite.json"))
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    config = MockConfig(
+        args.latency,
+        args.tokens_per_second,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=0.5,
+        error_probability=args.error_probability,
+        response_tokens=args.response_tokens
+    )
+    provider = MockProvider(config).start()
+    workdir = tempfile.mkdtemp(prefix="resume_suite_")
+    configure_environment(workdir, provider, args)
+    tracemalloc.start()
+    try:
+        results = run_suite(args)
+    finally:
+        tracemalloc.stop()
+        provider.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {name: value for name, value in vars(args).items() if name != "output"},
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
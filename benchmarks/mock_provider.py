@@ -0,0 +1,251 @@
+import re
+import json
+import time
+import random
+import threading
+import argparse
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local LLM server for offline benchmarks, speaking the OpenAI chat-completions protocol and the
+# Gemini generateContent / streamGenerateContent REST protocol.
+# Point the app at it with OPENROUTER_BASE_URL=http://127.0.0.1:<port>/v1 and
+# GEMINI_API_ENDPOINT=http://127.0.0.1:<port>
+
+MOCK_DOCUMENT = r"""\documentclass{article}
+\begin{document}
+\section{Experience}
+\begin{itemize}
+\item Built scalable data pipelines
+\item Led a team of engineers
+\end{itemize}
+\end{document}
+"""
+
+
+GEMINI_PATH_RE = re.compile(r"/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+
+
+def mock_document(response_tokens):
+    # LaTeX document of roughly response_tokens tokens
+    items = []
+    while len("".join(items)) < response_tokens * 4:
+        items.append(f"\\item Delivered project {len(items) + 1} with measurable impact on latency and cost\n")
+    return "\\documentclass{article}\n\\begin{document}\n\\section{Experience}\n\\begin{itemize}\n" + "".join(items) + "\\end{itemize}\n\\end{document}\n"
+
+
+class MockConfig:
+    def __init__(self, latency=0.5, tokens_per_second=200.0, response_text=MOCK_DOCUMENT,
+                 rate_limit_probability=0.0, retry_after=None, error_probability=0.0, error_status=500,
+                 response_tokens=None):
+        # latency: seconds before the first token, tokens_per_second: streaming rate
+        # rate_limit_probability: share of requests rejected with 429 (with Retry-After if set)
+        # error_probability: share of requests failing with error_status
+        # response_tokens: generate a document of about this many tokens instead of response_text
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_text = mock_document(response_tokens) if response_tokens else response_text
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.error_probability = error_probability
+        self.error_status = error_status
+
+
+def split_tokens(text):
+    # Roughly four characters per token, like real tokenizers on English text
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def prompt_tokens(request):
+    return len(json.dumps(request)) // 4
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_error(self):
+        # Returns True if the request was answered with an injected error
+        if random.random() < self.config.rate_limit_probability:
+            headers = {"Retry-After": str(self.config.retry_after)} if self.config.retry_after is not None else None
+            self._send_json(429, {"error": {"message": "Rate limit exceeded", "code": 429}}, headers)
+            return True
+        if random.random() < self.config.error_probability:
+            status = self.config.error_status
+            self._send_json(status, {"error": {"message": "Injected server error", "code": status}})
+            return True
+        return False
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        gemini = GEMINI_PATH_RE.search(url.path)
+        if gemini is None and not url.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        request = self._read_json()
+        if self._inject_error():
+            return
+        if gemini is not None:
+            self._gemini(request, gemini.group("method") == "streamGenerateContent", parse_qs(url.query).get("alt") == ["sse"])
+        else:
+            self._chat_completion(request)
+
+    def _chat_completion(self, request):
+        model = request.get("model", "mock")
+        tokens = split_tokens(self.config.response_text)
+        usage = {"prompt_tokens": prompt_tokens(request), "completion_tokens": len(tokens), "total_tokens": prompt_tokens(request) + len(tokens)}
+        time.sleep(self.config.latency)
+
+        if not request.get("stream"):
+            time.sleep(len(tokens) / self.config.tokens_per_second)
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.config.response_text},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(1 / self.config.tokens_per_second)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": [], "usage": usage}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _gemini(self, request, stream, sse):
+        tokens = split_tokens(self.config.response_text)
+        prompt_count = prompt_tokens(request)
+
+        def response(text, completion_count, finished):
+            candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+            if finished:
+                candidate["finishReason"] = "STOP"
+            return {
+                "candidates": [candidate],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_count,
+                    "candidatesTokenCount": completion_count,
+                    "totalTokenCount": prompt_count + completion_count
+                }
+            }
+
+        time.sleep(self.config.latency)
+        if not stream:
+            time.sleep(len(tokens) / self.config.tokens_per_second)
+            self._send_json(200, response(self.config.response_text, len(tokens), True))
+            return
+
+        # Without alt=sse the REST API streams one JSON array, element by element
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if not sse:
+            self._write_chunk("[")
+        for index, token in enumerate(tokens):
+            payload = json.dumps(response(token, index + 1, index == len(tokens) - 1))
+            if sse:
+                self._write_chunk(f"data: {payload}\r\n\r\n")
+            else:
+                self._write_chunk(("," if index else "") + payload + "\r\n")
+            time.sleep(1 / self.config.tokens_per_second)
+        if not sse:
+            self._write_chunk("]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockProvider:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        handler = type("ConfiguredMockRequestHandler", (MockRequestHandler,), {"config": config or MockConfig()})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        # OpenAI-compatible base URL; the Gemini endpoint is the bare host and port
+        return f"{self.endpoint}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock LLM provider")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--error-probability", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--response-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        args.latency,
+        args.tokens_per_second,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after,
+        error_probability=args.error_probability,
+        error_status=args.error_status,
+        response_tokens=args.response_tokens
+    )
+    provider = MockProvider(config, port=args.port).start()
+    print(f"Mock provider listening on {provider.base_url} (OpenAI) and {provider.endpoint} (Gemini)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        provider.stop()
@@ -0,0 +1,270 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from scheduler import error_status, is_retryable
+
+# Provider health: one circuit breaker per provider, fed by real calls and by background probes.
+# After FAILURE_THRESHOLD failures in a row (calls slower than SLOW_CALL_SECONDS count as
+# failures) the breaker opens, and requests are rerouted or fail at once instead of waiting for
+# a timeout. Once OPEN_SECONDS have passed, or a probe succeeds, a single trial call is let
+# through (half-open); its outcome closes the breaker or opens it again.
+# Errors the scheduler retries (rate limits, 5xx, dropped connections) only count once the
+# scheduler gives up on them, and rate limits never count: they mean the quota is used up, not
+# that the provider is down.
+
+FAILURE_THRESHOLD = int(os.environ.get("HEALTH_FAILURE_THRESHOLD", 3))
+# Time to first token; DeepSeek R1 reasons before its first answer token
+SLOW_CALL_SECONDS = float(os.environ.get("HEALTH_SLOW_CALL_SECONDS", 90))
+FIRST_TOKEN_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_FIRST_TOKEN_TIMEOUT_SECONDS", 180))
+OPEN_SECONDS = float(os.environ.get("HEALTH_OPEN_SECONDS", 60))
+PROBE_INTERVAL_SECONDS = float(os.environ.get("HEALTH_PROBE_INTERVAL_SECONDS", 60))
+PROBE_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_PROBE_TIMEOUT_SECONDS", 10))
+# The status shown in the UI is recomputed at most this often
+STATUS_TTL_SECONDS = float(os.environ.get("HEALTH_STATUS_TTL_SECONDS", 10))
+LATENCY_WINDOW = 20
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class ProviderUnavailable(Exception):
+    # Raised instead of calling a provider whose circuit is open; never retried
+    pass
+
+
+class FirstTokenTimeout(TimeoutError):
+    # Counted by the breaker when it happens; retried by the scheduler like any timeout
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS, slow_seconds=SLOW_CALL_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_seconds = slow_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False  # a half-open trial call is in flight
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.probe_latency = None
+        self.probe_error = None
+        self._lock = threading.Lock()
+
+    def _cooled_down(self):
+        return time.monotonic() - self.opened_at >= self.open_seconds
+
+    def available(self):
+        # Whether a call would be let through now, without claiming the trial
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.trial:
+                return False
+            return self.state == HALF_OPEN or self._cooled_down()
+
+    def allow(self):
+        # Like available(), but claims the trial call when the breaker is not closed
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.trial or (self.state == OPEN and not self._cooled_down()):
+                return False
+            self.state = HALF_OPEN
+            self.trial = True
+            return True
+
+    def release(self):
+        # A call ended without a verdict (cancelled before its first token)
+        with self._lock:
+            self.trial = False
+
+    def record_success(self, latency):
+        if latency > self.slow_seconds:
+            self.record_failure(f"slow response ({latency:.0f}s to first token)")
+            return
+        with self._lock:
+            self.latencies.append(latency)
+            self.state = CLOSED
+            self.failures = 0
+            self.trial = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) or type(error).__name__
+            self.trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def record_probe(self, latency, error=None):
+        with self._lock:
+            self.probe_latency = latency
+            self.probe_error = None if error is None else str(error) or type(error).__name__
+            if error is None and self.state == OPEN:
+                # The provider answers again; let the next call through as the trial
+                self.state = HALF_OPEN
+        if error is not None:
+            self.record_failure(f"health probe: {error}")
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial = False
+            self.last_error = None
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "median_latency": latencies[len(latencies) // 2] if latencies else None,
+                "last_latency": self.latencies[-1] if self.latencies else None,
+                "probe_latency": self.probe_latency,
+                "probe_error": self.probe_error,
+                "retry_in": retry_in,
+            }
+
+
+class ProviderHealth:
+    def __init__(self, status_ttl=STATUS_TTL_SECONDS):
+        self.status_ttl = status_ttl
+        self._breakers = {}
+        self._probes = {}  # provider -> (probe, enabled)
+        self._lock = threading.Lock()
+        self._prober = None
+        self._status = None  # (computed at, status)
+
+    def breaker(self, provider):
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = self._breakers[provider] = CircuitBreaker()
+            return breaker
+
+    def available(self, provider):
+        return self.breaker(provider).available()
+
+    def reset(self, provider):
+        # New credentials deserve a fresh start
+        self.breaker(provider).reset()
+        self._status = None
+
+    def unavailable_reason(self, provider):
+        # None while calls to the provider are let through
+        breaker = self.breaker(provider)
+        if breaker.available():
+            return None
+        snapshot = breaker.snapshot()
+        retry = f", retrying in {snapshot['retry_in']:.0f}s" if snapshot["retry_in"] else ""
+        return f"{provider} API is failing ({snapshot['last_error']}{retry})"
+
+    def open_circuits(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return sum(1 for breaker in breakers if breaker.state != CLOSED)
+
+    async def guarded_stream(self, provider, stream):
+        # Relays a provider token stream and reports its outcome to the provider's breaker
+        breaker = self.breaker(provider)
+        if not breaker.allow():
+            await stream.aclose()
+            raise ProviderUnavailable(self.unavailable_reason(provider) or f"{provider} API is failing")
+        started = time.perf_counter()
+        latency = None
+        try:
+            while True:
+                try:
+                    if latency is None:
+                        token = await asyncio.wait_for(stream.__anext__(), FIRST_TOKEN_TIMEOUT_SECONDS)
+                        latency = time.perf_counter() - started
+                    else:
+                        token = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield token
+        except asyncio.TimeoutError:
+            breaker.record_failure(f"no response within {FIRST_TOKEN_TIMEOUT_SECONDS:.0f}s")
+            raise FirstTokenTimeout(f"{provider} sent nothing within {FIRST_TOKEN_TIMEOUT_SECONDS:.0f}s") from None
+        except (asyncio.CancelledError, GeneratorExit):
+            # The caller went away or stopped reading once it had the whole document
+            if latency is None:
+                breaker.release()
+            else:
+                breaker.record_success(latency)
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                # Reported through record_given_up if the scheduler's retries do not recover
+                breaker.release()
+            else:
+                breaker.record_failure(e)
+            raise
+        else:
+            breaker.record_success(time.perf_counter() - started if latency is None else latency)
+        finally:
+            await stream.aclose()
+
+    def record_given_up(self, provider, error):
+        # on_give_up callback for scheduled_stream
+        if error_status(error) == 429 or isinstance(error, (FirstTokenTimeout, ProviderUnavailable)):
+            return
+        self.breaker(provider).record_failure(error)
+
+    def register_probe(self, provider, probe, enabled):
+        # probe() makes a cheap blocking call to the provider and raises if it is unhealthy;
+        # enabled() tells whether the provider is configured at all
+        with self._lock:
+            self._probes[provider] = (probe, enabled)
+
+    def probe(self):
+        with self._lock:
+            probes = list(self._probes.items())
+        for provider, (probe, enabled) in probes:
+            if not enabled():
+                continue
+            started = time.perf_counter()
+            try:
+                probe()
+            except Exception as e:
+                self.breaker(provider).record_probe(time.perf_counter() - started, e)
+            else:
+                self.breaker(provider).record_probe(time.perf_counter() - started)
+
+    def start_probes(self, interval=PROBE_INTERVAL_SECONDS):
+        # Only the first call starts the probe thread
+        with self._lock:
+            if self._prober is not None:
+                return self._prober
+            self._prober = threading.Thread(target=self._probe_loop, args=(interval,), name="provider-health-probes", daemon=True)
+        self._prober.start()
+        return self._prober
+
+    def _probe_loop(self, interval):
+        while True:
+            self.probe()
+            time.sleep(interval)
+
+    def status(self, providers):
+        # {provider: breaker snapshot}, cached for status_ttl seconds
+        cached = self._status
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self.status_ttl and set(cached[1]) == set(providers):
+            return cached[1]
+        status = {provider: self.breaker(provider).snapshot() for provider in providers}
+        self._status = (now, status)
+        return status
+
+
+provider_health = ProviderHealth()
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+
+# Hedged requests: start with the provider that has been fastest recently, send the same request
+# to the next provider if no text arrives within the hedge delay, stream the first provider that
+# answers and cancel the rest (which closes their HTTP streams). Latencies are times to first text.
+
+HEDGE_DELAY_SECONDS = os.environ.get("HEDGE_DELAY_SECONDS")
+DEFAULT_HEDGE_DELAY_SECONDS = 15.0
+LATENCY_WINDOW = 50
+MIN_SAMPLES = 5
+
+
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider, seconds):
+        with self._lock:
+            self._samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, provider, fraction):
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def p95(self, provider):
+        return self.percentile(provider, 0.95)
+
+
+latency_tracker = LatencyTracker()
+
+
+def rank_providers(providers):
+    # Fastest recent p95 first; providers without enough samples keep their given order
+    return sorted(providers, key=lambda name: latency_tracker.p95(name) or DEFAULT_HEDGE_DELAY_SECONDS)
+
+
+def hedge_delay(primary):
+    if HEDGE_DELAY_SECONDS:
+        return float(HEDGE_DELAY_SECONDS)
+    return latency_tracker.p95(primary) or DEFAULT_HEDGE_DELAY_SECONDS
+
+
+async def _first_token(stream):
+    # None when the stream ends without any text
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def hedged_stream(stream_for, providers, delay=None):
+    # stream_for(provider) returns a fresh token stream; providers are tried in the given order.
+    # The first provider to send text wins: the other attempts are cancelled and the winner's
+    # tokens are relayed as they arrive. Provider streams hold text back until it looks like
+    # LaTeX (output_budget.budgeted_stream), so an attempt that produces garbage loses the race;
+    # an error after the winner's first token is not hedged and reaches the caller.
+    delay = hedge_delay(providers[0]) if delay is None else delay
+    waiting = list(providers)
+    running = {}  # first-token task -> (provider, stream, launched)
+    errors = []
+
+    def launch():
+        provider = waiting.pop(0)
+        stream = stream_for(provider)
+        running[asyncio.create_task(_first_token(stream))] = (provider, stream, time.perf_counter())
+
+    async def cancel(tasks):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            await running.pop(task)[1].aclose()
+
+    launch()
+    winner = None
+    try:
+        while running and winner is None:
+            done, _ = await asyncio.wait(
+                running,
+                timeout=delay if waiting else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Hedge: nothing back within the delay, race the next provider as well
+                launch()
+                continue
+            for task in done:
+                provider, stream, launched = running.pop(task)
+                if winner is None and task.exception() is None and task.result():
+                    winner = provider, stream, task.result()
+                    # Each attempt is timed from its own launch. Cancelled and failed attempts are
+                    # not recorded: their time says only that they were slower, not how much.
+                    latency_tracker.record(provider, time.perf_counter() - launched)
+                    continue
+                if winner is None:
+                    errors.append(f"{provider}: {task.exception() or 'empty response'}")
+                await stream.aclose()
+            # Every finished attempt failed, so hedge immediately instead of waiting out the delay
+            if winner is None and waiting:
+                launch()
+    finally:
+        await cancel(list(running))
+    if winner is None:
+        raise RuntimeError("All providers failed: " + "; ".join(errors))
+
+    provider, stream, token = winner
+    try:
+        yield token
+        async for token in stream:
+            yield token
+    finally:
+        await stream.aclose()
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+import numpy as np
+
+# Near-duplicate detection for job descriptions with MinHash signatures and LSH banding.
+# Reposts of the same posting differ in tracking links, dates or whitespace and miss the exact
+# response cache; this index finds earlier generations for them. Signatures and documents are
+# persisted in SQLite, the LSH buckets are rebuilt in memory at startup.
+
+JD_INDEX_PATH = os.environ.get("JD_INDEX_PATH", "cache/jd_index.sqlite")
+SIMILARITY_THRESHOLD = float(os.environ.get("JD_SIMILARITY_THRESHOLD", 0.8))
+MAX_ENTRIES = int(os.environ.get("JD_INDEX_MAX_ENTRIES", 50000))
+
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard similarity share a bucket with high probability
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+_random = np.random.default_rng(20240401)
+_PERM_A = _random.integers(1, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _random.integers(0, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+EMAIL_RE = re.compile(r"\S+@\S+")
+DATE_RE = re.compile(
+    r"\b\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\b"
+    r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.? \d{1,2}(?:st|nd|rd|th)?,? \d{4}\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)? (?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]* \d{4}\b"
+)
+WORD_RE = re.compile(r"[a-z0-9+#]+")
+
+
+def normalize(job_description):
+    # Drops the parts that change between reposts: links, e-mail addresses, dates, case and spacing
+    text = job_description.lower()
+    text = URL_RE.sub(" ", text)
+    text = EMAIL_RE.sub(" ", text)
+    text = DATE_RE.sub(" ", text)
+    return WORD_RE.findall(text)
+
+
+def minhash(job_description):
+    words = normalize(job_description)
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * h + b) mod p fits in uint64 because a, b and h are all below 2**32
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % MERSENNE_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+def context_key(*parts):
+    # Earlier documents are only reused for the same model, templates and prompts
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class Match:
+    def __init__(self, similarity, job_description, resume, cover_letter, created):
+        self.similarity = similarity
+        self.job_description = job_description
+        self.resume = resume
+        self.cover_letter = cover_letter
+        self.created = created
+
+
+class JobIndex:
+    def __init__(self, path=JD_INDEX_PATH, threshold=SIMILARITY_THRESHOLD, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = {}  # row id -> (context, signature)
+        self._buckets = {}  # (band, band bytes) -> set of row ids
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, context TEXT NOT NULL, created REAL NOT NULL, signature BLOB NOT NULL, "
+            "job_description TEXT NOT NULL, resume TEXT NOT NULL, cover_letter TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        for row_id, context, signature in self._conn.execute("SELECT id, context, signature FROM jobs"):
+            self._insert(row_id, context, np.frombuffer(signature, dtype=np.uint32))
+
+    def _insert(self, row_id, context, signature):
+        self._entries[row_id] = (context, signature)
+        for key in band_keys(signature):
+            self._buckets.setdefault(key, set()).add(row_id)
+
+    def _remove(self, row_id):
+        _, signature = self._entries.pop(row_id)
+        for key in band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(row_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def lookup(self, job_description, context):
+        # Most similar earlier generation for the same context at or above the threshold, or None
+        signature = minhash(job_description)
+        with self._lock:
+            candidates = set()
+            for key in band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates = [row_id for row_id in candidates if self._entries[row_id][0] == context]
+            if not candidates:
+                return None
+            signatures = np.stack([self._entries[row_id][1] for row_id in candidates])
+            similarities = (signatures == signature).mean(axis=1)
+            best = int(similarities.argmax())
+            if similarities[best] < self.threshold:
+                return None
+            row = self._conn.execute(
+                "SELECT job_description, resume, cover_letter, created FROM jobs WHERE id = ?", (candidates[best],)
+            ).fetchone()
+        if row is None:
+            return None
+        return Match(float(similarities[best]), *row)
+
+    def add(self, job_description, context, resume, cover_letter):
+        signature = minhash(job_description)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (context, created, signature, job_description, resume, cover_letter) VALUES (?, ?, ?, ?, ?, ?)",
+                (context, time.time(), signature.tobytes(), job_description, resume, cover_letter)
+            )
+            self._insert(cursor.lastrowid, context, signature)
+            if len(self._entries) > self.max_entries:
+                # Entries are kept in insertion order, so the oldest come first
+                excess = list(self._entries)[:len(self._entries) - self.max_entries]
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(row_id,) for row_id in excess])
+                for row_id in excess:
+                    self._remove(row_id)
+            self._conn.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_job_index():
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = JobIndex()
+        return _default_index
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import random
+import secrets
+import sqlite3
+import threading
+from pathlib import Path
+
+# Durable job queue in SQLite (WAL mode), shared by the web front-ends that submit and follow jobs
+# and the worker processes (job_worker.py) that run them.
+# A worker claims a job with a lease and keeps renewing it; if the worker dies or the server
+# restarts, the lease runs out and another worker picks the job up again. Failed attempts are
+# retried with exponential backoff until the job runs out of attempts.
+
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "cache/jobs.sqlite")
+MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 120))
+RETRY_BACKOFF_SECONDS = float(os.environ.get("JOB_RETRY_BACKOFF_SECONDS", 30))
+RETRY_BACKOFF_MAX_SECONDS = float(os.environ.get("JOB_RETRY_BACKOFF_MAX_SECONDS", 600))
+# Finished jobs are kept this long so their results can still be fetched
+RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueuedJob:
+    def __init__(self, row):
+        (self.id, self.kind, self.status, payload, result, progress, self.error, self.attempts,
+         self.max_attempts, self.created, self.updated, self.available_at, self.lease_until, self.worker) = row
+        self.payload = json.loads(payload)
+        self.result = json.loads(result) if result else None
+        self.progress = json.loads(progress) if progress else None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+
+COLUMNS = (
+    "id, kind, status, payload, result, progress, error, attempts, max_attempts, "
+    "created, updated, available_at, lease_until, worker"
+)
+
+
+class JobQueue:
+    def __init__(self, path=JOB_QUEUE_PATH, lease_seconds=LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; claims use explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL, "
+            "result TEXT, progress TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "max_attempts INTEGER NOT NULL, created REAL NOT NULL, updated REAL NOT NULL, "
+            "available_at REAL NOT NULL, lease_until REAL, worker TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)")
+
+    def submit(self, kind, payload, max_attempts=MAX_ATTEMPTS):
+        job_id = secrets.token_urlsafe(12)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, max_attempts, created, updated, available_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload), max_attempts, now, now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else QueuedJob(row)
+
+    def position(self, job_id):
+        # Number of ready jobs ahead of a queued job
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND available_at <= ? "
+                "AND created < (SELECT created FROM jobs WHERE id = ?)",
+                (QUEUED, time.time(), job_id)
+            ).fetchone()
+        return row[0]
+
+    def claim(self, worker):
+        # Oldest ready job, or a running job whose worker stopped renewing its lease; None if idle
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {COLUMNS} FROM jobs "
+                    "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created LIMIT 1",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job = QueuedJob(row)
+                if job.status == RUNNING and job.attempts >= job.max_attempts:
+                    # Its last attempt died with its worker
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, updated = ?, lease_until = NULL WHERE id = ?",
+                        (FAILED, "worker stopped during the last attempt", now, job.id)
+                    )
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, worker = ?, updated = ? WHERE id = ?",
+                    (RUNNING, now + self.lease_seconds, worker, now, job.id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        job.status = RUNNING
+        job.attempts += 1
+        job.worker = worker
+        return job
+
+    def heartbeat(self, job_id, worker, progress=None):
+        # Renews the lease (and stores progress); False if the job was cancelled or taken over
+        now = time.time()
+        with self._lock:
+            if progress is None:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND status = ? AND worker = ?",
+                    (now + self.lease_seconds, now, job_id, RUNNING, worker)
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_until = ?, updated = ?, progress = ? WHERE id = ? AND status = ? AND worker = ?",
+                    (now + self.lease_seconds, now, json.dumps(progress), job_id, RUNNING, worker)
+                )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, updated = ? "
+                "WHERE id = ? AND status = ? AND worker = ?",
+                (DONE, json.dumps(result), now, job_id, RUNNING, worker)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker, error, retryable=True):
+        # Requeues the job with backoff while it has attempts left, otherwise marks it failed
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND worker = ?",
+                (job_id, RUNNING, worker)
+            ).fetchone()
+            if row is None:
+                return False
+            attempts, max_attempts = row
+            if retryable and attempts < max_attempts:
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)))
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_until = NULL, updated = ? WHERE id = ?",
+                    (QUEUED, error, now + delay, now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated = ? WHERE id = ?",
+                    (FAILED, error, now, job_id)
+                )
+        return True
+
+    def cancel(self, job_id):
+        # Queued jobs never start; a running job's worker notices at its next heartbeat
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, updated = ? WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def purge(self, retention_seconds=RETENTION_SECONDS):
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND updated < ?",
+                (*FINISHED, time.time() - retention_seconds)
+            )
+        return cursor.rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import multiprocessing
+
+from job_queue import get_job_queue
+
+# Worker processes for the durable job queue: python job_worker.py --processes 2 --concurrency 4
+# Each process claims jobs from the SQLite queue, runs them with the app's generation code and
+# writes progress and results back, renewing the job's lease while it runs. Jobs whose worker
+# dies (or whose server restarts) are picked up again once their lease runs out.
+
+POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 1.0))
+# Leases are renewed and progress is written this often; the UI polls the queue for it, and
+# a job cancelled from the UI stops within one interval
+PROGRESS_INTERVAL_SECONDS = float(os.environ.get("JOB_PROGRESS_INTERVAL_SECONDS", 0.5))
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class PermanentJobError(Exception):
+    # Failures that retrying cannot fix, such as a missing job description
+    pass
+
+
+def text_value(value):
+    # Handler updates mix strings with gr.update() objects, which keep the previous value
+    return value if isinstance(value, str) else None
+
+
+async def generate_documents_job(payload, report):
+    import app
+    if not payload.get("job_description"):
+        raise PermanentJobError("Please enter a job description")
+    if not payload.get("resume_template") or not payload.get("cover_letter_template"):
+        raise PermanentJobError("Resume and cover letter templates are required")
+    state = {"status": "", "resume": "", "cover_letter": "", "generation_time": ""}
+    updates = app.generate_documents(
+        payload["job_description"],
+        payload["model_choice"],
+        payload["resume_template"],
+        payload["cover_letter_template"],
+        payload["resume_prompt"],
+        payload["cover_letter_prompt"],
+        payload.get("parallel_cover_letter", False),
+        payload.get("refresh_cover_letter", False),
+        payload.get("reuse_similar", False),
+    )
+    try:
+        async for update in updates:
+            for key, value in zip(("status", "resume", "cover_letter", "generation_time"), update):
+                value = text_value(value)
+                if value is not None:
+                    state[key] = value
+            report(dict(state))
+    finally:
+        await updates.aclose()
+    # The handler reports provider errors in its status text; a job is only done with both documents
+    if not state["resume"] or not state["cover_letter"]:
+        raise RuntimeError(state["status"] or "generation produced no documents")
+    return state
+
+
+HANDLERS = {
+    "generate_documents": generate_documents_job,
+}
+
+
+async def keep_lease(queue, job, worker_id, progress, task):
+    # Renews the lease and writes the latest progress; stops the job when it was cancelled or taken over
+    written = None
+    while not task.done():
+        await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+        latest = progress.get("latest")
+        if not await asyncio.to_thread(queue.heartbeat, job.id, worker_id, latest if latest is not written else None):
+            task.cancel()
+            return
+        written = latest
+
+
+async def run_one(queue, job, worker_id):
+    handler = HANDLERS.get(job.kind)
+    if handler is None:
+        await asyncio.to_thread(queue.fail, job.id, worker_id, f"Unknown job kind {job.kind}", False)
+        return
+    progress = {"latest": None}
+    task = asyncio.create_task(handler(job.payload, lambda data: progress.__setitem__("latest", data)))
+    keeper = asyncio.create_task(keep_lease(queue, job, worker_id, progress, task))
+    started = time.perf_counter()
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        # Cancelled from the UI or the lease was lost; the queue already has the job's new state
+        print(f"⏹ {job.id} stopped", file=sys.stderr)
+        return
+    except PermanentJobError as e:
+        await asyncio.to_thread(queue.fail, job.id, worker_id, str(e), False)
+        print(f"✗ {job.id} failed: {e}", file=sys.stderr)
+        return
+    except Exception as e:
+        await asyncio.to_thread(queue.fail, job.id, worker_id, str(e))
+        print(f"✗ {job.id} attempt {job.attempts}/{job.max_attempts} failed: {e}", file=sys.stderr)
+        return
+    finally:
+        keeper.cancel()
+    if not await asyncio.to_thread(queue.complete, job.id, worker_id, result):
+        print(f"⏹ {job.id} was cancelled before it finished", file=sys.stderr)
+        return
+    print(f"✓ {job.id} ({job.kind}) in {time.perf_counter() - started:.1f}s")
+
+
+async def run_worker(worker_id, concurrency):
+    queue = get_job_queue()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    purged = 0.0
+    while True:
+        await slots.acquire()
+        if time.monotonic() - purged > PURGE_INTERVAL_SECONDS:
+            await asyncio.to_thread(queue.purge)
+            purged = time.monotonic()
+        job = await asyncio.to_thread(queue.claim, worker_id)
+        if job is None:
+            slots.release()
+            await asyncio.sleep(POLL_SECONDS)
+            continue
+        task = asyncio.create_task(run_one(queue, job, worker_id))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+
+def worker_process(index, concurrency):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    print(f"Worker {worker_id} running {concurrency} jobs at a time")
+    try:
+        asyncio.run(run_worker(worker_id, concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run generation jobs from the durable job queue")
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("JOB_WORKER_PROCESSES", 1)), help="Number of worker processes")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("JOB_WORKER_CONCURRENCY", 4)), help="Jobs in flight per process")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        worker_process(0, args.concurrency)
+        return
+    # Spawned processes do not inherit SDK clients or sockets from the parent
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_process, args=(index, args.concurrency)) for index in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import time
+import asyncio
+import secrets
+import threading
+from collections import OrderedDict
+
+# Generation jobs for the Gradio app.
+# Every generate/regenerate call runs as a job with an id and a status. Starting a job cancels the
+# jobs still running for the same browser session (they have been superseded), and a job can be
+# cancelled by id or per session (Stop button, model switch, closed tab). Cancelling cancels the
+# asyncio task running the handler, which closes the provider streams and aborts their HTTP
+# responses.
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+SUPERSEDED = "superseded"
+# The browser went away; background queue jobs keep running for a later visit
+DISCONNECTED = "disconnected"
+
+# Finished jobs are kept for status lookups
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    def __init__(self, job_id, owner, kind, task):
+        self.id = job_id
+        self.owner = owner
+        self.kind = kind
+        self.task = task
+        self.status = RUNNING
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobRegistry:
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()  # job id -> Job, oldest first
+        self._lock = threading.Lock()
+
+    def start(self, owner, kind):
+        # Registers the current task as a new job and cancels the owner's running jobs
+        job = Job(secrets.token_urlsafe(8), owner, kind, asyncio.current_task())
+        self.cancel_owner(owner, SUPERSEDED)
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def finish(self, job, status):
+        with self._lock:
+            if job.status == RUNNING:
+                job.status = status
+            job.finished = time.time()
+            job.task = None
+            finished = [other for other in self._jobs.values() if other.status != RUNNING]
+            for other in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[other.id]
+
+    def _cancel(self, job, status):
+        # Caller holds the lock
+        if job.status != RUNNING:
+            return False
+        job.status = status
+        if job.task is not None and job.task is not asyncio.current_task():
+            job.task.cancel()
+        return True
+
+    def cancel(self, job_id, status=CANCELLED):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job is not None and self._cancel(job, status)
+
+    def cancel_owner(self, owner, status=CANCELLED):
+        # Returns the ids of the jobs cancelled
+        with self._lock:
+            return [job.id for job in list(self._jobs.values()) if job.owner == owner and self._cancel(job, status)]
+
+    def current_status(self):
+        # Status of the job run by the current task, None outside a job
+        task = asyncio.current_task()
+        with self._lock:
+            for job in self._jobs.values():
+                if job.task is task:
+                    return job.status
+        return None
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.to_dict()
+
+    def running(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == RUNNING)
+
+
+job_registry = JobRegistry()
+
+
+async def run_job(owner, kind, updates):
+    # Relays a handler's update stream as a job; the job's status reflects how the stream ended
+    job = job_registry.start(owner, kind)
+    status = FAILED
+    try:
+        async for update in updates:
+            yield update
+        status = DONE
+    except (asyncio.CancelledError, GeneratorExit):
+        status = CANCELLED
+        raise
+    finally:
+        job_registry.finish(job, status)
+        await updates.aclose()
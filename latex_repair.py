@@ -0,0 +1,213 @@
+import re
+import bisect
+from latex_sections import LatexDocument, Section, split_sections
+
+# Local validation and repair of model output before it reaches the user.
+# Strips code fences, <think> reasoning blocks and chatter around the document, restores the
+# template's preamble and \end{document}, and balances braces and environments, counting the fixes
+# per section.
+# Sections that needed heavy repair, or that the model dropped, are reported as broken so that
+# only those are sent back to the model.
+
+THINK_RE = re.compile(r"<think>.*?(?:</think>|$)", re.DOTALL | re.IGNORECASE)
+FENCE_RE = re.compile(r"```[a-zA-Z]*[ \t]*\n(.*?)(?:\n```|$)", re.DOTALL)
+ENVIRONMENT_RE = re.compile(r"\\(begin|end)\s*\{([^}]*)\}")
+# More fixes than this in one section means its content is probably damaged, not just mis-closed
+MAX_SECTION_FIXES = 2
+
+
+class RepairResult:
+    def __init__(self, latex, fixes, broken_sections):
+        self.latex = latex
+        self.fixes = fixes
+        self.broken_sections = broken_sections
+
+
+def strip_wrappers(text):
+    # Returns the text without reasoning blocks and code fences, and a list of what was removed
+    fixes = []
+    stripped = THINK_RE.sub("", text)
+    if stripped != text:
+        fixes.append("removed reasoning text")
+    fenced = FENCE_RE.findall(stripped)
+    if fenced:
+        # Several fenced blocks: keep the one that looks most like the document
+        stripped = max(fenced, key=lambda block: ("\\begin{document}" in block, block.count("\\"), len(block)))
+        fixes.append("removed code fences")
+    return stripped.strip() + "\n", fixes
+
+
+def _mask_comments(text):
+    # Same length as text, with comments and escaped braces blanked so they are not counted
+    text = re.sub(r"\\[{}%\\]", "  ", text)
+    return re.sub(r"%[^\n]*", lambda match: " " * len(match.group(0)), text)
+
+
+def _brace_edits(masked):
+    # Unmatched closing braces are dropped; returns (edits, unclosed), where edits are
+    # (start, end, replacement) and unclosed are (position of the opening, closing text)
+    stack = []
+    edits = []
+    for index, char in enumerate(masked):
+        if char == "{":
+            stack.append(index)
+        elif char == "}":
+            if stack:
+                stack.pop()
+            else:
+                edits.append((index, index + 1, ""))
+    return edits, [(position, "}") for position in stack]
+
+
+def _environment_edits(masked):
+    # Stray \end{...} are dropped, and environments left open inside another one are closed
+    # before its \end; returns (edits, unclosed) like _brace_edits
+    stack = []
+    edits = []
+    for match in ENVIRONMENT_RE.finditer(masked):
+        kind, name = match.group(1), match.group(2).strip()
+        if kind == "begin":
+            stack.append((name, match.start()))
+        elif name in (opened for opened, _ in stack):
+            closing = ""
+            while stack[-1][0] != name:
+                closing += f"\\end{{{stack.pop()[0]}}}\n"
+            stack.pop()
+            if closing:
+                edits.append((match.start(), match.start(), closing))
+        else:
+            edits.append((match.start(), match.end(), ""))
+    return edits, [(position, f"\n\\end{{{name}}}") for name, position in stack]
+
+
+def _balance_blocks(blocks, find_edits):
+    # Balances the concatenation of blocks as a whole, so a group or environment may span blocks
+    # (an environment around several sections). Each fix is made and counted in the block where
+    # it is needed: something left open is closed at the end of the block that opened it.
+    # Returns (blocks, fixes per block).
+    starts = []
+    offset = 0
+    for block in blocks:
+        starts.append(offset)
+        offset += len(block)
+    edits, unclosed = find_edits(_mask_comments("".join(blocks)))
+    blocks = list(blocks)
+    fixes = [0] * len(blocks)
+    for start, end, replacement in reversed(edits):
+        index = bisect.bisect_right(starts, start) - 1
+        local = start - starts[index]
+        blocks[index] = blocks[index][:local] + replacement + blocks[index][local + end - start:]
+        fixes[index] += 1
+    for position, closing in reversed(unclosed):
+        index = bisect.bisect_right(starts, position) - 1
+        blocks[index] = _append_before_newline(blocks[index], closing)
+        fixes[index] += 1
+    return blocks, fixes
+
+
+def balance_braces(text):
+    # Drops unmatched closing braces and closes unclosed groups at the end; returns (text, fixes)
+    blocks, fixes = _balance_blocks([text], _brace_edits)
+    return blocks[0], fixes[0]
+
+
+def balance_environments(text):
+    # Drops stray \end{...}, closes environments left open; returns (text, fixes)
+    blocks, fixes = _balance_blocks([text], _environment_edits)
+    return blocks[0], fixes[0]
+
+
+def _append_before_newline(text, suffix):
+    stripped = text.rstrip("\n")
+    return stripped + suffix + text[len(stripped):]
+
+
+def repair_blocks(blocks):
+    # Documents (and document sections) can have environments whose braces are broken, so braces first
+    blocks, brace_fixes = _balance_blocks(blocks, _brace_edits)
+    blocks, environment_fixes = _balance_blocks(blocks, _environment_edits)
+    return blocks, [braces + environments for braces, environments in zip(brace_fixes, environment_fixes)]
+
+
+def repair_latex(text, template):
+    latex, fixes = strip_wrappers(text)
+    template_document = split_sections(template or "")
+    full_document = "\\begin{document}" in (template or "")
+
+    if full_document:
+        # Chatter before \documentclass and after \end{document}
+        start = latex.find("\\documentclass")
+        if start > 0:
+            latex = latex[start:]
+            fixes.append("removed text before the document")
+        end = latex.find("\\end{document}")
+        if end >= 0 and latex[end + len("\\end{document}"):].strip():
+            latex = latex[:end + len("\\end{document}")] + "\n"
+            fixes.append("removed text after the document")
+
+    document = split_sections(latex)
+    if full_document:
+        if "\\begin{document}" not in latex:
+            # Damaged or missing preamble: keep the model's sections, take the rest from the template
+            header = template_document.header if document.sections or "\\documentclass" in latex else document.header
+            document = LatexDocument(template_document.preamble, header, document.sections, document.trailer)
+            fixes.append("restored preamble")
+        elif document.preamble.strip() != template_document.preamble.strip():
+            document.preamble = template_document.preamble
+            fixes.append("restored preamble")
+        if "\\end{document}" not in document.trailer:
+            document.trailer = template_document.trailer or "\\end{document}\n"
+            fixes.append("restored \\end{document}")
+
+    # The header and sections are balanced together; a valid document is left as it is
+    blocks, block_fixes = repair_blocks([document.header] + [section.text for section in document.sections])
+    document.header = blocks[0]
+    document.sections = [Section(section.title, text) for section, text in zip(document.sections, blocks[1:])]
+    broken = [section.title for section, section_fixes in zip(document.sections, block_fixes[1:]) if section_fixes > MAX_SECTION_FIXES]
+    if any(block_fixes):
+        fixes.append("balanced braces and environments")
+
+    # Sections the model dropped come back from the template and are regenerated. A section only
+    # counts as dropped when the model returned fewer sections than the template has, and
+    # sections it renamed ("Skills" -> "Technical Skills") are matched by position between the
+    # sections whose titles match, as in replace_sections
+    titles = document.titles()
+    if len(titles) < len(template_document.sections):
+        template_titles = template_document.titles()
+        present = {title: title for title in template_titles if title in titles}  # template title -> output title
+        low = -1
+        for index, title in enumerate(template_titles):
+            if title in present:
+                low = titles.index(title)
+                continue
+            high = next((titles.index(other) for other in template_titles[index + 1:] if other in titles), len(titles))
+            renamed = next((position for position in range(low + 1, high) if titles[position] not in template_titles and titles[position] not in present.values()), None)
+            if renamed is not None:
+                present[title] = titles[renamed]
+                low = renamed
+        for index, section in enumerate(template_document.sections):
+            if section.title in present:
+                continue
+            previous = [present[other.title] for other in template_document.sections[:index] if other.title in present]
+            position = titles.index(previous[-1]) + 1 if previous else 0
+            document.sections.insert(position, Section(section.title, section.text))
+            titles.insert(position, section.title)
+            broken.append(section.title)
+            fixes.append(f"restored missing section {section.title}")
+
+    return RepairResult(document.to_latex(), fixes, broken)
+
+
+def validate_latex(latex, template=""):
+    # List of problems left in latex; empty when it is structurally sound
+    problems = []
+    if "\\begin{document}" in (template or ""):
+        if "\\begin{document}" not in latex:
+            problems.append("missing \\begin{document}")
+        if "\\end{document}" not in latex:
+            problems.append("missing \\end{document}")
+    if balance_braces(latex)[1]:
+        problems.append("unbalanced braces")
+    if balance_environments(latex)[1]:
+        problems.append("unbalanced environments")
+    return problems
@@ -0,0 +1,110 @@
+import re
+
+# Split LaTeX documents into content sections so that only the parts being rewritten are sent to
+# the model. The preamble, the header block before the first section and \end{document} stay local
+# and are spliced back around the model output.
+
+SECTION_START_RE = re.compile(r"\\(?:section|cvsection)\*?\s*\{", re.MULTILINE)
+
+SECTION_INSTRUCTIONS = """
+You are given only some sections of the resume, not the whole document.
+Rewrite just these sections for the job description, keeping their LaTeX commands and \\section headings.
+Return ONLY the LaTeX for these sections, in the same order, without a preamble or \\begin{document}.
+"""
+
+
+class Section:
+    def __init__(self, title, text):
+        self.title = title
+        self.text = text
+
+
+class LatexDocument:
+    def __init__(self, preamble, header, sections, trailer):
+        # preamble ends with \begin{document}; header is everything before the first section
+        self.preamble = preamble
+        self.header = header
+        self.sections = sections
+        self.trailer = trailer
+
+    def titles(self):
+        return [section.title for section in self.sections]
+
+    def body(self, titles=None):
+        return "".join(section.text for section in self.sections if titles is None or section.title in titles)
+
+    def to_latex(self):
+        return self.preamble + self.header + self.body() + self.trailer
+
+
+def _braced(text, start):
+    # Content of the brace group opening at text[start - 1]
+    depth = 1
+    index = start
+    while index < len(text) and depth:
+        if text[index] == "\\":
+            index += 2
+            continue
+        if text[index] == "{":
+            depth += 1
+        elif text[index] == "}":
+            depth -= 1
+        index += 1
+    return text[start:index - 1]
+
+
+def split_sections(latex):
+    preamble = ""
+    body = latex
+    marker = "\\begin{document}"
+    if marker in latex:
+        cut = latex.index(marker) + len(marker)
+        preamble, body = latex[:cut], latex[cut:]
+    trailer = ""
+    end_marker = "\\end{document}"
+    if end_marker in body:
+        cut = body.index(end_marker)
+        body, trailer = body[:cut], body[cut:]
+
+    starts = [match for match in SECTION_START_RE.finditer(body)]
+    if not starts:
+        return LatexDocument(preamble, body, [], trailer)
+    # Keep leading whitespace/comments of a section line with the previous block
+    boundaries = [body.rfind("\n", 0, match.start()) + 1 for match in starts]
+    sections = []
+    for index, match in enumerate(starts):
+        end = boundaries[index + 1] if index + 1 < len(starts) else len(body)
+        title = _braced(body, match.end()).strip()
+        sections.append(Section(title, body[boundaries[index]:end]))
+    return LatexDocument(preamble, body[:boundaries[0]], sections, trailer)
+
+
+def replace_sections(document, titles, new_latex):
+    # Splice model output for the given section titles into document. Sections are matched by
+    # title, or by position when the model renamed them; missing ones are left as they were.
+    generated = split_sections(new_latex).sections
+    by_title = {section.title: section for section in generated}
+    targets = [section for section in document.sections if section.title in titles]
+    positional = not any(section.title in by_title for section in targets)
+    replacements = {}
+    for index, section in enumerate(targets):
+        if section.title in by_title:
+            replacements[section.title] = by_title[section.title]
+        elif positional and index < len(generated):
+            replacements[section.title] = generated[index]
+    sections = []
+    for section in document.sections:
+        replacement = replacements.get(section.title)
+        if replacement is None:
+            sections.append(section)
+            continue
+        text = replacement.text
+        # Keep sections separated even if the model dropped the trailing newline
+        if not text.endswith("\n"):
+            text += "\n"
+        sections.append(Section(replacement.title, text))
+    return LatexDocument(document.preamble, document.header, sections, document.trailer)
+
+
+def section_titles(latex):
+    return split_sections(latex or "").titles()
@@ -0,0 +1,25 @@
+import re
+
+# Fast local LaTeX → plain text conversion, used to build compact prompt inputs
+
+COMMENT_RE = re.compile(r"(?<!\\)%.*")
+ENVIRONMENT_RE = re.compile(r"\\(?:begin|end)\{[^}]*\}")
+COMMAND_RE = re.compile(r"\\[a-zA-Z@]+\*?(?:\[[^\]]*\])?")
+ESCAPED_RE = re.compile(r"\\([&%$#_{}])")
+SPACE_RE = re.compile(r"[ \t]+")
+
+
+def document_body(latex):
+    if "\\begin{document}" in latex:
+        latex = latex.split("\\begin{document}", 1)[1]
+    return latex.split("\\end{document}", 1)[0]
+
+
+def latex_to_text(latex):
+    text = COMMENT_RE.sub("", document_body(latex))
+    text = ENVIRONMENT_RE.sub(" ", text)
+    text = text.replace("\\\\", "\n")
+    text = ESCAPED_RE.sub(r"\1", COMMAND_RE.sub(" ", text))
+    text = text.replace("{", " ").replace("}", " ").replace("~", " ")
+    lines = (SPACE_RE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
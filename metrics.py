@@ -0,0 +1,207 @@
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# In-process metrics in the Prometheus text exposition format, served by the Gradio app on /metrics.
+# Stage latencies (queue wait, cache lookup, provider calls, resume/cover-letter generation, file
+# writes), token usage reported by the providers, errors by provider and type, and cache hit ratio.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; LLM calls take from well under a second (cache) to a few minutes (reasoning models)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._series[label_values] = series
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _label_text(self.labels + ("le",), label_values + (repr(float(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _label_text(self.labels + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _label_text(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    # Value read from a callback at scrape time, e.g. the response cache hit ratio
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Metrics:
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "resume_builder_stage_seconds", "Latency of pipeline stages", ("stage", "provider", "outcome")
+        )
+        self.provider_request_seconds = Histogram(
+            "resume_builder_provider_request_seconds", "Latency of provider calls after scheduling", ("provider", "outcome")
+        )
+        self.tokens = Counter(
+            "resume_builder_tokens_total", "Tokens reported by provider usage fields", ("provider", "kind")
+        )
+        self.errors = Counter(
+            "resume_builder_errors_total", "Errors by provider and exception type", ("provider", "type")
+        )
+        self.coalesced = Counter(
+            "resume_builder_coalesced_requests_total", "Requests that joined an identical generation already in flight"
+        )
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    def register_gauge(self, name, help_text, read):
+        with self._lock:
+            if all(gauge.name != name for gauge in self._gauges):
+                self._gauges.append(Gauge(name, help_text, read))
+
+    def observe_stage(self, stage, seconds, provider="", outcome="ok"):
+        self.stage_seconds.observe(seconds, stage, provider, outcome)
+
+    @contextmanager
+    def stage(self, stage, provider=""):
+        # Times the enclosed block, which may span `async for` loops inside async generators
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started, provider, outcome)
+
+    async def timed_stream(self, stage, stream, provider=""):
+        # Async token stream timed from the first pull until it is exhausted or closed
+        with self.stage(stage, provider):
+            async for token in stream:
+                yield token
+
+    def record_request(self, provider, seconds, error=None):
+        outcome = "ok" if error is None else "error"
+        self.provider_request_seconds.observe(seconds, provider, outcome)
+        if error is not None:
+            self.record_error(provider, error)
+
+    def record_error(self, provider, error):
+        self.errors.inc(provider, type(error).__name__)
+
+    def record_usage(self, provider, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+        if prompt_tokens:
+            self.tokens.inc(provider, "prompt", amount=prompt_tokens)
+        if completion_tokens:
+            self.tokens.inc(provider, "completion", amount=completion_tokens)
+        if cached_tokens:
+            self.tokens.inc(provider, "cached", amount=cached_tokens)
+
+    def record_cache_eligible(self, provider, tokens):
+        # Estimated tokens of the static request prefix, the upper bound for "cached"
+        self.tokens.inc(provider, "cache_eligible", amount=tokens)
+
+    def record_coalesced(self):
+        self.coalesced.inc()
+
+    def render(self):
+        lines = []
+        for metric in (self.stage_seconds, self.provider_request_seconds, self.tokens, self.errors, self.coalesced):
+            lines.extend(metric.render())
+        with self._lock:
+            gauges = list(self._gauges)
+        for gauge in gauges:
+            lines.extend(gauge.render())
+        return "\n".join(lines) + "\n"
+
+
+def record_gemini_usage(provider, response):
+    # google.generativeai responses and stream chunks carry usage_metadata
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        metrics.record_usage(
+            provider,
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None),
+            getattr(usage, "cached_content_token_count", None)
+        )
+
+
+def record_openai_usage(provider, response):
+    # Chat completions, and the final stream chunk when include_usage is requested
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        # OpenAI-style prompt_tokens_details.cached_tokens, or DeepSeek's prompt_cache_hit_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or getattr(usage, "prompt_cache_hit_tokens", None)
+        metrics.record_usage(provider, getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), cached)
+
+
+metrics = Metrics()
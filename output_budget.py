@@ -0,0 +1,163 @@
+import os
+import time
+import asyncio
+from scheduler import estimate_tokens
+
+# Output budget for generations.
+# The answer is a customized copy of the template, so its length is bounded by the template's:
+# each request gets a max_tokens / max_output_tokens limit derived from the template size, the
+# caller's stream ends as soon as \end{document} arrives, and output that clearly diverges (no
+# LaTeX after the first few hundred tokens, or far longer than the budget) is aborted.
+
+# Output tokens allowed per template token, plus a fixed margin for short templates
+OUTPUT_RATIO = float(os.environ.get("OUTPUT_BUDGET_RATIO", 1.5))
+OUTPUT_MARGIN_TOKENS = int(os.environ.get("OUTPUT_BUDGET_MARGIN_TOKENS", 512))
+MAX_OUTPUT_TOKENS = int(os.environ.get("OUTPUT_BUDGET_MAX_TOKENS", 16384))
+# Reasoning models spend part of max_tokens on reasoning before the answer starts
+REASONING_ALLOWANCE_TOKENS = int(os.environ.get("OUTPUT_BUDGET_REASONING_TOKENS", 4096))
+# Output without a single LaTeX command after this many tokens is not going to become a document
+LATEX_GRACE_TOKENS = int(os.environ.get("OUTPUT_BUDGET_LATEX_GRACE_TOKENS", 400))
+# Token counts are estimated locally, so the stream is only aborted well past the provider's limit
+DIVERGENCE_FACTOR = 1.5
+# Providers report token usage in their last chunk, after \end{document}; a complete document's
+# stream is read this much longer (in the background) before it is closed
+USAGE_DRAIN_SECONDS = float(os.environ.get("OUTPUT_BUDGET_USAGE_DRAIN_SECONDS", 5))
+
+END_DOCUMENT = "\\end{document}"
+
+
+class OutputDiverged(Exception):
+    pass
+
+
+def output_budget(template, reasoning=False):
+    budget = int(estimate_tokens(template) * OUTPUT_RATIO) + OUTPUT_MARGIN_TOKENS
+    if reasoning:
+        budget += REASONING_ALLOWANCE_TOKENS
+    return min(budget, MAX_OUTPUT_TOKENS)
+
+
+class BudgetMonitor:
+    # Tracks one generation's output. feed(token) returns the part of token to pass on (everything
+    # up to and including \end{document}), raises OutputDiverged, and sets done once the document
+    # is complete. Text before the first LaTeX command is held back, so a stream that diverges
+    # before producing LaTeX has not shown anything yet and can be replaced.
+
+    def __init__(self, budget, template):
+        self.budget = budget
+        self.full_document = "\\begin{document}" in (template or "")
+        self.characters = 0
+        self.done = False
+        self.pending = ""
+        self.started = False
+        self._tail = ""
+
+    def feed(self, token):
+        self.characters += len(token)
+        # Same four-characters-per-token estimate as the scheduler
+        tokens = self.characters // 4
+        if tokens > self.budget * DIVERGENCE_FACTOR:
+            raise OutputDiverged(f"output exceeded its budget of {self.budget} tokens")
+        if not self.started:
+            self.pending += token
+            if "\\" not in self.pending:
+                if tokens > LATEX_GRACE_TOKENS:
+                    raise OutputDiverged(f"no LaTeX in the first {tokens} tokens")
+                return ""
+            self.started = True
+            token, self.pending = self.pending, ""
+        if self.full_document:
+            # The marker can be split across tokens
+            window = self._tail + token
+            end = window.find(END_DOCUMENT)
+            if end >= 0:
+                self.done = True
+                return token[:max(0, end + len(END_DOCUMENT) - len(self._tail))]
+            self._tail = window[-len(END_DOCUMENT):]
+        return token
+
+    def flush(self):
+        # Held-back text of a stream that ended before any LaTeX command
+        pending, self.pending = self.pending, ""
+        return pending
+
+
+_draining = set()
+
+
+async def _drain(token_stream):
+    # Reads the rest of a finished document's stream, usually just the usage chunk
+    async def rest():
+        async for _ in token_stream:
+            pass
+    try:
+        await asyncio.wait_for(rest(), USAGE_DRAIN_SECONDS)
+    except Exception:
+        pass
+    finally:
+        await token_stream.aclose()
+
+
+async def budgeted_stream(token_stream, budget, template):
+    monitor = BudgetMonitor(budget, template)
+    try:
+        async for token in token_stream:
+            text = monitor.feed(token)
+            if text:
+                yield text
+            if monitor.done:
+                return
+        pending = monitor.flush()
+        if pending:
+            yield pending
+    finally:
+        if monitor.done:
+            # The caller has the whole document; the usage chunk is read without holding it up
+            task = asyncio.create_task(_drain(token_stream))
+            _draining.add(task)
+            task.add_done_callback(_draining.discard)
+        else:
+            # Closing the provider stream aborts its HTTP response
+            await token_stream.aclose()
+
+
+def budgeted_stream_blocking(token_stream, budget, template):
+    monitor = BudgetMonitor(budget, template)
+    try:
+        for token in token_stream:
+            text = monitor.feed(token)
+            if text:
+                yield text
+            if monitor.done:
+                return
+        pending = monitor.flush()
+        if pending:
+            yield pending
+    finally:
+        if monitor.done:
+            deadline = time.monotonic() + USAGE_DRAIN_SECONDS
+            try:
+                for _ in token_stream:
+                    if time.monotonic() > deadline:
+                        break
+            except Exception:
+                pass
+        token_stream.close()
+
+
+async def fallback_stream(token_stream, fallback, reroute=(OutputDiverged,)):
+    # Relays token_stream; if it fails with one of the reroute errors (by default: diverges)
+    # before yielding anything, continues with fallback(), a factory for the replacement stream
+    # (or None when there is nothing to fall back to)
+    started = False
+    try:
+        async for token in token_stream:
+            started = True
+            yield token
+        return
+    except reroute:
+        replacement = fallback() if fallback is not None and not started else None
+        if replacement is None:
+            raise
+    async for token in replacement:
+        yield token
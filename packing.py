@@ -0,0 +1,114 @@
+import os
+import re
+import json
+from output_budget import output_budget
+from scheduler import estimate_tokens
+from latex_repair import THINK_RE, repair_latex, validate_latex
+
+# Packed requests for batch runs: one request carries the templates and K job descriptions and
+# asks for a JSON object with a resume and a cover letter per job description. Under the free
+# tiers' requests-per-minute limits this turns 2K calls into one. Items that are missing or fail
+# validation are reported back so the caller can generate them individually.
+
+PACKED_MAX_OUTPUT_TOKENS = int(os.environ.get("PACKED_MAX_OUTPUT_TOKENS", 8192))
+
+PACKED_INSTRUCTIONS = """
+You will receive several job descriptions, each with an id. For every job description, write a
+customized resume from the resume template and a cover letter from the cover letter template,
+following the resume and cover letter instructions above.
+Return ONLY a JSON object, with no code fences and no other text, of the form:
+{"<id>": {"resume": "<LaTeX>", "cover_letter": "<LaTeX>"}, ...}
+with one entry for every id. The LaTeX goes in JSON strings, so escape every backslash as \\\\,
+every double quote as \\" and every line break as \\n.
+"""
+
+# Escaping LaTeX for JSON strings (doubled backslashes, \n for line breaks) lengthens the output
+JSON_OVERHEAD = 1.15
+
+# JSON escapes such as \b, \f and \t can come from unescaped \begin, \frac or \textbf
+CONTROL_CHARACTER_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def packed_request_prefix(resume_prompt, cover_letter_prompt, resume_template, cover_letter_template):
+    # Static for a whole batch run, so providers can cache it like the single-document prefix
+    return (
+        f"Resume instructions:\n{resume_prompt}\n\nCover letter instructions:\n{cover_letter_prompt}\n"
+        f"{PACKED_INSTRUCTIONS}\nResume Template:\n{resume_template}\n\nCover Letter Template:\n{cover_letter_template}"
+    )
+
+
+def packed_request_suffix(jobs):
+    # jobs: list of (job id, job description)
+    return "Job Descriptions:\n" + json.dumps({job_id: job_description for job_id, job_description in jobs}, ensure_ascii=False, indent=1)
+
+
+def item_budget(templates):
+    # Abort headroom for one job description's documents (see output_budget)
+    return sum(output_budget(template) for template in templates)
+
+
+def expected_item_tokens(templates):
+    # Expected length of one job description's documents: about the templates' size, JSON-escaped
+    return int(sum(estimate_tokens(template) for template in templates) * JSON_OVERHEAD)
+
+
+def pack_size(requested, templates):
+    # Largest pack up to requested whose documents are expected to fit in one response; 1 when
+    # fewer than two fit, and packing would only add a truncated request before the single ones
+    fitting = PACKED_MAX_OUTPUT_TOKENS // expected_item_tokens(templates)
+    return min(requested, fitting) if fitting >= 2 else 1
+
+
+def packed_output_budget(count, templates):
+    return min(count * item_budget(templates), PACKED_MAX_OUTPUT_TOKENS)
+
+
+def _json_object(text):
+    # The outermost {...} of the response, without reasoning text or code fences around it
+    text = THINK_RE.sub("", text)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("response contains no JSON object")
+    # strict=False accepts raw line breaks inside strings
+    return json.loads(text[start:end + 1], strict=False)
+
+
+def _document(value, template):
+    # Repaired LaTeX for one packed document, or the reason it cannot be used
+    if not isinstance(value, str) or not value.strip():
+        return None, "missing"
+    if CONTROL_CHARACTER_RE.search(value):
+        return None, "LaTeX was not escaped for JSON"
+    result = repair_latex(value, template)
+    if result.broken_sections:
+        return None, "broken sections: " + ", ".join(result.broken_sections)
+    problems = validate_latex(result.latex, template)
+    if problems:
+        return None, "; ".join(problems)
+    return result.latex, None
+
+
+def split_packed_response(text, job_ids, templates):
+    # Returns ({job id: (resume, cover letter)}, {job id: error}) covering every job id
+    resume_template, cover_letter_template = templates
+    try:
+        packed = _json_object(text)
+    except ValueError as e:
+        return {}, {job_id: f"invalid packed response: {e}" for job_id in job_ids}
+    if not isinstance(packed, dict):
+        return {}, {job_id: "invalid packed response: not a JSON object" for job_id in job_ids}
+    documents = {}
+    errors = {}
+    for job_id in job_ids:
+        item = packed.get(job_id)
+        if not isinstance(item, dict):
+            errors[job_id] = "missing from packed response"
+            continue
+        resume, resume_error = _document(item.get("resume"), resume_template)
+        cover_letter, cover_letter_error = _document(item.get("cover_letter"), cover_letter_template)
+        if resume_error or cover_letter_error:
+            errors[job_id] = f"resume {resume_error}" if resume_error else f"cover letter {cover_letter_error}"
+        else:
+            documents[job_id] = (resume, cover_letter)
+    return documents, errors
@@ -0,0 +1,394 @@
+import os
+import time
+import asyncio
+import hashlib
+import datetime
+import threading
+from metrics import metrics, record_gemini_usage, record_openai_usage
+from scheduler import estimate_tokens
+
+# Shared provider layer for the Gradio and Streamlit apps.
+# The provider SDKs (google.generativeai, openai, httpx) take seconds to import, so they are only
+# imported when a provider is first used or when warm_up() runs in the background after startup.
+
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Alternative Gemini endpoint such as the benchmark mock, e.g. http://127.0.0.1:8765; reached over REST
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT")
+
+# Connection pool shared by every request to an OpenAI-compatible backend
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("PROVIDER_TIMEOUT_SECONDS", 600))
+HTTP_CONNECT_TIMEOUT_SECONDS = 10.0
+HTTP_MAX_CONNECTIONS = int(os.environ.get("PROVIDER_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("PROVIDER_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("PROVIDER_KEEPALIVE_SECONDS", 120))
+
+# Provider-side caching of the static request prefix (instructions and template). Some
+# OpenAI-compatible backends cache repeated prefixes automatically; Gemini gets an explicit
+# CachedContent per prefix.
+PROVIDER_CONTEXT_CACHE = os.environ.get("PROVIDER_CONTEXT_CACHE", "1") != "0"
+GEMINI_CACHE_TTL_SECONDS = int(os.environ.get("GEMINI_CACHE_TTL_SECONDS", 3600))
+# The API rejects cached contents below a model-dependent minimum size
+GEMINI_CACHE_MIN_TOKENS = int(os.environ.get("GEMINI_CACHE_MIN_TOKENS", 4096))
+# A cache entry this close to expiry is replaced instead of used
+GEMINI_CACHE_EXPIRY_MARGIN_SECONDS = 60
+# After a failed create (e.g. the model does not support caching), requests go uncached for a while
+GEMINI_CACHE_RETRY_SECONDS = 600
+# OpenAI-compatible models known to cache prompt prefixes (comma-separated). None by default:
+# OpenRouter routes free models to varying upstreams, so a cache hit is not guaranteed
+PREFIX_CACHED_MODELS = {name.strip() for name in os.environ.get("PREFIX_CACHED_MODELS", "").split(",") if name.strip()}
+# OpenAI-compatible backends only cache prefixes from about this size on
+OPENAI_PREFIX_CACHE_MIN_TOKENS = int(os.environ.get("OPENAI_PREFIX_CACHE_MIN_TOKENS", 1024))
+
+
+def _genai():
+    import google.generativeai as genai
+    return genai
+
+
+def _gemini_options():
+    if not GEMINI_API_ENDPOINT:
+        return {}
+    return {"transport": "rest", "client_options": {"api_endpoint": GEMINI_API_ENDPOINT}}
+
+
+def _http_settings():
+    import httpx
+    timeout = httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+    )
+    return timeout, limits
+
+
+# Request assembly. The static part (instructions and template) comes first and the job-specific
+# part last, so consecutive requests share a prefix that the provider can cache.
+def resume_request_prefix(prompt, resume_template):
+    return f"{prompt}\n\nResume Template:\n{resume_template}"
+
+def resume_request_suffix(job_description, hints=""):
+    return f"Job Description:\n{job_description}\n{hints}"
+
+def cover_letter_request_prefix(prompt, template):
+    return f"{prompt}\n\nCover Letter Template:\n{template}"
+
+def cover_letter_request_suffix(job_description, resume):
+    return f"Job Description:\n{job_description}\n\nResume:\n{resume}"
+
+def join_request(prefix, suffix):
+    return f"{prefix}\n\n{suffix}"
+
+
+# Provider registry
+class OpenRouterClients:
+    # Sync and async OpenAI-compatible clients for one API key, each with a keep-alive connection pool.
+    # Each client is built on first access.
+
+    def __init__(self, api_key, base_url=OPENROUTER_BASE_URL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    timeout, limits = _http_settings()
+                    self._client = OpenAI(
+                        base_url=self.base_url,
+                        api_key=self.api_key,
+                        # Retries are handled by the scheduler, which knows about every provider's quota
+                        max_retries=0,
+                        http_client=httpx.Client(limits=limits, timeout=timeout)
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    import httpx
+                    from openai import AsyncOpenAI
+                    timeout, limits = _http_settings()
+                    self._async_client = AsyncOpenAI(
+                        base_url=self.base_url,
+                        api_key=self.api_key,
+                        max_retries=0,
+                        http_client=httpx.AsyncClient(limits=limits, timeout=timeout)
+                    )
+        return self._async_client
+
+
+class ProviderRegistry:
+    # Builds each provider client once, caches model handles and swaps clients atomically on key changes.
+    # Readers take a snapshot (openrouter() / gemini_model()) and keep using it for the whole request,
+    # so a key change never affects a generation that is already running.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gemini_key = None
+        self._gemini_configured = None
+        self._gemini_models = {}
+        self._gemini_caches = {}  # prefix hash -> (model handle, expiry time)
+        self._gemini_cache_disabled = {}  # model name -> time caching may be retried
+        self._gemini_cache_lock = threading.Lock()
+        self._openrouter = None
+        self._warm_up = None
+
+    def configure_gemini(self, api_key):
+        # The SDK is configured when the first model handle is requested
+        with self._lock:
+            if api_key == self._gemini_key:
+                return
+            self._gemini_key = api_key
+            # Model handles hold on to the client built for the previous key, and cached
+            # contents belong to the previous key's project
+            self._gemini_models = {}
+            self._gemini_caches = {}
+
+    def configure_openrouter(self, api_key):
+        current = self._openrouter
+        if current is not None and current.api_key == api_key:
+            return current
+        clients = OpenRouterClients(api_key)
+        with self._lock:
+            self._openrouter = clients
+        return clients
+
+    def gemini_available(self):
+        return self._gemini_key is not None
+
+    def openrouter_available(self):
+        return self._openrouter is not None
+
+    def gemini_model(self, model_name):
+        model = self._gemini_models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._gemini_models.get(model_name)
+                if model is None:
+                    genai = _genai()
+                    if self._gemini_configured != self._gemini_key:
+                        genai.configure(api_key=self._gemini_key, **_gemini_options())
+                        self._gemini_configured = self._gemini_key
+                    model = genai.GenerativeModel(model_name)
+                    self._gemini_models[model_name] = model
+        return model
+
+    def gemini_cached_model(self, model_name, prefix):
+        # Model handle whose context is prefix, kept in a Gemini CachedContent for
+        # GEMINI_CACHE_TTL_SECONDS. Entries are keyed by the prefix hash, so a changed template or
+        # prompt gets a new entry and the old one expires on its own. None if the prefix cannot be cached.
+        if not PROVIDER_CONTEXT_CACHE or estimate_tokens(prefix) < GEMINI_CACHE_MIN_TOKENS:
+            return None
+        key = hashlib.sha256(f"{model_name}\n{prefix}".encode("utf-8")).hexdigest()
+        now = time.time()
+        entry = self._gemini_caches.get(key)
+        if entry is not None and entry[1] - GEMINI_CACHE_EXPIRY_MARGIN_SECONDS > now:
+            return entry[0]
+        if self._gemini_cache_disabled.get(model_name, 0) > now:
+            return None
+        # Only one create per prefix at a time; concurrent requests wait for it
+        with self._gemini_cache_lock:
+            entry = self._gemini_caches.get(key)
+            if entry is not None and entry[1] - GEMINI_CACHE_EXPIRY_MARGIN_SECONDS > now:
+                return entry[0]
+            # Configures the SDK for the current key
+            self.gemini_model(model_name)
+            genai = _genai()
+            try:
+                cached = genai.caching.CachedContent.create(
+                    model=model_name,
+                    display_name=f"resume-builder-{key[:16]}",
+                    contents=[prefix],
+                    ttl=datetime.timedelta(seconds=GEMINI_CACHE_TTL_SECONDS),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+            except Exception as e:
+                metrics.record_error("gemini_cache", e)
+                self._gemini_cache_disabled[model_name] = now + GEMINI_CACHE_RETRY_SECONDS
+                return None
+            with self._lock:
+                self._gemini_caches = {
+                    other: value for other, value in self._gemini_caches.items() if value[1] > now
+                }
+                self._gemini_caches[key] = (model, now + GEMINI_CACHE_TTL_SECONDS)
+        return model
+
+    def prefix_cached(self, provider, model_name, prefix):
+        # Whether requests starting with prefix will be served from a provider-side cache
+        if not PROVIDER_CONTEXT_CACHE:
+            return False
+        if provider == "gemini":
+            return estimate_tokens(prefix) >= GEMINI_CACHE_MIN_TOKENS and self._gemini_cache_disabled.get(model_name, 0) <= time.time()
+        return model_name in PREFIX_CACHED_MODELS and estimate_tokens(prefix) >= OPENAI_PREFIX_CACHE_MIN_TOKENS
+
+    def gemini_request(self, model_name, prefix, suffix):
+        # (model, contents) for a request: only the suffix is sent when the prefix is cached
+        metrics.record_cache_eligible("gemini", estimate_tokens(prefix))
+        model = self.gemini_cached_model(model_name, prefix)
+        if model is not None:
+            return model, suffix
+        return self.gemini_model(model_name), join_request(prefix, suffix)
+
+    def openrouter(self):
+        return self._openrouter
+
+    def warm_up(self, gemini_models=()):
+        # Import the SDKs and build clients for the configured providers in a background thread,
+        # so the first request does not pay for it. Only the first call starts the thread.
+        with self._lock:
+            if self._warm_up is not None:
+                return self._warm_up
+            self._warm_up = threading.Thread(target=self._warm_up_providers, args=(gemini_models,), name="provider-warm-up", daemon=True)
+        self._warm_up.start()
+        return self._warm_up
+
+    # Health probes: cheap calls that check the key and do not spend generation quota
+    def probe_gemini(self, model_name, timeout):
+        # Fails for an invalid key or an unknown model
+        self.gemini_model(model_name).count_tokens("ping", request_options={"timeout": timeout})
+
+    def probe_openrouter(self, timeout):
+        # GET /key describes the API key and fails without a valid one (unlike the public /models)
+        openrouter = self.openrouter()
+        if openrouter is None:
+            raise RuntimeError("not configured")
+        openrouter.client.with_options(timeout=timeout, max_retries=0).get("/key", cast_to=object)
+
+    def _warm_up_providers(self, gemini_models):
+        try:
+            if self.gemini_available():
+                for model_name in gemini_models:
+                    self.gemini_model(model_name)
+            openrouter = self.openrouter()
+            if openrouter is not None:
+                openrouter.client
+                openrouter.async_client
+        except Exception:
+            # Warm-up is best effort; the first real request reports any error
+            pass
+
+
+registry = ProviderRegistry()
+
+
+def _gemini_generation_config(max_output_tokens):
+    return {"max_output_tokens": max_output_tokens} if max_output_tokens else None
+
+def _chat_options(max_tokens):
+    return {"max_tokens": max_tokens} if max_tokens else {}
+
+
+# Token streaming
+def stream_gemini(model, contents, max_output_tokens=None):
+    response = model.generate_content(contents, stream=True, generation_config=_gemini_generation_config(max_output_tokens))
+    chunk = None
+    try:
+        for chunk in response:
+            # Chunks without parts (e.g. the final usage-only chunk) have no text
+            if chunk.parts:
+                yield chunk.text
+    finally:
+        # Usage counts are cumulative, so only the last chunk seen is recorded, also when the
+        # consumer stopped early
+        record_gemini_usage("gemini", chunk)
+
+def stream_chat_completion(client, model, messages, extra_headers=None, provider="openrouter", max_tokens=None, prefix_tokens=None):
+    # prefix_tokens: estimated size of the static prefix, recorded as cache-eligible
+    if prefix_tokens:
+        metrics.record_cache_eligible(provider, prefix_tokens)
+    stream = client.chat.completions.create(
+        extra_headers=extra_headers,
+        model=model,
+        messages=messages,
+        stream=True,
+        # Adds a final chunk carrying token usage
+        stream_options={"include_usage": True},
+        **_chat_options(max_tokens)
+    )
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            record_openai_usage(provider, chunk)
+    finally:
+        # Closing the stream aborts the HTTP response if the consumer stopped early
+        stream.close()
+
+
+def stream_gemini_prefixed(model_name, prefix, suffix, max_output_tokens=None):
+    # Looks up the cached prefix on the first pull, so a lazy stream makes no calls on a cache hit
+    model, contents = registry.gemini_request(model_name, prefix, suffix)
+    yield from stream_gemini(model, contents, max_output_tokens)
+
+
+# Async token streaming, so one event loop can serve many generations at once
+async def astream_gemini(model, contents, max_output_tokens=None):
+    response = await model.generate_content_async(contents, stream=True, generation_config=_gemini_generation_config(max_output_tokens))
+    chunk = None
+    try:
+        async for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+    finally:
+        record_gemini_usage("gemini", chunk)
+
+async def astream_gemini_prefixed(model_name, prefix, suffix, max_output_tokens=None):
+    # Creating a cached content is a blocking call
+    model, contents = await asyncio.to_thread(registry.gemini_request, model_name, prefix, suffix)
+    async for token in astream_gemini(model, contents, max_output_tokens):
+        yield token
+
+async def astream_chat_completion(client, model, messages, extra_headers=None, provider="openrouter", max_tokens=None, prefix_tokens=None):
+    if prefix_tokens:
+        metrics.record_cache_eligible(provider, prefix_tokens)
+    stream = await client.chat.completions.create(
+        extra_headers=extra_headers,
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        **_chat_options(max_tokens)
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            record_openai_usage(provider, chunk)
+    finally:
+        await stream.close()
+
+
+async def merge_token_streams(streams):
+    # Run several named token streams concurrently and yield (name, token, error) in arrival order.
+    # token is None once a stream is finished; error is set if it failed.
+    queue = asyncio.Queue()
+
+    async def pump(name, stream):
+        try:
+            async for token in stream:
+                await queue.put((name, token, None))
+        except Exception as e:
+            await queue.put((name, None, e))
+            return
+        await queue.put((name, None, None))
+
+    tasks = [asyncio.create_task(pump(name, stream)) for name, stream in streams.items()]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item[1] is None:
+                remaining -= 1
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,163 @@
+import os
+import re
+from collections import Counter
+import numpy as np
+from latex_text import latex_to_text
+from latex_sections import SECTION_START_RE
+
+# Local relevance ranking of resume items against the job description.
+# Every \item of the resume is scored with BM25 against the job description's keywords. Long
+# master resumes can be cut down to their most relevant items before they are sent to the model,
+# and the keywords plus the best-scoring items are passed along as hints.
+
+RELEVANCE_FILTER = os.environ.get("RELEVANCE_FILTER", "1") != "0"
+# Resumes with at most this many items are sent whole
+MIN_ITEMS_TO_FILTER = int(os.environ.get("RELEVANCE_MIN_ITEMS", 12))
+# Share of items kept when filtering, never fewer than MIN_ITEMS_KEPT
+KEEP_RATIO = float(os.environ.get("RELEVANCE_KEEP_RATIO", 0.6))
+MIN_ITEMS_KEPT = 8
+KEYWORD_COUNT = 25
+HINT_ITEMS = 5
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+WORD_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+ITEM_RE = re.compile(r"\\(?:item|resumeItem|cvitem)\b")
+LIST_END_RE = re.compile(r"\\end\{(?:itemize|enumerate|description)\}|\\resumeItemListEnd\b")
+DOCUMENT_END_RE = re.compile(r"\\end\{document\}")
+
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can could did do does
+doing during each few for from further had has have having he her here hers him his how i if in into
+is it its itself just me more most my no nor not now of off on once only or other our ours out over
+own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours able ability across etc including within work working role team teams
+candidate candidates experience years year strong excellent good great looking join us company
+responsibilities requirements required preferred plus using use new well help must
+""".split())
+
+
+def tokenize(text):
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def job_keywords(job_description, count=KEYWORD_COUNT):
+    # Most frequent content words of the job description, in order of frequency
+    return [word for word, _ in Counter(tokenize(job_description)).most_common(count)]
+
+
+class ResumeItem:
+    def __init__(self, start, end, list_index, text):
+        self.start = start
+        self.end = end
+        self.list_index = list_index
+        self.text = text
+
+
+def _line_start(text, position):
+    # Move position back to the start of its line if only indentation precedes it
+    line_start = text.rfind("\n", 0, position) + 1
+    return line_start if not text[line_start:position].strip() else position
+
+
+def find_items(latex):
+    # Spans of \item entries in the document body (the preamble may use \item in macro
+    # definitions); an item ends at the next item, at the end of its list, or at the next section
+    # heading or \end{document} (\cvitem entries are not in a list), so no span crosses a section
+    items = []
+    body_start = latex.find("\\begin{document}") + 1
+    boundaries = sorted(
+        [_line_start(latex, match.start()) for match in LIST_END_RE.finditer(latex, body_start)]
+        + [_line_start(latex, match.start()) for match in SECTION_START_RE.finditer(latex, body_start)]
+        + [_line_start(latex, match.start()) for match in DOCUMENT_END_RE.finditer(latex, body_start)]
+    )
+    starts = [_line_start(latex, match.start()) for match in ITEM_RE.finditer(latex, body_start)]
+    for index, start in enumerate(starts):
+        next_start = starts[index + 1] if index + 1 < len(starts) else len(latex)
+        boundary = next((end for end in boundaries if end > start), len(latex))
+        end = min(next_start, boundary)
+        # Items in the same list (or section) share the position of its end
+        items.append(ResumeItem(start, end, boundary, latex[start:end]))
+    return items
+
+
+def bm25_scores(documents, query_terms):
+    # documents: list of token lists. Returns one BM25 score per document.
+    if not documents or not query_terms:
+        return np.zeros(len(documents))
+    vocabulary = {term: index for index, term in enumerate(dict.fromkeys(query_terms))}
+    counts = np.zeros((len(documents), len(vocabulary)))
+    for row, tokens in enumerate(documents):
+        for token in tokens:
+            column = vocabulary.get(token)
+            if column is not None:
+                counts[row, column] += 1
+    lengths = np.array([len(tokens) for tokens in documents], dtype=float)
+    average_length = lengths.mean() or 1.0
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log1p((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+    weighted = counts * (BM25_K1 + 1) / (counts + norm[:, None])
+    return weighted @ idf
+
+
+def rank_items(latex, job_description):
+    # Returns (keywords, items, scores) for the resume's \item entries
+    keywords = job_keywords(job_description)
+    items = find_items(latex)
+    documents = [tokenize(latex_to_text(item.text)) for item in items]
+    return keywords, items, bm25_scores(documents, keywords)
+
+
+def select_items(items, scores):
+    # Indices of the items to keep: the best-scoring matching ones (at least MIN_ITEMS_KEPT items
+    # overall), plus the best item of every list so that no itemize environment is left empty
+    keep_count = max(MIN_ITEMS_KEPT, int(round(len(items) * KEEP_RATIO)))
+    order = np.argsort(-scores, kind="stable")
+    matching = int((scores > 0).sum())
+    keep = set(order[:max(MIN_ITEMS_KEPT, min(keep_count, matching))].tolist())
+    best_in_list = {}
+    for index in order.tolist():
+        best_in_list.setdefault(items[index].list_index, index)
+    keep.update(best_in_list.values())
+    # An item that opens a nested list cannot be dropped without unbalancing it
+    keep.update(index for index, item in enumerate(items) if "\\begin{" in item.text)
+    return keep
+
+
+def relevance_hints(keywords, items, scores):
+    lines = ["", "Relevance hints (computed locally):", "Job description keywords: " + ", ".join(keywords)]
+    ranked = {}
+    for index in np.argsort(-scores, kind="stable").tolist():
+        if scores[index] <= 0 or len(ranked) == HINT_ITEMS:
+            break
+        summary = " ".join(latex_to_text(items[index].text).split())[:100]
+        ranked.setdefault(summary, scores[index])
+    if ranked:
+        lines.append("Most relevant resume items (BM25 score):")
+        for summary, score in ranked.items():
+            lines.append(f"- ({score:.2f}) {summary}")
+    return "\n".join(lines) + "\n"
+
+
+def focus_resume(resume_template, job_description, filter_items=True):
+    # Returns the (resume, hints) pair to send: low-relevance items are dropped from long resumes
+    # (unless filter_items is off, e.g. when the whole template is a provider-cached prefix), and
+    # hints holds the keyword and ranking hints for the job-specific part of the request
+    if not RELEVANCE_FILTER or not resume_template or not job_description:
+        return resume_template, ""
+    keywords, items, scores = rank_items(resume_template, job_description)
+    if not items:
+        return resume_template, ""
+    if filter_items and len(items) > MIN_ITEMS_TO_FILTER:
+        keep = select_items(items, scores)
+        parts = []
+        position = 0
+        for index, item in enumerate(items):
+            if index not in keep:
+                parts.append(resume_template[position:item.start])
+                position = item.end
+        parts.append(resume_template[position:])
+        resume_template = "".join(parts)
+    return resume_template, relevance_hints(keywords, items, scores)
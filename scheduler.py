@@ -0,0 +1,325 @@
+import os
+import time
+import heapq
+import random
+import sqlite3
+import asyncio
+import itertools
+import threading
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+from metrics import metrics
+
+# Rate-limit-aware scheduling in front of every provider call.
+# Each provider gets a requests/minute and a tokens/minute bucket; callers wait for capacity in
+# priority order (interactive before batch), and rate-limited or transient failures are retried
+# with exponential backoff and full jitter, honouring Retry-After when the provider sends it.
+# The bucket levels and Retry-After pauses are kept in SQLite, so the web server and the
+# job_worker processes share one quota per provider instead of each using all of it.
+
+INTERACTIVE = 0
+BATCH = 1
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# openai.APIConnectionError (and its APITimeoutError subclass), httpx.TransportError (timeouts,
+# network and protocol errors)
+TRANSPORT_ERRORS = frozenset({"APIConnectionError", "TransportError"})
+POLL_INTERVAL = 0.05
+
+PROVIDER_LIMITS = {
+    "gemini": {
+        "requests_per_minute": float(os.environ.get("GEMINI_RPM", 15)),
+        "tokens_per_minute": float(os.environ.get("GEMINI_TPM", 1000000)),
+    },
+    "openrouter": {
+        "requests_per_minute": float(os.environ.get("OPENROUTER_RPM", 20)),
+        "tokens_per_minute": float(os.environ.get("OPENROUTER_TPM", 1000000)),
+    },
+}
+MAX_RETRIES = int(os.environ.get("PROVIDER_MAX_RETRIES", 5))
+BACKOFF_BASE_SECONDS = float(os.environ.get("PROVIDER_BACKOFF_BASE_SECONDS", 1.0))
+BACKOFF_MAX_SECONDS = float(os.environ.get("PROVIDER_BACKOFF_MAX_SECONDS", 60.0))
+RATE_LIMIT_PATH = os.environ.get("RATE_LIMIT_PATH", "cache/rate_limits.sqlite")
+# 0 keeps the limits per process
+SHARED_RATE_LIMITS = os.environ.get("SHARED_RATE_LIMITS", "1") != "0"
+
+
+def estimate_tokens(*texts):
+    # About four characters per token for English prose and LaTeX
+    return sum(len(text or "") for text in texts) // 4 + 1
+
+
+def error_status(error):
+    # openai.APIStatusError exposes status_code, google.api_core errors expose an int code
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # Connection failures and timeouts of the openai SDK and httpx do not subclass the built-in
+    # ones; matched by name so the SDKs are not imported here
+    if any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__):
+        return True
+    return error_status(error) in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None, now=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class SharedLimits:
+    # Bucket levels and Retry-After pauses per provider in SQLite (WAL mode). Levels are refilled
+    # and taken inside one transaction, with wall-clock times since several processes use them.
+
+    def __init__(self, path=RATE_LIMIT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS limits ("
+            "provider TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+            "updated REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)"
+        )
+
+    def reserve(self, scheduler, tokens):
+        # Runs scheduler.reserve on the shared state; returns its wait time
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT requests, tokens, updated, blocked_until FROM limits WHERE provider = ?", (scheduler.name,)
+                ).fetchone()
+                if row is not None:
+                    scheduler.requests.level, scheduler.tokens.level, updated, scheduler._blocked_until = row
+                    scheduler.requests.updated = scheduler.tokens.updated = updated
+                wait = scheduler.reserve(tokens, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO limits (provider, requests, tokens, updated, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                    (scheduler.name, scheduler.requests.level, scheduler.tokens.level, now, scheduler._blocked_until)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def block(self, provider, until):
+        # Pauses every process's calls to provider until the given wall-clock time
+        with self._lock:
+            self._conn.execute(
+                "UPDATE limits SET blocked_until = MAX(blocked_until, ?) WHERE provider = ?", (until, provider)
+            )
+
+
+class ProviderScheduler:
+    def __init__(self, name, requests_per_minute, tokens_per_minute, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE_SECONDS, backoff_max=BACKOFF_MAX_SECONDS, limits=None):
+        self.name = name
+        # limits: SharedLimits to share the quota with other processes, None to keep it here
+        self.limits = limits
+        self._clock = time.monotonic if limits is None else time.time
+        self.requests = TokenBucket(requests_per_minute, now=self._clock())
+        self.tokens = TokenBucket(tokens_per_minute, now=self._clock())
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.rate_limited = 0
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, priority):
+        entry = (priority, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+        return entry
+
+    def _dequeue(self, entry):
+        with self._lock:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+
+    def reserve(self, tokens, now):
+        # Takes capacity for one request if there is enough; returns the time to wait otherwise
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        return 0.0
+
+    def _try_reserve(self, entry, tokens):
+        # Only the highest-priority, longest-waiting caller may take capacity
+        with self._lock:
+            if self._waiters[0] != entry:
+                return POLL_INTERVAL
+            if self.limits is None:
+                wait = self.reserve(tokens, time.monotonic())
+            else:
+                wait = self.limits.reserve(self, tokens)
+            if wait == 0:
+                heapq.heappop(self._waiters)
+            return wait
+
+    async def acquire(self, tokens, priority=INTERACTIVE):
+        entry = self._enqueue(priority)
+        started = time.perf_counter()
+        try:
+            while True:
+                wait = self._try_reserve(entry, tokens)
+                if wait == 0:
+                    metrics.observe_stage("queue_wait", time.perf_counter() - started, self.name)
+                    return
+                await asyncio.sleep(min(wait, 0.25))
+        except BaseException:
+            self._dequeue(entry)
+            raise
+
+    def acquire_blocking(self, tokens, priority=INTERACTIVE):
+        entry = self._enqueue(priority)
+        started = time.perf_counter()
+        try:
+            while True:
+                wait = self._try_reserve(entry, tokens)
+                if wait == 0:
+                    metrics.observe_stage("queue_wait", time.perf_counter() - started, self.name)
+                    return
+                time.sleep(min(wait, 0.25))
+        except BaseException:
+            self._dequeue(entry)
+            raise
+
+    def backoff_delay(self, attempt, error):
+        # Full jitter, never shorter than the provider's Retry-After
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        with self._lock:
+            self.retries += 1
+            if error_status(error) == 429:
+                self.rate_limited += 1
+                if retry_after is not None:
+                    # Pause every caller of this provider, not just the one that was rejected
+                    self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+                    if self.limits is not None:
+                        self.limits.block(self.name, self._blocked_until)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def should_retry(self, error, attempt):
+        return attempt < self.max_retries and is_retryable(error)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+_shared_limits = None
+
+
+def get_scheduler(provider):
+    global _shared_limits
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider)
+        if scheduler is None:
+            if SHARED_RATE_LIMITS and _shared_limits is None:
+                _shared_limits = SharedLimits()
+            scheduler = ProviderScheduler(provider, **PROVIDER_LIMITS[provider], limits=_shared_limits)
+            _schedulers[provider] = scheduler
+        return scheduler
+
+
+async def scheduled_stream(scheduler, stream_factory, estimated_tokens, priority=INTERACTIVE, on_give_up=None):
+    # stream_factory returns a fresh async token stream per attempt. Only failures before the
+    # first token are retried; once text has reached the caller the error is propagated.
+    # on_give_up(error) is called when a retryable error is propagated after all (retries used
+    # up, or text already sent), e.g. to report it to the provider's circuit breaker.
+    attempt = 0
+    while True:
+        await scheduler.acquire(estimated_tokens, priority)
+        started = False
+        called = time.perf_counter()
+        try:
+            async for token in stream_factory():
+                started = True
+                yield token
+            metrics.record_request(scheduler.name, time.perf_counter() - called)
+            return
+        except Exception as e:
+            metrics.record_request(scheduler.name, time.perf_counter() - called, e)
+            if started or not scheduler.should_retry(e, attempt):
+                if on_give_up is not None and is_retryable(e):
+                    on_give_up(e)
+                raise
+            delay = scheduler.backoff_delay(attempt, e)
+            attempt += 1
+        await asyncio.sleep(delay)
+
+
+def scheduled_stream_blocking(scheduler, stream_factory, estimated_tokens, priority=INTERACTIVE):
+    attempt = 0
+    while True:
+        scheduler.acquire_blocking(estimated_tokens, priority)
+        started = False
+        called = time.perf_counter()
+        try:
+            for token in stream_factory():
+                started = True
+                yield token
+            metrics.record_request(scheduler.name, time.perf_counter() - called)
+            return
+        except Exception as e:
+            metrics.record_request(scheduler.name, time.perf_counter() - called, e)
+            if started or not scheduler.should_retry(e, attempt):
+                raise
+            delay = scheduler.backoff_delay(attempt, e)
+            attempt += 1
+        time.sleep(delay)
@@ -0,0 +1,110 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Server-side per-session storage for templates, prompts and generated documents, so Gradio
+# events exchange a session id instead of shipping whole documents on every click.
+# Texts are content-addressed and shared between sessions (every session starts from the same
+# saved templates); memory per session is bounded and idle sessions are evicted.
+
+MAX_SESSION_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 8 * 1024 * 1024))
+SESSION_IDLE_SECONDS = int(os.environ.get("SESSION_IDLE_SECONDS", 2 * 3600))
+MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", 1000))
+
+
+class SessionLimitError(ValueError):
+    pass
+
+
+def content_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    def __init__(self, max_session_bytes=MAX_SESSION_BYTES, idle_seconds=SESSION_IDLE_SECONDS, max_sessions=MAX_SESSIONS):
+        self.max_session_bytes = max_session_bytes
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> (last seen, {slot: content id}), oldest first
+        self._blobs = {}  # content id -> [text, reference count]
+        self._lock = threading.Lock()
+
+    def create(self, texts=None):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_idle(time.monotonic(), reserve=1)
+            self._sessions[session_id] = [time.monotonic(), {}]
+        for slot, text in (texts or {}).items():
+            self.set_text(session_id, slot, text)
+        return session_id
+
+    def exists(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def set_text(self, session_id, slot, text):
+        text = text or ""
+        key = content_id(text)
+        with self._lock:
+            session = self._touch(session_id)
+            slots = session[1]
+            if slots.get(slot) == key:
+                return key
+            used = sum(len(self._blobs[other][0]) for name, other in slots.items() if name != slot)
+            if used + len(text) > self.max_session_bytes:
+                raise SessionLimitError(f"Session storage limit of {self.max_session_bytes} bytes exceeded")
+            blob = self._blobs.setdefault(key, [text, 0])
+            blob[1] += 1
+            if slot in slots:
+                self._release(slots[slot])
+            slots[slot] = key
+            return key
+
+    def get_text(self, session_id, slot):
+        with self._lock:
+            key = self._touch(session_id)[1].get(slot)
+            return self._blobs[key][0] if key is not None else ""
+
+    def get_id(self, session_id, slot):
+        with self._lock:
+            return self._touch(session_id)[1].get(slot)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "blobs": len(self._blobs),
+                "bytes": sum(len(blob[0]) for blob in self._blobs.values()),
+            }
+
+    def _touch(self, session_id):
+        now = time.monotonic()
+        self._evict_idle(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        session[0] = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _release(self, key):
+        blob = self._blobs[key]
+        blob[1] -= 1
+        if blob[1] <= 0:
+            del self._blobs[key]
+
+    def _evict_idle(self, now, reserve=0):
+        # Sessions are ordered by last use, so only the front of the queue can be idle
+        while self._sessions:
+            session_id, (last_seen, slots) = next(iter(self._sessions.items()))
+            if now - last_seen < self.idle_seconds and len(self._sessions) + reserve <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+            for key in slots.values():
+                self._release(key)
+
+
+session_store = SessionStore()
@@ -0,0 +1,83 @@
+import asyncio
+from metrics import metrics
+
+# Request coalescing for token streams.
+# Concurrent requests with the same key share one underlying stream: the first caller starts it,
+# later callers attach, get the tokens produced so far replayed and then follow along, and every
+# caller sees the same result or error. The shared stream is cancelled (closing its HTTP
+# response) only once all callers have gone away.
+
+
+class _Flight:
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self.updated = asyncio.Event()
+
+    def notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+
+    def in_flight(self):
+        return len(self._flights)
+
+    async def stream(self, key, stream_factory):
+        # stream_factory returns the async token stream to run if no identical one is in flight
+        flight_key = (asyncio.get_running_loop(), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[flight_key] = flight
+            flight.task = asyncio.create_task(self._run(flight_key, flight, stream_factory))
+        else:
+            metrics.record_coalesced()
+        flight.waiters += 1
+        position = 0
+        try:
+            while True:
+                updated = flight.updated
+                while position < len(flight.tokens):
+                    yield flight.tokens[position]
+                    position += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await updated.wait()
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.done:
+                self._forget(flight_key, flight)
+                flight.task.cancel()
+
+    async def _run(self, flight_key, flight, stream_factory):
+        stream = stream_factory()
+        try:
+            async for token in stream:
+                flight.tokens.append(token)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(flight_key, flight)
+            flight.notify()
+            await stream.aclose()
+
+    def _forget(self, flight_key, flight):
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+
+
+single_flight = SingleFlight()
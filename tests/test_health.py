@@ -0,0 +1,45 @@
+import asyncio
+from health import ProviderHealth, CLOSED, OPEN
+from scheduler import ProviderScheduler, scheduled_stream
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def generate(health, errors, max_retries):
+    scheduler = ProviderScheduler("test", 1000, 10 ** 9, max_retries=max_retries, backoff_base=0.001, backoff_max=0.001)
+    errors = list(errors)
+
+    async def provider():
+        if errors:
+            raise errors.pop(0)
+        yield "done"
+
+    async def collect():
+        tokens = scheduled_stream(
+            scheduler, lambda: health.guarded_stream("P", provider()), 10,
+            on_give_up=lambda error: health.record_given_up("P", error)
+        )
+        return [token async for token in tokens]
+
+    return asyncio.run(collect())
+
+
+def test_rate_limits_absorbed_by_retries_do_not_open_the_breaker():
+    health = ProviderHealth()
+    assert generate(health, [StatusError(429)] * 4, max_retries=5) == ["done"]
+    assert health.breaker("P").state == CLOSED
+    assert health.breaker("P").failures == 0
+
+
+def test_server_errors_count_once_the_scheduler_gives_up():
+    health = ProviderHealth()
+    for _ in range(3):
+        try:
+            generate(health, [StatusError(503)] * 3, max_retries=2)
+        except StatusError:
+            pass
+    assert health.breaker("P").state == OPEN
@@ -0,0 +1,53 @@
+import asyncio
+from hedging import hedged_stream, latency_tracker
+
+
+def race(providers, delay):
+    closed = []
+    events = []
+
+    def stream_for(name):
+        async def stream():
+            try:
+                for pause, token in providers[name]:
+                    await asyncio.sleep(pause)
+                    if isinstance(token, Exception):
+                        raise token
+                    yield token
+            finally:
+                closed.append(name)
+        return stream()
+
+    async def collect():
+        async for token in hedged_stream(stream_for, list(providers), delay=delay):
+            events.append(token)
+        return events
+
+    return asyncio.run(collect()), closed
+
+
+def test_winner_streams_tokens_and_loser_is_closed():
+    tokens, closed = race({
+        "slow": [(1.0, "\\slow")],
+        "fast": [(0.0, "\\first"), (0.01, " second"), (0.01, " third")],
+    }, delay=0.01)
+    assert tokens == ["\\first", " second", " third"]
+    assert sorted(closed) == ["fast", "slow"]
+
+
+def test_failed_attempt_hedges_immediately():
+    tokens, _ = race({
+        "broken": [(0.0, RuntimeError("boom"))],
+        "backup": [(0.0, "\\ok")],
+    }, delay=10)
+    assert tokens == ["\\ok"]
+
+
+def test_latency_is_timed_from_each_attempts_launch():
+    latency_tracker._samples.clear()
+    race({
+        "primary": [(1.0, "\\slow")],
+        "backup": [(0.05, "\\fast")],
+    }, delay=0.3)
+    assert "primary" not in latency_tracker._samples
+    assert list(latency_tracker._samples["backup"])[0] < 0.2
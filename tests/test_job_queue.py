@@ -0,0 +1,49 @@
+from job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED, CANCELLED
+
+
+def test_claim_and_complete(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    first = queue.submit("generate_documents", {"job_description": "first"})
+    second = queue.submit("generate_documents", {"job_description": "second"})
+    assert queue.position(second) == 1
+    job = queue.claim("worker")
+    assert (job.id, job.status, job.attempts, job.payload) == (first, RUNNING, 1, {"job_description": "first"})
+    assert queue.heartbeat(first, "worker", {"status": "half way"})
+    assert queue.get(first).progress == {"status": "half way"}
+    assert queue.complete(first, "worker", {"resume": "done"})
+    assert (queue.get(first).status, queue.get(first).result) == (DONE, {"resume": "done"})
+    assert queue.claim("worker").id == second
+    assert queue.claim("worker") is None
+
+
+def test_cancelled_job_stops_its_worker(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_id = queue.submit("generate_documents", {})
+    queue.claim("worker")
+    assert queue.cancel(job_id)
+    assert not queue.heartbeat(job_id, "worker")
+    assert not queue.complete(job_id, "worker", {})
+    assert queue.get(job_id).status == CANCELLED
+
+
+def test_failed_attempts_are_retried_until_they_run_out(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_id = queue.submit("generate_documents", {}, max_attempts=2)
+    queue.claim("worker")
+    queue.fail(job_id, "worker", "timeout")
+    job = queue.get(job_id)
+    assert (job.status, job.error) == (QUEUED, "timeout")
+    assert job.available_at >= job.updated
+    queue._conn.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+    queue.claim("worker")
+    queue.fail(job_id, "worker", "timeout again")
+    assert queue.get(job_id).status == FAILED
+
+
+def test_job_of_a_dead_worker_is_taken_over(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), lease_seconds=-1)
+    job_id = queue.submit("generate_documents", {})
+    queue.claim("dead")
+    job = queue.claim("alive")
+    assert (job.id, job.worker, job.attempts) == (job_id, "alive", 2)
+    assert not queue.heartbeat(job_id, "dead")
@@ -0,0 +1,52 @@
+from latex_repair import repair_latex
+from latex_sections import section_titles
+
+PREAMBLE = "\\documentclass{article}\n\\begin{document}\n"
+
+
+def document(sections):
+    return PREAMBLE + "".join(f"\\section{{{title}}}\n{title} text\n" for title in sections) + "\\end{document}\n"
+
+
+TEMPLATE = document(["Summary", "Skills", "Experience", "Projects"])
+
+
+def test_renamed_section_is_not_restored():
+    result = repair_latex(document(["Summary", "Technical Skills", "Experience", "Projects"]), TEMPLATE)
+    assert result.broken_sections == []
+    assert section_titles(result.latex) == ["Summary", "Technical Skills", "Experience", "Projects"]
+
+
+def test_dropped_section_is_restored_next_to_a_renamed_one():
+    result = repair_latex(document(["Summary", "Technical Skills", "Experience"]), TEMPLATE)
+    assert result.broken_sections == ["Projects"]
+    assert section_titles(result.latex) == ["Summary", "Technical Skills", "Experience", "Projects"]
+
+
+def test_dropped_section_is_restored_in_template_order():
+    result = repair_latex(document(["Summary", "Experience", "Projects"]), TEMPLATE)
+    assert result.broken_sections == ["Skills"]
+    assert section_titles(result.latex) == ["Summary", "Skills", "Experience", "Projects"]
+
+
+def minipage_document(sections):
+    # Every section is wrapped in a minipage that opens in the block before it
+    body = "".join(f"\\begin{{minipage}}{{\\linewidth}}\n\\section{{{title}}}\n{title} text\n\\end{{minipage}}\n" for title in sections)
+    return PREAMBLE + body + "\\end{document}\n"
+
+
+def test_environment_spanning_sections_is_left_alone():
+    template = minipage_document(["Summary", "Skills", "Experience"])
+    result = repair_latex(template, template)
+    assert result.latex == template
+    assert result.fixes == []
+
+
+def test_unclosed_environment_is_closed_in_its_own_section():
+    template = minipage_document(["Summary", "Skills", "Experience"])
+    output = template.replace("Skills text\n", "Skills text\n\\begin{itemize}\n\\item Python\n")
+    result = repair_latex(output, template)
+    assert "\\item Python\n\\end{itemize}\n\\end{minipage}" in result.latex
+    assert result.latex.count("\\end{minipage}") == 3
+    assert result.fixes == ["balanced braces and environments"]
+    assert result.broken_sections == []
@@ -0,0 +1,44 @@
+from latex_sections import split_sections, replace_sections, section_titles
+
+DOCUMENT = (
+    "\\documentclass{article}\n\\begin{document}\n"
+    "\\name{Jane Doe}\n"
+    "\\section{Summary}\nEngineer.\n"
+    "% Skills, most relevant first\n"
+    "\\section*{Skills}\n\\begin{itemize}\n\\item Python\n\\end{itemize}\n"
+    "\\cvsection{Experience}\nAcme {\\bf Corp}.\n"
+    "\\end{document}\n"
+)
+
+
+def test_split_and_join_round_trip():
+    document = split_sections(DOCUMENT)
+    assert document.to_latex() == DOCUMENT
+    assert document.titles() == ["Summary", "Skills", "Experience"]
+    assert document.preamble.endswith("\\begin{document}")
+    assert document.header == "\n\\name{Jane Doe}\n"
+    assert document.trailer == "\\end{document}\n"
+    # The comment line above a section stays with the section before it
+    assert document.sections[0].text.endswith("% Skills, most relevant first\n")
+
+
+def test_sections_are_spliced_by_title():
+    document = split_sections(DOCUMENT)
+    spliced = replace_sections(document, ["Skills"], "\\section*{Skills}\nGo")
+    assert spliced.to_latex() == DOCUMENT.replace("\\begin{itemize}\n\\item Python\n\\end{itemize}\n", "Go\n")
+
+
+def test_renamed_sections_are_spliced_by_position():
+    document = split_sections(DOCUMENT)
+    generated = "\\section{Profile}\nLead engineer.\n\\section{Technical Skills}\nGo\n"
+    spliced = replace_sections(document, ["Summary", "Skills"], generated)
+    assert spliced.titles() == ["Profile", "Technical Skills", "Experience"]
+    assert section_titles(spliced.to_latex()) == ["Profile", "Technical Skills", "Experience"]
+
+
+def test_sections_missing_from_the_output_are_kept():
+    document = split_sections(DOCUMENT)
+    spliced = replace_sections(document, ["Summary", "Skills"], "\\section{Summary}\nLead engineer.\n")
+    assert spliced.titles() == ["Summary", "Skills", "Experience"]
+    assert "\\item Python" in spliced.to_latex()
+    assert "Lead engineer." in spliced.to_latex()
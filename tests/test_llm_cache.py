@@ -0,0 +1,56 @@
+import time
+import asyncio
+from llm_cache import ResponseCache, make_cache_key, acached_stream
+
+
+def test_cache_key_covers_every_input():
+    base = ("gemini", "model", "prompt", "job", "resume", "template")
+    key = make_cache_key(*base)
+    assert make_cache_key(*base) == key
+    for index in range(len(base)):
+        changed = list(base)
+        changed[index] += "!"
+        assert make_cache_key(*changed) != key
+    # Documents are positional, not a bag of texts
+    assert make_cache_key("gemini", "model", "prompt", "job", "template", "resume") != key
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.put("fresh", "text")
+    cache.put("stale", "text", ttl_seconds=-1)
+    assert cache.get("fresh") == "text"
+    assert cache.get("stale") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    # Apart in time so that last_access orders them
+    for step in (lambda: cache.put("a", "aaaa"), lambda: cache.put("b", "bbbb"), lambda: cache.get("a")):
+        step()
+        time.sleep(0.01)
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+
+
+def test_cached_stream_skips_the_provider_on_a_hit(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    calls = []
+
+    async def provider():
+        calls.append(1)
+        yield "\\section"
+        yield "{Skills}"
+
+    async def collect():
+        first = [token async for token in acached_stream(cache, "key", provider())]
+        second = [token async for token in acached_stream(cache, "key", provider())]
+        return first, second
+
+    first, second = asyncio.run(collect())
+    assert first == ["\\section", "{Skills}"]
+    assert second == ["\\section{Skills}"]
+    assert calls == [1]
@@ -0,0 +1,59 @@
+import asyncio
+from output_budget import budgeted_stream, budgeted_stream_blocking, OutputDiverged
+
+TEMPLATE = "\\documentclass{article}\n\\begin{document}\nText\n\\end{document}\n"
+
+
+def provider(tokens, log):
+    async def stream():
+        try:
+            for token in tokens:
+                yield token
+            log.append("finished")
+        finally:
+            log.append("closed")
+    return stream()
+
+
+def test_stream_ends_at_end_document_and_usage_is_still_read():
+    log = []
+
+    async def collect():
+        tokens = budgeted_stream(provider(["\\documentclass{article}\n\\begin{document}\nHi\n\\end{doc", "ument}\nThanks!", "<usage>"], log), 1000, TEMPLATE)
+        text = "".join([token async for token in tokens])
+        assert log == []
+        await asyncio.sleep(0.01)
+        return text
+
+    text = asyncio.run(collect())
+    assert text == "\\documentclass{article}\n\\begin{document}\nHi\n\\end{document}"
+    assert log == ["finished", "closed"]
+
+
+def test_diverging_stream_is_closed_without_reading_on():
+    log = []
+
+    async def collect():
+        tokens = budgeted_stream(provider(["no latex here " * 200, "more"], log), 1000, TEMPLATE)
+        try:
+            [token async for token in tokens]
+        except OutputDiverged:
+            return True
+
+    assert asyncio.run(collect())
+    assert log == ["closed"]
+
+
+def test_blocking_stream_reads_usage_after_end_document():
+    log = []
+
+    def stream():
+        try:
+            yield "\\begin{document}\n\\end{document}"
+            yield "<usage>"
+            log.append("finished")
+        finally:
+            log.append("closed")
+
+    assert "".join(budgeted_stream_blocking(stream(), 1000, TEMPLATE)) == "\\begin{document}\n\\end{document}"
+    assert log == ["finished", "closed"]
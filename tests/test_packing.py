@@ -0,0 +1,15 @@
+from packing import PACKED_MAX_OUTPUT_TOKENS, expected_item_tokens, pack_size, packed_output_budget
+
+RESUME = "\\item x" * 1100  # about 8 KB
+COVER_LETTER = "y" * 3000
+
+
+def test_packs_are_sized_from_the_expected_output():
+    size = pack_size(5, (RESUME, COVER_LETTER))
+    assert size >= 2
+    assert size * expected_item_tokens((RESUME, COVER_LETTER)) <= PACKED_MAX_OUTPUT_TOKENS
+    assert packed_output_budget(size, (RESUME, COVER_LETTER)) <= PACKED_MAX_OUTPUT_TOKENS
+
+
+def test_long_templates_are_not_packed():
+    assert pack_size(5, ("z" * 30000, COVER_LETTER)) == 1
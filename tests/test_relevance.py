@@ -0,0 +1,30 @@
+from relevance import find_items, focus_resume
+
+SKILLS = ["Python", "Django", "PostgreSQL", "Docker", "Kubernetes", "AWS", "Terraform", "Redis", "Kafka", "GraphQL"]
+PROJECTS = ["Compiler", "Chess engine", "Ray tracer", "Chat server", "Blog platform", "Weather bot"]
+JOB_DESCRIPTION = "Backend engineer: " + ", ".join(SKILLS) + " on AWS with Docker and Kubernetes."
+
+
+def moderncv_resume():
+    lines = ["\\documentclass{moderncv}", "\\begin{document}", "\\section{Skills}"]
+    lines += [f"\\cvitem{{{skill}}}{{{skill} in production}}" for skill in SKILLS]
+    lines += ["\\cvitem{Hobby}{knitting}", "\\section{Projects}", "\\begin{itemize}"]
+    lines += [f"\\item {project}" for project in PROJECTS]
+    lines += ["\\end{itemize}", "\\end{document}", ""]
+    return "\n".join(lines)
+
+
+def test_cvitem_span_stops_at_next_section():
+    latex = moderncv_resume()
+    hobby = next(item for item in find_items(latex) if "Hobby" in item.text)
+    assert hobby.text == "\\cvitem{Hobby}{knitting}\n"
+
+
+def test_filtering_keeps_sections_after_cvitems():
+    focused, _ = focus_resume(moderncv_resume(), JOB_DESCRIPTION, filter_items=True)
+    assert "knitting" not in focused
+    assert "\\section{Projects}" in focused
+    assert "\\end{itemize}" in focused
+    assert focused.rstrip().endswith("\\end{document}")
+    # The best project is kept so the list is not left empty
+    assert "\\item" in focused
@@ -0,0 +1,43 @@
+from scheduler import ProviderScheduler, SharedLimits, is_retryable
+
+
+# Same class hierarchy as the SDK errors, without importing openai or httpx
+class APIConnectionError(Exception):
+    pass
+
+
+class APITimeoutError(APIConnectionError):
+    pass
+
+
+class TransportError(Exception):
+    pass
+
+
+class ReadTimeout(TransportError):
+    pass
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+def test_sdk_connection_errors_and_timeouts_are_retried():
+    assert is_retryable(APIConnectionError("connection refused"))
+    assert is_retryable(APITimeoutError("timed out"))
+    assert is_retryable(ReadTimeout("read timed out"))
+
+
+def test_client_errors_are_not_retried():
+    assert not is_retryable(BadRequestError("bad request"))
+
+
+def test_shared_limits_split_one_quota_between_processes(tmp_path):
+    # Two connections to one database stand in for the web server and a worker process
+    path = str(tmp_path / "limits.sqlite")
+    server = ProviderScheduler("p", 2, 10 ** 6, limits=SharedLimits(path))
+    worker = ProviderScheduler("p", 2, 10 ** 6, limits=SharedLimits(path))
+    assert server.limits.reserve(server, 1) == 0
+    assert worker.limits.reserve(worker, 1) == 0
+    assert server.limits.reserve(server, 1) > 0
+    assert worker.limits.reserve(worker, 1) > 0
@@ -0,0 +1,34 @@
+import pytest
+from session_store import SessionStore, SessionLimitError
+
+
+def test_sessions_share_identical_texts():
+    store = SessionStore()
+    first = store.create({"resume_template": "template"})
+    second = store.create({"resume_template": "template"})
+    assert store.get_id(first, "resume_template") == store.get_id(second, "resume_template")
+    assert store.stats()["blobs"] == 1
+    store.set_text(first, "resume_template", "edited")
+    assert store.get_text(first, "resume_template") == "edited"
+    assert store.get_text(second, "resume_template") == "template"
+    assert store.get_text(first, "resume") == ""
+
+
+def test_session_size_is_limited():
+    store = SessionStore(max_session_bytes=10)
+    session_id = store.create({"resume_template": "12345678"})
+    with pytest.raises(SessionLimitError):
+        store.set_text(session_id, "cover_letter_template", "12345")
+    # Replacing a slot only counts the new text
+    store.set_text(session_id, "resume_template", "1234567890")
+
+
+def test_oldest_session_is_evicted_and_its_texts_released():
+    store = SessionStore(max_sessions=1)
+    first = store.create({"resume_template": "first"})
+    second = store.create({"resume_template": "second"})
+    assert not store.exists(first)
+    assert store.exists(second)
+    assert store.stats()["blobs"] == 1
+    with pytest.raises(KeyError):
+        store.get_text(first, "resume_template")
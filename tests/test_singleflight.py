@@ -0,0 +1,70 @@
+import asyncio
+from singleflight import SingleFlight
+
+
+def test_identical_requests_share_one_stream():
+    flights = SingleFlight()
+    calls = []
+
+    async def provider():
+        calls.append(1)
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def caller(delay):
+        await asyncio.sleep(delay)
+        return [token async for token in flights.stream("key", provider)]
+
+    async def run():
+        return await asyncio.gather(caller(0), caller(0.015))
+
+    # The late caller gets the tokens it missed replayed
+    assert asyncio.run(run()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert calls == [1]
+    assert flights.in_flight() == 0
+
+
+def test_every_caller_sees_the_error():
+    flights = SingleFlight()
+
+    async def provider():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider failed")
+
+    async def caller():
+        tokens = []
+        try:
+            async for token in flights.stream("key", provider):
+                tokens.append(token)
+        except RuntimeError as e:
+            return tokens, str(e)
+
+    async def run():
+        return await asyncio.gather(caller(), caller())
+
+    assert asyncio.run(run()) == [(["a"], "provider failed")] * 2
+
+
+def test_stream_is_closed_once_every_caller_left():
+    flights = SingleFlight()
+    closed = []
+
+    async def provider():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "token"
+        finally:
+            closed.append(1)
+
+    async def run():
+        stream = flights.stream("key", provider)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert closed == [1]
+    assert flights.in_flight() == 0
@@ -1,8 +1,21 @@
 import streamlit as st
 import os
-import google.generativeai as genai
 import json
-from openai import OpenAI
+from llm_cache import get_cache, make_cache_key, cached_stream
+from scheduler import get_scheduler, estimate_tokens, scheduled_stream_blocking
+from providers import (
+    registry,
+    resume_request_prefix,
+    resume_request_suffix,
+    cover_letter_request_prefix,
+    cover_letter_request_suffix,
+    join_request,
+    stream_gemini_prefixed,
+    stream_chat_completion,
+)
+from relevance import focus_resume
+from output_budget import output_budget, budgeted_stream_blocking
+from latex_repair import repair_latex
 
 # Configuration and setup
 st.set_page_config(page_title="AI Resume Customizer", layout="wide")
@@ -34,7 +47,17 @@ if 'cover_letter_prompt' not in st.session_state:
 if 'selected_model' not in st.session_state:
     st.session_state.selected_model = "Google Gemini"
 
-# Function to load templates from disk
+GEMINI_MODEL = "gemini-2.0-flash"
+DEEPSEEK_MODEL = "deepseek/deepseek-chat-v3-0324:free"
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://ai-resume-customizer.com",  # Replace with your actual site URL
+    "X-Title": "AI Resume Customizer",
+}
+
+response_cache = get_cache()
+
+# Function to load templates from disk (cached across reruns and sessions until the next save)
+@st.cache_data
 def load_template(template_type):
     try:
         file_path = f"templates/{template_type}_template.tex"
@@ -48,6 +71,7 @@ def save_template(template_type, content):
     os.makedirs("templates", exist_ok=True)
     with open(f"templates/{template_type}_template.tex", "w") as f:
         f.write(content)
+    load_template.clear()
 
 # Function to save prompts
 def save_prompts():
@@ -58,103 +82,133 @@ def save_prompts():
     }
     with open("prompts/saved_prompts.json", "w") as f:
         json.dump(prompts, f)
+    read_saved_prompts.clear()
 
-# Function to load prompts
-def load_prompts():
+@st.cache_data
+def read_saved_prompts():
     try:
         with open("prompts/saved_prompts.json", "r") as f:
-            prompts = json.load(f)
-            st.session_state.resume_prompt = prompts.get("resume_prompt", st.session_state.resume_prompt)
-            st.session_state.cover_letter_prompt = prompts.get("cover_letter_prompt", st.session_state.cover_letter_prompt)
+            return json.load(f)
     except FileNotFoundError:
-        pass
+        return {}
+
+# Function to load prompts into the session (once per session, so unsaved edits survive reruns)
+def load_prompts():
+    if st.session_state.get("prompts_loaded"):
+        return
+    prompts = read_saved_prompts()
+    st.session_state.resume_prompt = prompts.get("resume_prompt", st.session_state.resume_prompt)
+    st.session_state.cover_letter_prompt = prompts.get("cover_letter_prompt", st.session_state.cover_letter_prompt)
+    st.session_state.prompts_loaded = True
 
 # Initialize Gemini API
 @st.cache_resource
 def initialize_gemini_api():
     try:
-        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+        registry.configure_gemini(os.environ.get("GOOGLE_API_KEY"))
     except Exception as e:
         st.error(f"Error initializing Gemini API: {e}")
 
-# Initialize OpenRouter client for DeepSeek
-@st.cache_resource
+# Get the pooled OpenRouter client for DeepSeek (built once per API key)
 def get_openrouter_client():
     try:
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.environ.get("OPENROUTER_API_KEY"),
-        )
-        return client
+        return registry.configure_openrouter(os.environ.get("OPENROUTER_API_KEY")).client
     except Exception as e:
         st.error(f"Error initializing OpenRouter client: {e}")
         return None
 
 initialize_gemini_api()
+# Import the provider SDKs in the background instead of on the first click
+registry.warm_up([GEMINI_MODEL])
 
-# Function to customize resume with the selected AI model
-def customize_resume(resume_template, job_description, prompt):
-    try:
-        if st.session_state.selected_model == "Google Gemini":
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(
-                f"{prompt}\n\nJob Description:\n{job_description}\n\nResume Template:\n{resume_template}"
-            )
-            return response.text
-        else:  # DeepSeek
-            client = get_openrouter_client()
-            if not client:
-                return None
-            
-            completion = client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": "https://ai-resume-customizer.com",  # Replace with your actual site URL
-                    "X-Title": "AI Resume Customizer",
-                },
-                model="deepseek/deepseek-chat-v3-0324:free",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"{prompt}\n\nJob Description:\n{job_description}\n\nResume Template:\n{resume_template}"
-                    }
-                ]
-            )
-            return completion.choices[0].message.content
-    except Exception as e:
-        st.error(f"Error with AI customization: {e}")
-        return None
+# Relevance hints for the resume; the template is only cut down when it is not a provider-cached prefix
+def prepare_resume(provider, model_name, prompt, resume_template, job_description):
+    cached = registry.prefix_cached(provider, model_name, resume_request_prefix(prompt, resume_template))
+    return focus_resume(resume_template, job_description, filter_items=not cached)
 
-# Function to generate cover letter with the selected AI model
-def generate_cover_letter(resume, job_description, prompt, template):
+# Function to stream a customized resume from the selected AI model
+def stream_customize_resume(resume_template, job_description, prompt, use_cache=True):
+    if st.session_state.selected_model == "Google Gemini":
+        resume_template, hints = prepare_resume("gemini", GEMINI_MODEL, prompt, resume_template, job_description)
+    else:
+        resume_template, hints = prepare_resume("openrouter", DEEPSEEK_MODEL, prompt, resume_template, job_description)
+    prefix = resume_request_prefix(prompt, resume_template)
+    suffix = resume_request_suffix(job_description, hints)
+    request_text = join_request(prefix, suffix)
+    budget = output_budget(resume_template)
+    if st.session_state.selected_model == "Google Gemini":
+        cache_key = make_cache_key("gemini", GEMINI_MODEL, prompt, job_description, resume_template)
+        tokens = scheduled_stream_blocking(
+            get_scheduler("gemini"),
+            lambda: stream_gemini_prefixed(GEMINI_MODEL, prefix, suffix, max_output_tokens=budget),
+            estimate_tokens(request_text, resume_template)
+        )
+    else:  # DeepSeek
+        cache_key = make_cache_key("openrouter", DEEPSEEK_MODEL, prompt, job_description, resume_template)
+        client = get_openrouter_client()
+        tokens = scheduled_stream_blocking(
+            get_scheduler("openrouter"),
+            lambda: stream_chat_completion(
+                client,
+                DEEPSEEK_MODEL,
+                [{"role": "user", "content": request_text}],
+                extra_headers=OPENROUTER_HEADERS,
+                max_tokens=budget,
+                prefix_tokens=estimate_tokens(prefix)
+            ),
+            estimate_tokens(request_text, resume_template)
+        )
+    return cached_stream(response_cache, cache_key, budgeted_stream_blocking(tokens, budget, resume_template), use_cache)
+
+# Function to stream a cover letter from the selected AI model
+def stream_generate_cover_letter(resume, job_description, prompt, template, use_cache=True):
+    prefix = cover_letter_request_prefix(prompt, template)
+    suffix = cover_letter_request_suffix(job_description, resume)
+    request_text = join_request(prefix, suffix)
+    budget = output_budget(template)
+    if st.session_state.selected_model == "Google Gemini":
+        cache_key = make_cache_key("gemini", GEMINI_MODEL, prompt, job_description, resume, template)
+        tokens = scheduled_stream_blocking(
+            get_scheduler("gemini"),
+            lambda: stream_gemini_prefixed(GEMINI_MODEL, prefix, suffix, max_output_tokens=budget),
+            estimate_tokens(request_text, template)
+        )
+    else:  # DeepSeek
+        cache_key = make_cache_key("openrouter", DEEPSEEK_MODEL, prompt, job_description, resume, template)
+        client = get_openrouter_client()
+        tokens = scheduled_stream_blocking(
+            get_scheduler("openrouter"),
+            lambda: stream_chat_completion(
+                client,
+                DEEPSEEK_MODEL,
+                [{"role": "user", "content": request_text}],
+                extra_headers=OPENROUTER_HEADERS,
+                max_tokens=budget,
+                prefix_tokens=estimate_tokens(prefix)
+            ),
+            estimate_tokens(request_text, template)
+        )
+    return cached_stream(response_cache, cache_key, budgeted_stream_blocking(tokens, budget, template), use_cache)
+
+# Function to show tokens as they arrive and return the full text, repaired against the template
+def write_stream(token_stream, error_message, template):
+    placeholder = st.empty()
     try:
-        if st.session_state.selected_model == "Google Gemini":
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(
-                f"{prompt}\n\nJob Description:\n{job_description}\n\nResume:\n{resume}\n\nCover Letter Template:\n{template}"
-            )
-            return response.text
-        else:  # DeepSeek
-            client = get_openrouter_client()
-            if not client:
-                return None
-            
-            completion = client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": "https://ai-resume-customizer.com",  # Replace with your actual site URL
-                    "X-Title": "AI Resume Customizer",
-                },
-                model="deepseek/deepseek-chat-v3-0324:free",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"{prompt}\n\nJob Description:\n{job_description}\n\nResume:\n{resume}\n\nCover Letter Template:\n{template}"
-                    }
-                ]
-            )
-            return completion.choices[0].message.content
+        with placeholder.container():
+            text = st.write_stream(token_stream)
     except Exception as e:
-        st.error(f"Error generating cover letter: {e}")
+        st.error(f"{error_message}: {e}")
+        return None
+    placeholder.empty()
+    if not text:
         return None
+    # Code fences, reasoning text and unbalanced LaTeX never reach the code view or the download
+    result = repair_latex(text, template)
+    if result.fixes:
+        st.caption("Repaired LaTeX: " + "; ".join(result.fixes))
+    if result.broken_sections:
+        st.warning("These sections needed heavy repair, check them or regenerate: " + ", ".join(result.broken_sections))
+    return result.latex
 
 # Load saved prompts on app startup
 load_prompts()
@@ -162,8 +216,22 @@ load_prompts()
 # UI Header
 st.title("AI Resume & Cover Letter Customizer")
 
-# Sidebar for templates and prompt settings
-with st.sidebar:
+# The sidebar, the generation section and the results are fragments: a widget interaction only
+# re-runs the fragment it belongs to. Values shared between fragments live in session state.
+
+def uploaded_template(label, template_type, uploaded_file):
+    # Saves an uploaded template once per upload rather than on every rerun
+    if uploaded_file is None:
+        return load_template(template_type)
+    saved_key = f"saved_{template_type}_upload"
+    if st.session_state.get(saved_key) != uploaded_file.file_id:
+        save_template(template_type, uploaded_file.getvalue().decode("utf-8"))
+        st.session_state[saved_key] = uploaded_file.file_id
+    st.success(f"{label} template saved!")
+    return load_template(template_type)
+
+@st.fragment
+def sidebar_settings():
     st.header("Templates & Settings")
     
     # AI Model Selection
@@ -178,6 +246,10 @@ with st.sidebar:
     if model_choice == "DeepSeek (via OpenRouter)" and not os.environ.get("OPENROUTER_API_KEY"):
         st.warning("⚠️ OPENROUTER_API_KEY not set. Add it to your environment variables or .env file.")
     
+    st.session_state.bypass_cache = st.checkbox("Bypass response cache when regenerating", value=True)
+    cache_stats = response_cache.stats()
+    st.caption(f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} entries)")
+    
     # Template management
     st.subheader("Resume Template")
     
@@ -188,15 +260,10 @@ with st.sidebar:
     
     if template_option == "Upload new template":
         resume_template_file = st.file_uploader("Upload Resume LaTeX Template", type=["tex"])
-        if resume_template_file is not None:
-            resume_template = resume_template_file.getvalue().decode("utf-8")
-            save_template("resume", resume_template)
-            st.success("Resume template saved!")
-        else:
-            resume_template = load_template("resume")
+        st.session_state.resume_template = uploaded_template("Resume", "resume", resume_template_file)
     else:
-        resume_template = load_template("resume")
-        if not resume_template:
+        st.session_state.resume_template = load_template("resume")
+        if not st.session_state.resume_template:
             st.warning("No saved resume template found. Please upload one.")
     
     st.subheader("Cover Letter Template")
@@ -208,15 +275,10 @@ with st.sidebar:
     
     if cl_template_option == "Upload new template":
         cl_template_file = st.file_uploader("Upload Cover Letter LaTeX Template", type=["tex"])
-        if cl_template_file is not None:
-            cl_template = cl_template_file.getvalue().decode("utf-8")
-            save_template("cover_letter", cl_template)
-            st.success("Cover letter template saved!")
-        else:
-            cl_template = load_template("cover_letter")
+        st.session_state.cl_template = uploaded_template("Cover letter", "cover_letter", cl_template_file)
     else:
-        cl_template = load_template("cover_letter")
-        if not cl_template:
+        st.session_state.cl_template = load_template("cover_letter")
+        if not st.session_state.cl_template:
             st.warning("No saved cover letter template found. Please upload one.")
     
     # Prompt management
@@ -236,57 +298,84 @@ with st.sidebar:
         save_prompts()
         st.success("Prompts saved!")
 
-# Main area
-st.header("Job Description Input")
-job_description = st.text_area("Paste the job description here:", height=300)
-
-if st.button("Generate Customized Documents") and job_description:
-    if not resume_template:
-        st.error("Please upload or select a resume template first.")
-    elif not cl_template:
-        st.error("Please upload or select a cover letter template first.")
-    elif st.session_state.selected_model == "DeepSeek (via OpenRouter)" and not os.environ.get("OPENROUTER_API_KEY"):
-        st.error("OpenRouter API key not set. Please add it to your environment variables.")
-    else:
-        with st.spinner(f"Customizing resume using {st.session_state.selected_model}..."):
-            customized_resume = customize_resume(resume_template, job_description, st.session_state.resume_prompt)
-        
-        if customized_resume:
-            st.session_state.customized_resume = customized_resume
+@st.fragment
+def generation_section():
+    st.header("Job Description Input")
+    job_description = st.text_area("Paste the job description here:", height=300, key="job_description")
+    resume_template = st.session_state.resume_template
+    cl_template = st.session_state.cl_template
+    
+    # Set before the full rerun that shows new results
+    notice = st.session_state.pop("generation_notice", None)
+    if notice:
+        st.success(notice)
+    
+    if st.button("Generate Customized Documents") and job_description:
+        if not resume_template:
+            st.error("Please upload or select a resume template first.")
+        elif not cl_template:
+            st.error("Please upload or select a cover letter template first.")
+        elif st.session_state.selected_model == "DeepSeek (via OpenRouter)" and not os.environ.get("OPENROUTER_API_KEY"):
+            st.error("OpenRouter API key not set. Please add it to your environment variables.")
+        else:
+            st.caption(f"Customizing resume using {st.session_state.selected_model}...")
+            customized_resume = write_stream(
+                stream_customize_resume(resume_template, job_description, st.session_state.resume_prompt),
+                "Error with AI customization",
+                resume_template
+            )
             
-            with st.spinner(f"Generating cover letter using {st.session_state.selected_model}..."):
-                cover_letter = generate_cover_letter(
-                    customized_resume, 
-                    job_description, 
-                    st.session_state.cover_letter_prompt,
+            if customized_resume:
+                st.session_state.customized_resume = customized_resume
+                
+                st.caption(f"Generating cover letter using {st.session_state.selected_model}...")
+                cover_letter = write_stream(
+                    stream_generate_cover_letter(
+                        customized_resume, 
+                        job_description, 
+                        st.session_state.cover_letter_prompt,
+                        cl_template
+                    ),
+                    "Error generating cover letter",
                     cl_template
                 )
-            
-            if cover_letter:
-                st.session_state.cover_letter = cover_letter
-                st.success("Documents generated successfully!")
+                
+                if cover_letter:
+                    st.session_state.cover_letter = cover_letter
+                    st.session_state.generated_with = st.session_state.selected_model
+                    st.session_state.generation_notice = "Documents generated successfully!"
+                    # The results fragment is outside this one, so the whole page is re-run once
+                    st.rerun()
+                else:
+                    st.error("Failed to generate cover letter.")
             else:
-                st.error("Failed to generate cover letter.")
-        else:
-            st.error("Failed to customize resume.")
+                st.error("Failed to customize resume.")
 
-# Display results in tabs
-if 'customized_resume' in st.session_state and 'cover_letter' in st.session_state:
+@st.fragment
+def results_section():
+    if 'customized_resume' not in st.session_state or 'cover_letter' not in st.session_state:
+        return
+    job_description = st.session_state.job_description
+    use_cache = not st.session_state.bypass_cache
+    model_info = f"Generated with: {st.session_state.get('generated_with', st.session_state.selected_model)}"
     tab1, tab2 = st.tabs(["Customized Resume", "Cover Letter"])
     
     with tab1:
         st.subheader("Customized Resume (LaTeX)")
         st.code(st.session_state.customized_resume, language="latex")
         
-        model_info = f"Generated with: {st.session_state.selected_model}"
         st.info(model_info)
         
         if st.button("Regenerate Resume"):
-            with st.spinner(f"Customizing resume using {st.session_state.selected_model}..."):
-                customized_resume = customize_resume(resume_template, job_description, st.session_state.resume_prompt)
+            customized_resume = write_stream(
+                stream_customize_resume(st.session_state.resume_template, job_description, st.session_state.resume_prompt, use_cache=use_cache),
+                "Error with AI customization",
+                st.session_state.resume_template
+            )
             if customized_resume:
                 st.session_state.customized_resume = customized_resume
-                st.rerun()
+                st.session_state.generated_with = st.session_state.selected_model
+                st.rerun(scope="fragment")
         
         # Download button for resume
         resume_download = st.download_button(
@@ -300,20 +389,24 @@ if 'customized_resume' in st.session_state and 'cover_letter' in st.session_stat
         st.subheader("Cover Letter (LaTeX)")
         st.code(st.session_state.cover_letter, language="latex")
         
-        model_info = f"Generated with: {st.session_state.selected_model}"
         st.info(model_info)
         
         if st.button("Regenerate Cover Letter"):
-            with st.spinner(f"Generating cover letter using {st.session_state.selected_model}..."):
-                cover_letter = generate_cover_letter(
+            cover_letter = write_stream(
+                stream_generate_cover_letter(
                     st.session_state.customized_resume, 
                     job_description, 
                     st.session_state.cover_letter_prompt,
-                    cl_template
-                )
+                    st.session_state.cl_template,
+                    use_cache=use_cache
+                ),
+                "Error generating cover letter",
+                st.session_state.cl_template
+            )
             if cover_letter:
                 st.session_state.cover_letter = cover_letter
-                st.rerun()
+                st.session_state.generated_with = st.session_state.selected_model
+                st.rerun(scope="fragment")
         
         # Download button for cover letter
         cl_download = st.download_button(
@@ -322,3 +415,13 @@ if 'customized_resume' in st.session_state and 'cover_letter' in st.session_stat
             file_name="cover_letter.tex",
             mime="text/plain"
         )
+
+# Sidebar for templates and prompt settings
+with st.sidebar:
+    sidebar_settings()
+
+# Main area
+generation_section()
+
+# Display results in tabs
+results_section()